@@ -1,13 +1,41 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
 
+from . import search
+from .export import CONTENT_TYPES, for_model
 from .models import Comment, Follow, Group, Post
 
 
+def export_action(fmt, compress=False):
+    """Действие, которое отдаёт выбранные объекты потоком NDJSON или CSV."""
+    suffix = '.gz' if compress else ''
+
+    def action(modeladmin, request, queryset):
+        export = for_model(queryset.model)
+        chunks = export.chunks(fmt, queryset, compress=compress)
+        response = StreamingHttpResponse(
+            (data for data, _ in chunks),
+            content_type=('application/gzip' if compress
+                          else CONTENT_TYPES[fmt]))
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export.kind}.{fmt}{suffix}"')
+        return response
+
+    action.__name__ = f'export_{fmt}{suffix.replace(".", "_")}'
+    action.short_description = f'Выгрузить в {fmt.upper()}{suffix}'
+    return action
+
+
+EXPORT_ACTIONS = [export_action(fmt, compress)
+                  for compress in (False, True) for fmt in ('ndjson', 'csv')]
+
+
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("pk", "title", "slug", "description")
     search_fields = ("slug",)
     empty_value_display = "-пусто-"
     prepopulated_fields = {'slug': ('title',)}
+    actions = EXPORT_ACTIONS
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,6 +43,13 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ("text",)
     list_filter = ("pub_date", "group")
     empty_value_display = "-пусто-"
+    actions = EXPORT_ACTIONS
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по тексту."""
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -22,11 +57,20 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ("text",)
     list_filter = ("post", "author", "created")
     empty_value_display = "-пусто-"
+    raw_id_fields = ("parent",)
+    actions = EXPORT_ACTIONS
+
+    def get_readonly_fields(self, request, obj=None):
+        # path ответов строится при создании и не пересчитывается
+        if obj is not None:
+            return ("parent",)
+        return ()
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("pk", "user", "author")
     list_filter = ("user", "author")
+    actions = EXPORT_ACTIONS
 
 
 admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,279 @@
+"""JSON API лент и постов: /api/v1/.
+
+Ответы строятся из строк values(): для каждого поля ответа заранее
+известны колонки и функция, которая собирает значение из строки, поэтому
+нет ни экземпляров моделей, ни обхода полей сериализатором. ?fields=
+выбирает поля ответа, и из БД читаются только их колонки.
+
+Списки листаются курсорами ?after= и ?before= (posts.paginator), ссылки
+на соседние страницы — в next и previous. Ответы кэшируются и получают
+ETag по поколениям тех же областей, что и HTML-страницы
+(posts.caching), но одни на всех пользователей: в них нет ничего
+личного.
+
+Единственный адрес для записи — ingest/: персонал загружает через него
+поток NDJSON постов, комментариев и подписок (posts.ingest).
+"""
+import json
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST, require_safe
+
+from .caching import (cached_page, group_scope, index_scope, post_scope,
+                      profile_scope)
+from .ingest import Ingestor
+from .models import PATH_STEP, Comment, Group, Post
+from .paginator import paginate
+from .replicas import read_from_replica
+
+User = get_user_model()
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# компактный JSON: без пробелов и без \\uXXXX для кириллицы
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Serializer:
+    """Поля ответа поверх строк values().
+
+    fields: имя поля -> (колонки values(), функция строки). keys —
+    колонки, которые читаются всегда: по ним строится курсор.
+    """
+
+    def __init__(self, fields, keys=('pk',)):
+        self.fields = fields
+        self.keys = keys
+
+    def parse(self, value):
+        """Поля из ?fields=, по умолчанию все."""
+        names = [name.strip() for name in (value or '').split(',')
+                 if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Неизвестные поля: {", ".join(unknown)}; '
+                           f'доступны: {", ".join(self.fields)}')
+        return names or list(self.fields)
+
+    def columns(self, names):
+        columns = dict.fromkeys(self.keys)
+        for name in names:
+            columns.update(dict.fromkeys(self.fields[name][0]))
+        return list(columns)
+
+    def dump(self, rows, names):
+        getters = [(name, self.fields[name][1]) for name in names]
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+def full_name(row, prefix=''):
+    return f'{row[prefix + "first_name"]} {row[prefix + "last_name"]}'.strip()
+
+
+def post_author(row):
+    return {'username': row['author__username'],
+            'name': full_name(row, 'author__')}
+
+
+def post_group(row):
+    if row['group__slug'] is None:
+        return None
+    return {'slug': row['group__slug'], 'title': row['group__title']}
+
+
+def post_image(row):
+    """Миниатюра с вариантами или, пока её нет, исходная картинка."""
+    if row['thumbnail_url']:
+        try:
+            variants = json.loads(row['image_variants'] or '[]')
+        except ValueError:
+            variants = []
+        return {'url': row['thumbnail_url'], 'width': row['thumbnail_width'],
+                'height': row['thumbnail_height'], 'variants': variants}
+    if row['image']:
+        return {'url': default_storage.url(row['image']), 'width': None,
+                'height': None, 'variants': []}
+    return None
+
+
+POST = Serializer({
+    'id': (('pk',), lambda row: row['pk']),
+    'text': (('text',), lambda row: row['text']),
+    'pub_date': (('pub_date',), lambda row: row['pub_date'].isoformat()),
+    'author': (('author__username', 'author__first_name',
+                'author__last_name'), post_author),
+    'group': (('group__slug', 'group__title'), post_group),
+    'comments_count': (('comments_count',),
+                       lambda row: row['comments_count']),
+    'image': (('image', 'thumbnail_url', 'thumbnail_width',
+               'thumbnail_height', 'image_variants'), post_image),
+}, keys=('pk', 'pub_date'))
+
+COMMENT = Serializer({
+    'id': (('pk',), lambda row: row['pk']),
+    'author': (('author__username',), lambda row: row['author__username']),
+    'text': (('text',), lambda row: row['text']),
+    'created': (('created',), lambda row: row['created'].isoformat()),
+    'parent': (('parent_id',), lambda row: row['parent_id']),
+    # глубину даёт длина пути, см. Comment.depth
+    'depth': (('path',),
+              lambda row: max(len(row['path']) // PATH_STEP - 1, 0)),
+}, keys=('pk', 'path'))
+
+AUTHOR = Serializer({
+    'username': (('username',), lambda row: row['username']),
+    'name': (('first_name', 'last_name'), full_name),
+    'posts_count': (('profile__posts_count',),
+                    lambda row: row['profile__posts_count']),
+    'followers_count': (('profile__followers_count',),
+                        lambda row: row['profile__followers_count']),
+    'following_count': (('profile__following_count',),
+                        lambda row: row['profile__following_count']),
+})
+
+
+def respond(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def api_view(view):
+    """Ошибки view — JSON с полем error."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return respond({'error': 'Не найдено'}, status=404)
+        except ApiError as error:
+            return respond({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def page_size(request):
+    value = request.GET.get('limit')
+    if value is None:
+        return API_PAGE_SIZE
+    if not value.isdigit() or not 1 <= int(value) <= API_MAX_PAGE_SIZE:
+        raise ApiError(f'limit — число от 1 до {API_MAX_PAGE_SIZE}')
+    return int(value)
+
+
+def page_link(request, name, cursor):
+    """Адрес соседней страницы с теми же fields и limit."""
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    query[name] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def page_response(request, queryset, serializer):
+    names = serializer.parse(request.GET.get('fields'))
+    rows = queryset.values(*serializer.columns(names))
+    page = paginate(request, rows, page_size(request))
+    paginator = page.paginator
+    return respond({
+        'results': serializer.dump(page, names),
+        'next': page_link(request, 'after', paginator.next_cursor),
+        'previous': page_link(request, 'before', paginator.previous_cursor),
+    })
+
+
+def object_response(request, queryset, serializer, **lookup):
+    names = serializer.parse(request.GET.get('fields'))
+    row = get_object_or_404(
+        queryset.values(*serializer.columns(names)), **lookup)
+    return respond(serializer.dump([row], names)[0])
+
+
+def author_id(username):
+    return get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request: [index_scope()], per_user=False)
+@api_view
+def posts(request):
+    return page_response(request, Post.objects.all(), POST)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request, slug: [group_scope(slug)], per_user=False)
+@api_view
+def group_posts(request, slug):
+    group_id = get_object_or_404(
+        Group.objects.values_list('pk', flat=True), slug=slug)
+    return page_response(
+        request, Post.objects.filter(group_id=group_id), POST)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request, username: [profile_scope(username)],
+             per_user=False)
+@api_view
+def author(request, username):
+    return object_response(request, User.objects.all(), AUTHOR,
+                           username=username)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request, username: [profile_scope(username)],
+             per_user=False)
+@api_view
+def author_posts(request, username):
+    return page_response(
+        request, Post.objects.filter(author_id=author_id(username)), POST)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request, username, post_id: [
+    post_scope(post_id), profile_scope(username)], per_user=False)
+@api_view
+def post(request, username, post_id):
+    return object_response(request, Post.objects.all(), POST,
+                           author__username=username, pk=post_id)
+
+
+@require_safe
+@read_from_replica
+@cached_page(lambda request, username, post_id: [post_scope(post_id)],
+             per_user=False)
+@api_view
+def comments(request, username, post_id):
+    post_id = get_object_or_404(
+        Post.objects.values_list('pk', flat=True),
+        author__username=username, pk=post_id)
+    return page_response(
+        request, Comment.objects.filter(post_id=post_id).order_by('path'),
+        COMMENT)
+
+
+@require_POST
+@api_view
+def ingest(request):
+    """Загружает NDJSON из тела запроса и отвечает отчётом Ingestor.
+
+    CSRF проверяется как у форм: клиент с сессией передаёт токен в
+    заголовке X-CSRFToken.
+    """
+    if not request.user.is_staff:
+        raise ApiError('Загрузка доступна только персоналу', status=403)
+    return respond(Ingestor().feed(request))
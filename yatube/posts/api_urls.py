@@ -0,0 +1,25 @@
+from django.urls import path
+
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    # Лента всех постов
+    path('posts/', api.posts, name='posts'),
+    # Посты группы
+    path('groups/<slug:slug>/posts/', api.group_posts, name='group_posts'),
+    # Автор и его счётчики
+    path('users/<str:username>/', api.author, name='author'),
+    # Посты автора
+    path('users/<str:username>/posts/', api.author_posts,
+         name='author_posts'),
+    # Пост
+    path('users/<str:username>/posts/<int:post_id>/', api.post,
+         name='post'),
+    # Дерево комментариев поста
+    path('users/<str:username>/posts/<int:post_id>/comments/',
+         api.comments, name='comments'),
+    # Загрузка постов, комментариев и подписок в NDJSON
+    path('ingest/', api.ingest, name='ingest'),
+]
@@ -0,0 +1,209 @@
+"""Статика с хэшем в имени, заранее сжатая и отдаваемая из WSGI.
+
+CompressedManifestStorage — хранилище collectstatic: к имени файла
+добавляется хэш содержимого, а рядом с текстовыми файлами пишутся копии
+.gz и .br. Имя меняется вместе с содержимым, поэтому такие файлы можно
+кэшировать навсегда. Пакет brotli нужен только collectstatic: без него
+команда падает, а не молча пропускает копии .br.
+
+StaticAssets оборачивает WSGI-приложение и отдаёт файлы STATIC_ROOT до
+Django: выбирает сжатую копию по Accept-Encoding, а файлам с хэшем
+ставит Cache-Control immutable. Файлы читаются при старте процесса,
+поэтому после collectstatic сервер перезапускают.
+"""
+import gzip
+import mimetypes
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (ManifestStaticFilesStorage,
+                                                staticfiles_storage)
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json',
+                '.xml', '.ico', '.ttf', '.otf', '.eot')
+# сжатая копия, которая почти не меньше оригинала, не пишется
+MIN_SAVING = 0.95
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# 11 — наилучшее и самое медленное сжатие: collectstatic делает его
+# один раз на сборку, а выигрыш получает каждый ответ
+BROTLI_QUALITY = 11
+# от лучшего сжатия к худшему
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(content):
+    """Сжатые копии содержимого: {'.gz': bytes, '.br': bytes}."""
+    copies = {'.gz': gzip.compress(content, compresslevel=9, mtime=0),
+              '.br': brotli.compress(content, quality=BROTLI_QUALITY)}
+    return {suffix: data for suffix, data in copies.items()
+            if len(data) < len(content) * MIN_SAVING}
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """Хэш в именах файлов и сжатые копии текстовых файлов."""
+
+    def stored_name(self, name):
+        # файлы не из манифеста (до первого collectstatic или положенные
+        # в STATIC_ROOT вручную) отдаются под исходными именами
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if brotli is None and not dry_run:
+            raise ImproperlyConfigured(
+                'Для копий .br нужен пакет brotli: pip install -r '
+                'requirements.txt')
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = {*self.hashed_files, *self.hashed_files.values()}
+        # у файла с хэшем и без него обычно одно содержимое
+        copies = {}
+        for name in sorted(names):
+            if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                content = original.read()
+            if content not in copies:
+                copies[content] = compress(content)
+            for suffix, data in copies[content].items():
+                with open(self.path(name + suffix), 'wb') as output:
+                    output.write(data)
+
+
+class Asset:
+    """Файл статики и его сжатые копии."""
+
+    def __init__(self, path, immutable):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.modified = int(stat.st_mtime)
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in (
+                'application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.cache_control = IMMUTABLE if immutable else (
+            f'public, max-age={settings.STATIC_MAX_AGE}')
+        self.encodings = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in ENCODINGS
+            if os.path.exists(path + suffix)]
+
+    def choose(self, accept_encoding):
+        """Путь, размер и кодировка лучшей копии, которую примет клиент."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding, path, size in self.encodings:
+            if encoding in accepted:
+                return path, size, encoding
+        return self.path, self.size, None
+
+    def etag(self, encoding):
+        # у каждой копии свой ETag: это разные представления файла
+        suffix = f'-{encoding}' if encoding else ''
+        return f'"{self.modified:x}-{self.size:x}{suffix}"'
+
+    def is_modified(self, environ, etag):
+        etags = parse_etags(environ.get('HTTP_IF_NONE_MATCH', ''))
+        if etags:
+            return not {'*', etag} & set(etags)
+        since = parse_http_date_safe(
+            environ.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is None or self.modified > since
+
+
+def parse_accept_encoding(value):
+    """Кодировки из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in value.split(','):
+        encoding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, number = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if encoding and quality > 0:
+            accepted.add(encoding.lower())
+    return accepted
+
+
+def scan(root):
+    """Файлы root по путям относительно него, без сжатых копий."""
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    suffixes = tuple(suffix for _, suffix in ENCODINGS)
+    assets = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if filename.endswith(suffixes) and os.path.exists(
+                    os.path.splitext(path)[0]):
+                continue
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            assets[name] = Asset(path, name in hashed)
+    return assets
+
+
+class StaticAssets:
+    """WSGI-слой, который отдаёт файлы STATIC_ROOT, не доходя до Django.
+
+    Остальные запросы, в том числе к отсутствующим файлам, передаются
+    приложению. Если STATIC_URL — адрес другого хоста, слой ничего не
+    отдаёт.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.prefix = settings.STATIC_URL
+        self.assets = {}
+        root = settings.STATIC_ROOT
+        if self.prefix.startswith('/') and root and os.path.isdir(root):
+            self.assets = scan(root)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        asset = None
+        if path.startswith(self.prefix) and environ['REQUEST_METHOD'] in (
+                'GET', 'HEAD'):
+            asset = self.assets.get(path[len(self.prefix):])
+        if asset is None:
+            return self.application(environ, start_response)
+        return self.serve(asset, environ, start_response)
+
+    def serve(self, asset, environ, start_response):
+        path, size, encoding = asset.choose(
+            environ.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = asset.etag(encoding)
+        headers = [
+            ('Cache-Control', asset.cache_control),
+            ('ETag', etag),
+            ('Last-Modified', http_date(asset.modified)),
+        ]
+        if asset.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if not asset.is_modified(environ, etag):
+            start_response('304 Not Modified', headers)
+            return []
+        headers += [('Content-Type', asset.content_type),
+                    ('Content-Length', str(size))]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return wrapper(open(path, 'rb'))
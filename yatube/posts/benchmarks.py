@@ -0,0 +1,85 @@
+"""Общие помощники для команд-бенчмарков (manage.py bench_*)."""
+import statistics
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Profile
+
+from .models import Follow, Post
+
+User = get_user_model()
+BATCH_SIZE = 1000
+
+
+def percentile(timings, share):
+    """Значение, которого не превышает доля share отсортированных замеров."""
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def measure(func, repeat):
+    """Выполняет func repeat раз, возвращает медиану и p95 в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), percentile(timings, 0.95)
+
+
+def bulk_insert(model, objects, ignore_conflicts=False):
+    """Вставляет объекты из итератора пачками по BATCH_SIZE."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            break
+        model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+
+
+def create_users(count, prefix='bench'):
+    bulk_insert(User, (User(username=f'{prefix}_{i}') for i in range(count)))
+    users = list(User.objects.filter(
+        username__startswith=f'{prefix}_').order_by('id'))
+    bulk_insert(Profile, (Profile(user=user) for user in users))
+    return users
+
+
+def create_posts(authors, per_author):
+    bulk_insert(Post, (
+        Post(text=f'Пост {i} автора {author.username}', author=author)
+        for author in authors for i in range(per_author)
+    ))
+
+
+def create_follows(users, authors):
+    bulk_insert(Follow, (
+        Follow(user=user, author=author)
+        for user in users for author in authors if user != author
+    ), ignore_conflicts=True)
+
+
+class BenchCommand(BaseCommand):
+    """Команда, все изменения которой в БД откатываются по завершении."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Сколько раз повторять каждый замер')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.bench(**options)
+            transaction.set_rollback(True)
+
+    def bench(self, **options):
+        raise NotImplementedError
+
+    def report(self, label, func, repeat):
+        median, p95 = measure(func, repeat)
+        self.stdout.write(
+            f'{label:<40} median {median:8.2f} ms   p95 {p95:8.2f} ms')
+        return median
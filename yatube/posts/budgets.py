@@ -0,0 +1,212 @@
+"""Бюджеты запросов и времени ответа для всех именованных URL.
+
+Харнесс обходит маршруты posts.urls, users.urls и about.urls на
+засеянных данных гостем и залогиненным читателем, с пустым кэшем,
+и для каждого ответа записывает число SQL-запросов, число повторов
+одного и того же запроса, суммарное время SQL и время ответа без SQL.
+Результаты сравниваются с бюджетами из budgets.json рядом с модулем:
+маршрут без бюджета — тоже нарушение, чтобы новый view не пропустили.
+
+Бюджеты запросов точные, бюджеты времени — замер с запасом TIME_HEADROOM,
+но не меньше TIME_FLOOR_MS: время зависит от машины.
+"""
+import json
+import math
+import os
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from . import counters, graph
+from .benchmarks import bulk_insert, create_follows, create_posts, create_users
+from .feed import rebuild_timelines
+from .models import Comment, Group, Post
+from .views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+User = get_user_model()
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'budgets.json')
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+METRICS = ('queries', 'duplicates', 'sql_ms', 'render_ms')
+TIMING_METRICS = ('sql_ms', 'render_ms')
+TIME_HEADROOM = 5
+TIME_FLOOR_MS = 50
+
+
+def iter_routes():
+    """Имена для reverse() именованных маршрутов из URLCONFS."""
+    for resolver in get_resolver().url_patterns:
+        if not isinstance(resolver, URLResolver):
+            continue
+        # include() хранит уже импортированный модуль
+        urlconf = getattr(resolver.urlconf_name, '__name__',
+                          resolver.urlconf_name)
+        if urlconf not in URLCONFS:
+            continue
+        prefix = f'{resolver.namespace}:' if resolver.namespace else ''
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, URLPattern) and pattern.name:
+                yield prefix + pattern.name, pattern
+
+
+def seed():
+    """Данные, на которых N+1 заметен: несколько авторов, полные
+    страницы лент, ветка комментариев от разных пользователей."""
+    authors = create_users(5, 'budget_author')
+    reader = User.objects.create_user(username='budget_reader')
+    group = Group.objects.create(
+        title='Группа для бюджетов', slug='budget-group', description='')
+    create_posts(authors, POSTS_PER_PAGE)
+    Post.objects.filter(author__in=authors[::2]).update(group=group)
+    create_follows([reader], authors)
+    rebuild_timelines()
+
+    post = Post.objects.filter(author=authors[0]).latest('pub_date', 'pk')
+    commenters = create_users(COMMENTS_PER_PAGE, 'budget_commenter')
+    bulk_insert(Comment, (
+        Comment(post=post, author=author, text='Комментарий')
+        for author in commenters
+    ))
+    first = post.comments.order_by('pk').first()
+    bulk_insert(Comment, (
+        Comment(post=post, author=author, parent=first, text='Ответ')
+        for author in commenters[:3]
+    ))
+    Comment.objects.fill_paths()
+    # bulk_create не вызывает сигналы, счётчики нужно пересчитать
+    counters.reconcile()
+    return {
+        'reader': reader,
+        'kwargs': {
+            'username': authors[0].username,
+            'post_id': post.pk,
+            'slug': group.slug,
+        },
+    }
+
+
+def route_kwargs(name, pattern, dataset):
+    try:
+        return {key: dataset['kwargs'][key]
+                for key in pattern.pattern.converters}
+    except KeyError as error:
+        raise ValueError(
+            f'Нет значения параметра {error} для маршрута {name}')
+
+
+class QueryTimer:
+    """execute_wrapper: debug-курсор округляет время до миллисекунд."""
+
+    def __init__(self):
+        self.sql = []
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.sql.append((sql, repr(params)))
+
+
+def request_once(url, user):
+    # не 127.0.0.1, чтобы не включался debug toolbar
+    client = Client(REMOTE_ADDR='192.0.2.1')
+    if user is not None:
+        client.force_login(user)
+    cache.clear()
+    graph.get_cache().clear()
+    timer = QueryTimer()
+    with connection.execute_wrapper(timer):
+        start = time.perf_counter()
+        client.get(url)
+        elapsed = (time.perf_counter() - start) * 1000
+    sql_ms = timer.seconds * 1000
+    return {
+        'queries': len(timer.sql),
+        'duplicates': len(timer.sql) - len(set(timer.sql)),
+        'sql_ms': sql_ms,
+        'render_ms': elapsed - sql_ms,
+    }
+
+
+def measure_route(url, user, repeat=3):
+    """Замер одного URL; каждый запрос откатывается, чтобы follow,
+    unfollow и прочие записи не меняли данные следующих замеров."""
+    runs = []
+    # первый запрос прогревает шаблоны и не учитывается
+    for _ in range(repeat + 1):
+        with transaction.atomic():
+            runs.append(request_once(url, user))
+            transaction.set_rollback(True)
+    runs = runs[1:]
+    result = {metric: max(run[metric] for run in runs)
+              for metric in ('queries', 'duplicates')}
+    result.update({metric: statistics.median(run[metric] for run in runs)
+                   for metric in TIMING_METRICS})
+    return result
+
+
+def run(repeat=3):
+    """{маршрут: {'guest'|'user': метрики}} по всем маршрутам."""
+    dataset = seed()
+    results = {}
+    for name, pattern in iter_routes():
+        url = reverse(name, kwargs=route_kwargs(name, pattern, dataset))
+        results[name] = {
+            'guest': measure_route(url, None, repeat),
+            'user': measure_route(url, dataset['reader'], repeat),
+        }
+    return results
+
+
+def load_budgets(path=BUDGETS_FILE):
+    with open(path, encoding='utf-8') as budgets:
+        return json.load(budgets)
+
+
+def save_budgets(budgets, path=BUDGETS_FILE):
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(budgets, output, indent=2, sort_keys=True)
+        output.write('\n')
+
+
+def make_budgets(results):
+    """Бюджеты по замеру: запросы как есть, время с запасом."""
+    return {
+        name: {
+            who: {
+                metric: (math.ceil(max(value * TIME_HEADROOM,
+                                       TIME_FLOOR_MS))
+                         if metric in TIMING_METRICS else value)
+                for metric, value in metrics.items()
+            }
+            for who, metrics in clients.items()
+        }
+        for name, clients in results.items()
+    }
+
+
+def compare(results, budgets, timings=True):
+    """Список нарушений бюджетов, пустой, если всё в порядке."""
+    metrics = METRICS if timings else [
+        metric for metric in METRICS if metric not in TIMING_METRICS]
+    violations = []
+    for name, clients in results.items():
+        for who, measured in clients.items():
+            budget = budgets.get(name, {}).get(who)
+            if budget is None:
+                violations.append(f'{name} ({who}): нет бюджета')
+                continue
+            for metric in metrics:
+                if measured[metric] > budget[metric]:
+                    violations.append(
+                        f'{name} ({who}): {metric} '
+                        f'{measured[metric]:g} > {budget[metric]:g}')
+    return violations
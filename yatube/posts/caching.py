@@ -0,0 +1,258 @@
+"""Кэширование страниц лент с инвалидацией по событиям.
+
+У каждой области (главная, группа, профиль, лента подписок, пост) есть
+ключ поколения. Ключ закэшированной страницы включает поколения всех
+областей, от которых она зависит, поэтому сохранение или удаление поста,
+комментария или подписки меняет поколение и следующий запрос строит
+страницу заново, а старые записи просто вытесняются из кэша по времени.
+
+Тот же хэш поколений служит ETag страницы, а время последней смены
+поколения — её Last-Modified: на If-None-Match и If-Modified-Since view
+отвечает 304, не читая ни БД, ни закэшированную страницу.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import graph, metrics
+from .replicas import is_sticky, replica_reads
+
+User = get_user_model()
+
+GENERATION_KEY = 'generation:{}'
+PAGE_KEY = 'page:{}'
+CARD_KEY = 'post_card:{}:{}:{}:{}'
+
+_lock = threading.Lock()
+_stats = Counter()
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def profile_scope(username):
+    return f'profile:{username}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scopes(user_id):
+    """Области ленты подписок: подписки пользователя и посты каждого, на
+    кого он подписан.
+
+    Пост меняет поколение только своего автора, а не лент всех его
+    подписчиков, поэтому запись не зависит от их числа. Список подписок
+    берётся из графа в кэше.
+    """
+    return [follow_scope(user_id),
+            *[author_scope(author_id)
+              for author_id in graph.following(user_id)]]
+
+
+def _new_generation():
+    return time.time_ns()
+
+
+def get_generations(scopes):
+    """Текущие поколения областей; недостающие создаются."""
+    keys = {GENERATION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _new_generation(), None)
+        found[key] = cache.get(key)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def bump(*scopes):
+    """Сбрасывает все страницы, зависящие от переданных областей."""
+    generation = _new_generation()
+    cache.set_many(
+        {GENERATION_KEY.format(scope): generation for scope in scopes}, None)
+
+
+def record(name, hit, count=1):
+    result = 'hit' if hit else 'miss'
+    with _lock:
+        _stats[(name, result)] += count
+    if count:
+        metrics.inc('yatube_page_cache_requests_total', count,
+                    name=name, result=result)
+
+
+def get_stats():
+    """Попадания и промахи кэша страниц по именам view в этом процессе."""
+    with _lock:
+        stats = dict(_stats)
+    names = {name for name, _ in stats}
+    return {name: {'hit': stats.get((name, 'hit'), 0),
+                   'miss': stats.get((name, 'miss'), 0)}
+            for name in names}
+
+
+def page_version(request, generations, *extra, per_user=True):
+    """Хэш адреса, пользователя и поколений: ключ кэша и ETag."""
+    user_id = 0
+    if per_user and request.user.is_authenticated:
+        user_id = request.user.pk
+    parts = [request.get_full_path(), str(user_id), *extra]
+    parts += [f'{scope}={generation}'
+              for scope, generation in sorted(generations.items())]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def last_modified(generations):
+    """Секунда последней смены поколения для Last-Modified или None.
+
+    Заголовок точен до секунды, поэтому пока идёт секунда смены, он не
+    отдаётся: поколение может смениться ещё раз в ту же секунду, и
+    клиент с If-Modified-Since получил бы 304 на изменённую страницу
+    (RFC 7232, 2.2.2).
+    """
+    seconds = max(generations.values()) // 10 ** 9
+    if seconds >= time.time_ns() // 10 ** 9:
+        return None
+    return seconds
+
+
+def is_fresh(generations):
+    """Сменилось ли поколение быстрее, чем реплика получает записи."""
+    if not settings.DATABASE_REPLICAS:
+        return False
+    lag = settings.REPLICA_LAG_SECONDS * 10 ** 9
+    return _new_generation() - max(generations.values()) < lag
+
+
+def conditional_response(request, generations, version, get_response):
+    """304, если у клиента та же версия страницы, иначе ответ
+    get_response() с ETag и Last-Modified."""
+    etag = quote_etag(version)
+    modified = last_modified(generations)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified)
+    if response is None:
+        response = get_response()
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def cached_page(scopes, per_user=True):
+    """Кэширует ответ view до смены поколения одной из областей.
+
+    scopes вызывается с аргументами view и возвращает список областей.
+    Ответ зависит от пользователя, поэтому он входит в ключ; per_user=False
+    — для ответов, одинаковых для всех (JSON API).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = get_generations(scopes(request, *args, **kwargs))
+            version = page_version(request, generations, per_user=per_user)
+
+            def get_response():
+                key = PAGE_KEY.format(version)
+                response = cache.get(key)
+                record(view.__name__, hit=response is not None)
+                if response is None:
+                    # реплика могла ещё не получить запись, сменившую
+                    # поколение; страница из неё осталась бы в кэше до
+                    # следующей записи
+                    fresh = is_fresh(generations)
+                    with replica_reads(False) if fresh else nullcontext():
+                        response = view(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.cookies:
+                        cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+                return response
+
+            return conditional_response(
+                request, generations, version, get_response)
+        return wrapper
+    return decorator
+
+
+def conditional_page(scopes):
+    """Как cached_page, но без кэша: только ETag, Last-Modified и 304.
+
+    Для страниц с формой. Токен формы действителен только с CSRF-кукой
+    клиента, поэтому она входит в версию страницы. Пока реплика может
+    не знать о последней смене поколения, страница отдаётся без
+    валидаторов: иначе клиент сохранил бы её устаревшую версию с новым
+    ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            generations = get_generations(scopes(request, *args, **kwargs))
+            if is_fresh(generations) and not is_sticky(request):
+                return view(request, *args, **kwargs)
+            version = page_version(
+                request, generations,
+                request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+            return conditional_response(
+                request, generations, version,
+                lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def bump_post(post, *extra_scopes):
+    """Сбрасывает страницы, на которых показан пост."""
+    scopes = [index_scope(), profile_scope(post.author.username),
+              post_scope(post.pk), author_scope(post.author_id),
+              *extra_scopes]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    bump(*scopes)
+
+
+def bump_follow(follow):
+    """Сбрасывает ленту подписчика и профили обоих пользователей."""
+    usernames = User.objects.filter(
+        pk__in=[follow.user_id, follow.author_id]
+    ).values_list('username', flat=True)
+    bump(follow_scope(follow.user_id),
+         *[profile_scope(username) for username in usernames])
+
+
+def card_key(post, user, lazy=False):
+    """Ключ карточки поста: id, версия поста, видит ли её автор и
+    грузится ли картинка лениво."""
+    version = '|'.join(str(part) for part in (
+        post.updated.timestamp(), post.comments_count, post.image,
+        post.author.username, post.group and post.group.slug,
+        post.group and post.group.title,
+    ))
+    digest = hashlib.md5(version.encode()).hexdigest()
+    is_author = int(user is not None and user.pk == post.author_id)
+    return CARD_KEY.format(post.pk, digest, is_author, int(lazy))
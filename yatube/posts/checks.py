@@ -0,0 +1,33 @@
+"""Проверки настроек для manage.py check --deploy."""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+from .metrics import MeteredCache
+
+
+def _backend(alias):
+    cache = caches[alias]
+    return cache._cache if isinstance(cache, MeteredCache) else cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """Кэш страниц, поколений и графа подписок должен быть общим.
+
+    Поколения (posts.caching), множество «знаменитостей» (posts.feed) и
+    списки графа (posts.graph) меняет тот процесс, который принял запись.
+    В LocMemCache другие процессы WSGI-сервера и management-команды этих
+    изменений не видят и до PAGE_CACHE_TIMEOUT отдают устаревшие страницы.
+    """
+    if not settings.PAGE_CACHE_TIMEOUT:
+        return []
+    return [
+        Error(f'Кэш {alias!r} — LocMemCache, он свой в каждом процессе.',
+              hint='Укажите в CACHES общий бэкенд: memcached, redis или '
+                   'DatabaseCache.',
+              obj=alias, id='posts.E001')
+        for alias in dict.fromkeys(['default', settings.GRAPH_CACHE])
+        if isinstance(_backend(alias), LocMemCache)
+    ]
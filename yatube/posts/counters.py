@@ -0,0 +1,115 @@
+"""Денормализованные счётчики подписчиков, подписок, постов и комментариев.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + 1 из обработчиков
+сигналов, а reconcile() пересчитывает их по данным пачками. Строкам,
+вставленным bulk_create в обход сигналов, счётчики добавляют
+change_profiles() и change_posts().
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, F
+
+from users.models import Profile
+
+from .models import Comment, Follow, Post
+
+User = get_user_model()
+BATCH_SIZE = 500
+
+
+def change_profile(user_id, field, delta):
+    Profile.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def _add(model, key, field, deltas):
+    """Прибавляет {key: delta} к полю field одним executemany."""
+    meta = model._meta
+    column = meta.get_field(field).column
+    sql = (f'UPDATE {meta.db_table} SET {column} = {column} + %s '
+           f'WHERE {meta.get_field(key).column} = %s')
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(delta, pk) for pk, delta in deltas.items()
+                                 if delta])
+
+
+def change_profiles(field, deltas):
+    """Меняет счётчик field профилей по словарю {user_id: delta}."""
+    _add(Profile, 'user', field, deltas)
+
+
+def change_posts(deltas):
+    """Меняет comments_count постов по словарю {post_id: delta}."""
+    _add(Post, 'id', 'comments_count', deltas)
+
+
+def _counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by()
+        .values_list(field).annotate(total=Count('*'))
+    )
+
+
+def _reconcile_profiles(batch_size):
+    fixed = 0
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    existing = set(Profile.objects.values_list('user_id', flat=True))
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id) for user_id in user_ids
+         if user_id not in existing])
+    profiles = Profile.objects.order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(profiles.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1].pk
+        ids = [profile.user_id for profile in batch]
+        followers = _counts(Follow.objects, 'author', ids)
+        following = _counts(Follow.objects, 'user', ids)
+        posts = _counts(Post.objects, 'author', ids)
+        changed = []
+        for profile in batch:
+            actual = (followers.get(profile.user_id, 0),
+                      following.get(profile.user_id, 0),
+                      posts.get(profile.user_id, 0))
+            stored = (profile.followers_count, profile.following_count,
+                      profile.posts_count)
+            if actual != stored:
+                (profile.followers_count, profile.following_count,
+                 profile.posts_count) = actual
+                changed.append(profile)
+        Profile.objects.bulk_update(
+            changed, ['followers_count', 'following_count', 'posts_count'])
+        fixed += len(changed)
+
+
+def _reconcile_posts(batch_size):
+    fixed = 0
+    posts = Post.objects.order_by('pk').only('pk', 'comments_count')
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1].pk
+        comments = _counts(Comment.objects, 'post',
+                           [post.pk for post in batch])
+        changed = []
+        for post in batch:
+            actual = comments.get(post.pk, 0)
+            if actual != post.comments_count:
+                post.comments_count = actual
+                changed.append(post)
+        Post.objects.bulk_update(changed, ['comments_count'])
+        fixed += len(changed)
+
+
+def reconcile(batch_size=BATCH_SIZE):
+    """Пересчитывает все счётчики. Возвращает число исправленных строк."""
+    return _reconcile_profiles(batch_size), _reconcile_posts(batch_size)
@@ -0,0 +1,195 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+Каждый новый пост раскладывается в ленты подписчиков автора в виде
+записей FeedEntry, поэтому чтение ленты — это выборка по индексу
+(user, -pub_date) без соединения с Follow. Авторы, у которых подписчиков
+больше settings.FEED_FANOUT_LIMIT, не раскладываются: их посты
+подмешиваются в ленту при чтении (fan-out-on-read).
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from users.models import Profile
+
+from .models import FeedEntry, Follow, Post
+
+CELEBRITIES_CACHE_KEY = 'feed:celebrities'
+BATCH_SIZE = 500
+
+
+def get_celebrities():
+    """Множество id авторов, чьи посты не раскладываются по лентам."""
+    celebrities = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrities is None:
+        celebrities = set(Profile.objects.filter(
+            followers_count__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('user_id', flat=True))
+        cache.set(CELEBRITIES_CACHE_KEY, celebrities, None)
+    return celebrities
+
+
+def _set_celebrity(author_id, is_celebrity):
+    celebrities = get_celebrities()
+    if is_celebrity:
+        celebrities.add(author_id)
+    else:
+        celebrities.discard(author_id)
+    cache.set(CELEBRITIES_CACHE_KEY, celebrities, None)
+
+
+def _followers(author_id):
+    return Profile.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _backfill(user_ids, author_id):
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in user_ids for post_id, pub_date in posts
+    )
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if post.author_id in get_celebrities():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in follower_ids
+    )
+
+
+def follow_added(follow):
+    """Заполняет ленту нового подписчика постами автора."""
+    if _followers(follow.author_id) > settings.FEED_FANOUT_LIMIT:
+        _set_celebrity(follow.author_id, True)
+        return
+    _backfill([follow.user_id], follow.author_id)
+
+
+def follow_removed(follow):
+    """Убирает посты автора из ленты отписавшегося пользователя.
+
+    Если автор при этом перестал быть «знаменитостью», его посты
+    раскладываются по лентам оставшихся подписчиков.
+    """
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id).delete()
+    # «<=», а не «==»: порог мог вырасти, а счётчик — упасть сразу на
+    # несколько подписчиков (ingest, правка FEED_FANOUT_LIMIT)
+    if (follow.author_id in get_celebrities()
+            and _followers(follow.author_id)
+            <= settings.FEED_FANOUT_LIMIT):
+        _set_celebrity(follow.author_id, False)
+        follower_ids = list(Follow.objects.filter(
+            author_id=follow.author_id).values_list('user_id', flat=True))
+        _backfill(follower_ids, follow.author_id)
+
+
+def follow_feed(user):
+    """Посты ленты подписок пользователя."""
+    celebrities = get_celebrities()
+    followed_celebrities = []
+    if celebrities:
+        followed_celebrities = list(Follow.objects.filter(
+            user=user, author_id__in=celebrities
+        ).values_list('author_id', flat=True))
+    if not followed_celebrities:
+        return Post.objects.filter(feed_entries__user=user).annotate(
+            feed_pub_date=F('feed_entries__pub_date')
+        ).order_by('-feed_pub_date', '-id')
+    entries = FeedEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=entries) | Q(author_id__in=followed_celebrities)
+    ).order_by('-pub_date', '-id')
+
+
+BACKFILL_SQL = f"""
+    INSERT INTO {FeedEntry._meta.db_table} (user_id, post_id, pub_date)
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM {Follow._meta.db_table} follow
+    JOIN {Post._meta.db_table} post ON post.author_id = follow.author_id
+    WHERE follow.author_id IN ({{}})"""
+
+
+def add_celebrities(author_ids):
+    """Отмечает авторов, у которых подписчиков стало больше предела."""
+    grown = Profile.objects.filter(
+        user_id__in=list(author_ids),
+        followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    for author_id in grown:
+        _set_celebrity(author_id, True)
+
+
+FAN_OUT_SQL = f"""
+    INSERT INTO {FeedEntry._meta.db_table} (user_id, post_id, pub_date)
+    SELECT follow.user_id, post.id, post.pub_date
+    FROM {Follow._meta.db_table} follow
+    JOIN {Post._meta.db_table} post ON post.author_id = follow.author_id
+    WHERE {{}} IN ({{}}) AND follow.author_id NOT IN ({{}})"""
+
+
+def _fan_out_rows(column, ids, batch_size):
+    celebrities = list(get_celebrities()) or [0]
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        with connection.cursor() as cursor:
+            cursor.execute(FAN_OUT_SQL.format(
+                column, ', '.join(['%s'] * len(batch)),
+                ', '.join(['%s'] * len(celebrities))), batch + celebrities)
+
+
+def fan_out_posts(post_ids, batch_size=BATCH_SIZE):
+    """Раскладывает по лентам посты, вставленные в обход сигналов.
+
+    Записей этих постов в лентах ещё нет, поэтому повторов не бывает.
+    """
+    _fan_out_rows('post.id', list(post_ids), batch_size)
+
+
+def backfill_follows(follow_ids, batch_size=BATCH_SIZE):
+    """Заполняет ленты по подпискам, вставленным в обход сигналов.
+
+    Вызывается после fan_out_posts(): посты, разложенные им, в новых
+    подписках ещё не участвовали, поэтому повторов нет.
+    """
+    _fan_out_rows('follow.id', list(follow_ids), batch_size)
+
+
+def rebuild_timelines(batch_size=BATCH_SIZE):
+    """Пересобирает все ленты с нуля. Возвращает число записей.
+
+    Ленты batch_size авторов заполняются одним INSERT ... SELECT: на
+    миллионах записей это на порядок быстрее bulk_create. Подписка
+    уникальна, а у поста один автор, поэтому повторов не бывает.
+    """
+    FeedEntry.objects.all().delete()
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    celebrities = get_celebrities()
+    author_ids = list(Follow.objects.exclude(
+        author_id__in=celebrities).order_by('author_id').values_list(
+        'author_id', flat=True).distinct())
+    for start in range(0, len(author_ids), batch_size):
+        batch = author_ids[start:start + batch_size]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                BACKFILL_SQL.format(', '.join(['%s'] * len(batch))), batch)
+    return FeedEntry.objects.count()
@@ -0,0 +1,52 @@
+"""Подписан ли пользователь запроса на авторов страницы.
+
+FollowState отвечает на «подписан ли читатель на автора» для одного
+автора запросом EXISTS, для страницы авторов — одним запросом IN по
+уникальному индексу (user, author) и запоминает ответы до конца
+запроса. Гостю запросы не нужны: он ни на кого не подписан.
+"""
+from .models import Follow
+
+
+class FollowState:
+    def __init__(self, user):
+        self.user_id = user.pk if user.is_authenticated else None
+        self._known = {}
+
+    def load(self, author_ids):
+        """Узнаёт подписки на авторов, которых ещё не спрашивали.
+
+        Страница с карточками многих авторов вызывает его до рендера,
+        после чего follows() запросов не делает.
+        """
+        missing = {author_id for author_id in author_ids
+                   if author_id not in self._known}
+        if self.user_id is None or not missing:
+            self._known.update(dict.fromkeys(missing, False))
+            return
+        # на себя подписаться нельзя
+        self._known.update(dict.fromkeys(missing & {self.user_id}, False))
+        missing.discard(self.user_id)
+        if not missing:
+            return
+        follows = Follow.objects.filter(user_id=self.user_id)
+        if len(missing) == 1:
+            author_id, = missing
+            followed = {author_id} if follows.filter(
+                author_id=author_id).exists() else set()
+        else:
+            followed = set(follows.filter(author_id__in=missing)
+                           .values_list('author_id', flat=True))
+        self._known.update(
+            (author_id, author_id in followed) for author_id in missing)
+
+    def follows(self, author_id):
+        self.load([author_id])
+        return self._known[author_id]
+
+
+def follow_state(request):
+    """FollowState пользователя запроса, один на запрос."""
+    if not hasattr(request, '_follow_state'):
+        request._follow_state = FollowState(request.user)
+    return request._follow_state
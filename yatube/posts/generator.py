@@ -0,0 +1,231 @@
+"""Синтетические данные в масштабе продакшена (manage.py generate_data).
+
+Активность неравномерна, как на живом сайте: вес каждого пользователя
+берётся из распределения Парето, и по этим весам выбираются авторы
+постов, авторы, на которых подписываются, и посты, которые комментируют.
+Несколько авторов получают основную часть постов и подписчиков, а
+длинный хвост почти ничего не пишет.
+
+Строки вставляются bulk_create пачками, поэтому сигналы не срабатывают:
+счётчики, ленты, пути комментариев и кэш страниц приводятся в порядок
+в finish(). По той же причине auto_now_add дал бы всем постам одну
+дату, поэтому pub_date расставляется отдельно по последним days дням.
+Индекс поиска на время вставки лучше отключить через
+search.paused_triggers(), как это делает manage.py generate_data.
+"""
+import io
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+from PIL import Image
+
+from users.models import Profile
+
+from . import counters, graph
+from .benchmarks import BATCH_SIZE, bulk_insert
+from .feed import rebuild_timelines
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# чем меньше, тем сильнее активность сосредоточена у немногих
+PARETO_ALPHA = 1.2
+WORDS = (
+    'город лето море книга музыка кофе дорога поезд утро вечер кино '
+    'работа проект код друзья семья кошка собака парк снег дождь '
+    'выставка концерт поход горы река лес театр футбол бег рецепт'
+).split()
+IMAGE_COLORS = ('#d9534f', '#5cb85c', '#5bc0de', '#f0ad4e', '#337ab7',
+                '#777777', '#8e44ad', '#16a085')
+IMAGE_SIZE = (1200, 800)
+# за сколько дней разложены даты постов
+DAYS = 365
+
+
+def pareto_weights(count, rnd, alpha=PARETO_ALPHA):
+    return list(accumulate(rnd.paretovariate(alpha) for _ in range(count)))
+
+
+def weighted(ids, cum_weights, count, rnd):
+    """count случайных id с вероятностями по накопленным весам."""
+    while count > 0:
+        size = min(count, BATCH_SIZE)
+        yield from rnd.choices(ids, cum_weights=cum_weights, k=size)
+        count -= size
+
+
+def text(rnd, low, high):
+    words = rnd.choices(WORDS, k=rnd.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def create_images(prefix, count):
+    """Несколько картинок в хранилище: посты ссылаются на них повторно."""
+    names = []
+    for i in range(count):
+        buffer = io.BytesIO()
+        color = IMAGE_COLORS[i % len(IMAGE_COLORS)]
+        Image.new('RGB', IMAGE_SIZE, color).save(buffer, 'JPEG')
+        names.append(default_storage.save(
+            f'posts/{prefix}_{i}.jpg', ContentFile(buffer.getvalue())))
+    return names
+
+
+class Generator:
+    def __init__(self, prefix='synthetic', seed=None, stdout=None):
+        self.prefix = prefix
+        self.rnd = random.Random(seed)
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def users(self, count):
+        bulk_insert(User, (
+            User(username=f'{self.prefix}_{i}') for i in range(count)))
+        ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+        bulk_insert(Profile, (Profile(user_id=pk) for pk in ids))
+        self.user_ids = ids
+        self.user_weights = pareto_weights(len(ids), self.rnd)
+        self.log(f'Пользователей: {len(ids)}')
+
+    def groups(self, count):
+        bulk_insert(Group, (
+            Group(title=f'Группа {i}', slug=f'{self.prefix}-{i}',
+                  description=text(self.rnd, 5, 20))
+            for i in range(count)
+        ))
+        self.group_ids = list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-').values_list('pk', flat=True))
+        self.log(f'Групп: {len(self.group_ids)}')
+
+    def posts(self, count, group_ratio, image_ratio, images, days=DAYS):
+        rnd = self.rnd
+        group_weights = pareto_weights(len(self.group_ids), rnd)
+        image_names = create_images(self.prefix, images) if (
+            image_ratio and images) else []
+        first_pk = (Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0)
+
+        def build(author_id):
+            post = Post(author_id=author_id, text=text(rnd, 3, 60))
+            if self.group_ids and rnd.random() < group_ratio:
+                post.group_id = rnd.choices(
+                    self.group_ids, cum_weights=group_weights)[0]
+            if image_names and rnd.random() < image_ratio:
+                post.image = rnd.choice(image_names)
+            return post
+
+        bulk_insert(Post, (
+            build(author_id) for author_id in weighted(
+                self.user_ids, self.user_weights, count, rnd)
+        ))
+        self.post_ids = list(Post.objects.filter(
+            pk__gt=first_pk).order_by('pk').values_list('pk', flat=True))
+        self.spread_dates(days)
+        self.log(f'Постов: {len(self.post_ids)}')
+
+    def spread_dates(self, days):
+        """Случайные несовпадающие даты за последние days дней,
+        возрастающие вместе с id, как у постов живого сайта."""
+        span = days * 24 * 3600 * 10 ** 6
+        if not self.post_ids or span < len(self.post_ids):
+            return
+        start = timezone.now() - timedelta(days=days)
+        offsets = sorted(self.rnd.sample(range(span), len(self.post_ids)))
+        meta = Post._meta
+        sql = (f'UPDATE {meta.db_table} SET '
+               f'{meta.get_field("pub_date").column} = %s '
+               f'WHERE {meta.pk.column} = %s')
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            for i in range(0, len(self.post_ids), BATCH_SIZE):
+                cursor.executemany(sql, [
+                    (adapt(start + timedelta(microseconds=offset)), pk)
+                    for offset, pk in zip(offsets[i:i + BATCH_SIZE],
+                                          self.post_ids[i:i + BATCH_SIZE])
+                ])
+
+    def follows(self, per_user):
+        """Каждый подписывается на авторов по их весам, число подписок
+        тоже распределено по Парето со средним около per_user."""
+        rnd = self.rnd
+        scale = per_user * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        limit = len(self.user_ids) - 1
+
+        def build():
+            for user_id in self.user_ids:
+                count = min(limit, int(scale * rnd.paretovariate(
+                    PARETO_ALPHA)))
+                authors = set(rnd.choices(
+                    self.user_ids, cum_weights=self.user_weights, k=count))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        bulk_insert(Follow, build(), ignore_conflicts=True)
+        self.log(f'Подписок: {Follow.objects.count()}')
+
+    def comments(self, count, reply_ratio):
+        """Комментарии достаются постам по весам Парето; часть из них —
+        ответы на уже написанные комментарии того же поста."""
+        rnd = self.rnd
+        if not self.post_ids:
+            return
+        post_weights = pareto_weights(len(self.post_ids), rnd)
+        replies = int(count * reply_ratio)
+        first_pk = (Comment.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0)
+        bulk_insert(Comment, (
+            Comment(post_id=post_id, text=text(rnd, 2, 30),
+                    author_id=author_id)
+            for post_id, author_id in zip(
+                weighted(self.post_ids, post_weights, count - replies, rnd),
+                weighted(self.user_ids, self.user_weights,
+                         count - replies, rnd))
+        ))
+        bulk_insert(Comment, self.replies(first_pk, replies))
+        self.log(f'Комментариев: {count}')
+
+    def replies(self, first_pk, count):
+        """Ответы на случайные комментарии этой генерации, в том числе
+        на ответы из предыдущих пачек — так получаются глубокие ветки."""
+        rnd = self.rnd
+        comments = Comment.objects.filter(pk__gt=first_pk)
+        while count > 0:
+            last_pk = comments.order_by('-pk').values_list(
+                'pk', flat=True).first()
+            if last_pk is None:
+                return
+            pks = {rnd.randint(first_pk + 1, last_pk)
+                   for _ in range(min(count, BATCH_SIZE))}
+            parents = comments.filter(pk__in=pks).values_list(
+                'pk', 'post_id')
+            batch = [
+                Comment(post_id=post_id, parent_id=parent_id,
+                        text=text(rnd, 2, 30),
+                        author_id=rnd.choice(self.user_ids))
+                for parent_id, post_id in parents
+            ]
+            if not batch:
+                return
+            yield from batch
+            count -= len(batch)
+
+    def finish(self):
+        """То, что при обычной записи делают сигналы."""
+        self.log(f'Пути комментариев: {Comment.objects.fill_paths()}')
+        self.log(f'Исправлено счётчиков: {counters.reconcile()}')
+        self.log(f'Записей в лентах: {rebuild_timelines()}')
+        cache.clear()
+        graph.get_cache().clear()
@@ -0,0 +1,425 @@
+"""Массовая загрузка постов, комментариев и подписок из NDJSON.
+
+Каждая строка потока — JSON-объект с полем type:
+
+    {"type": "post", "author": "leo", "text": "...", "group": "cats",
+     "pub_date": "2020-01-31T12:00:00+03:00", "ref": "p1"}
+    {"type": "comment", "author": "max", "text": "...", "post_ref": "p1",
+     "parent_ref": "c1", "created": "2020-02-01T08:00:00", "ref": "c2"}
+    {"type": "follow", "user": "max", "author": "leo"}
+
+Пост комментария задаётся id ("post") или ref поста из того же потока
+("post_ref"), родительский комментарий — так же ("parent", "parent_ref").
+Текст проверяется PostForm и CommentForm, пользователи и группы ищутся в
+словарях в памяти, которые дополняются одним запросом на пачку.
+
+Записи вставляются bulk_create пачками по CHUNK_SIZE строк, пачка — одна
+транзакция. bulk_create не отправляет сигналов, поэтому всё, что делают
+обработчики posts.signals, делается здесь сразу для пачки: счётчики,
+ленты подписок, пути комментариев и поколения кэша страниц. Запись с
+ошибкой попадает в отчёт и не мешает остальным.
+"""
+import json
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, feed, graph
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CHUNK_SIZE = 1000
+# сколько ошибок хранит отчёт, остальные только считаются
+ERRORS_LIMIT = 1000
+KINDS = ('post', 'comment', 'follow')
+
+
+def _lookup(cache, key):
+    return cache.get(key) if isinstance(key, (str, int)) else None
+
+
+def _form_errors(form):
+    return {name: list(messages) for name, messages in form.errors.items()}
+
+
+def _parse_date(record, field, errors):
+    value = record.get(field)
+    if value is None:
+        return None
+    date = parse_datetime(value) if isinstance(value, str) else None
+    if date is None:
+        errors[field] = ['Дата в формате ISO 8601']
+        return None
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def _last_id(model):
+    """Наибольший id, который таблица уже выдавала.
+
+    С AUTOINCREMENT SQLite не выдаёт id удалённых строк повторно, а
+    помнит последний выданный в sqlite_sequence, поэтому Max(pk) для
+    новых id мало: они совпали бы с id удалённых постов, на которые
+    могут ссылаться кэш и старые ссылки.
+    """
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s',
+                           [model._meta.db_table])
+            row = cursor.fetchone()
+        if row is not None:
+            last = max(last, row[0])
+    return last
+
+
+class Chunk:
+    """Объекты пачки, подготовленные к вставке."""
+
+    def __init__(self):
+        self.objects = {Post: [], Comment: [], Follow: []}
+        # (дата, id) для явных pub_date и created
+        self.dates = {Post: [], Comment: []}
+        self.post_refs = {}
+        self.comment_refs = {}
+        self.follows = set()
+        # уже существующие подписки пользователей пачки
+        self.existing = set()
+        self.group_slugs = set()
+        self.lines = []
+        self._next_ids = {}
+
+    def add(self, obj, number, date=None):
+        """Добавляет объект с заранее выделенным id."""
+        model = type(obj)
+        if model not in self._next_ids:
+            self._next_ids[model] = _last_id(model) + 1
+        obj.pk = self._next_ids[model]
+        self._next_ids[model] += 1
+        self.objects[model].append(obj)
+        if date is not None:
+            self.dates[model].append((date, obj.pk))
+        self.lines.append((number, model._meta.model_name))
+
+
+class Ingestor:
+    """Загрузка потока NDJSON пачками.
+
+    on_error вызывается для каждой отклонённой записи со словарем
+    {line, type, errors}; по умолчанию первые ERRORS_LIMIT ошибок
+    собираются в errors.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, on_error=None):
+        self.chunk_size = chunk_size
+        self.on_error = on_error
+        self.created = Counter()
+        self.errors = []
+        self.error_count = 0
+        # username -> id, slug -> id, id поста -> есть ли он,
+        # id комментария -> id его поста; None — такого нет
+        self.users = {}
+        self.groups = {}
+        self.posts = {}
+        self.comments = {}
+        # ref поста -> id, ref комментария -> (id, id поста)
+        self.post_refs = {}
+        self.comment_refs = {}
+
+    def feed(self, lines):
+        """Загружает строки потока (str или bytes). Возвращает отчёт."""
+        chunk = []
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            if line.strip():
+                chunk.append((number, line))
+            if len(chunk) >= self.chunk_size:
+                self.load(chunk)
+                chunk = []
+        if chunk:
+            self.load(chunk)
+        return self.report()
+
+    def report(self):
+        return {'created': {kind: self.created[kind] for kind in KINDS},
+                'error_count': self.error_count, 'errors': self.errors}
+
+    def error(self, number, kind, errors):
+        self.error_count += 1
+        error = {'line': number, 'type': kind, 'errors': errors}
+        if self.on_error is not None:
+            self.on_error(error)
+        elif len(self.errors) < ERRORS_LIMIT:
+            self.errors.append(error)
+
+    def parse(self, lines):
+        """Записи (номер строки, type, объект) из строк пачки."""
+        records = []
+        for number, line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.error(number, None, {'__all__': ['Строка не JSON']})
+                continue
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind not in KINDS:
+                self.error(number, kind, {'type': [
+                    f'Ожидается один из типов: {", ".join(KINDS)}']})
+                continue
+            records.append((number, kind, record))
+        return records
+
+    def load(self, lines):
+        """Проверяет и вставляет одну пачку строк."""
+        records = self.parse(lines)
+        if not records:
+            return
+        self.prefetch(records)
+        chunk = Chunk()
+        try:
+            with transaction.atomic():
+                chunk.existing = self.existing_follows(records)
+                for number, kind, record in records:
+                    errors = getattr(self, f'add_{kind}')(
+                        chunk, number, record)
+                    if errors:
+                        self.error(number, kind, errors)
+                self.save(chunk)
+        except DatabaseError as error:
+            for number, kind in chunk.lines:
+                self.error(number, kind, {'__all__': [f'Ошибка БД: {error}']})
+            return
+        self.commit(chunk)
+
+    def prefetch(self, records):
+        """Дочитывает в словари пользователей, группы, посты и
+        комментарии пачки, которых там ещё нет."""
+        usernames, slugs, post_ids, comment_ids = set(), set(), set(), set()
+        for _, kind, record in records:
+            for key, found in (('author', usernames), ('user', usernames),
+                               ('group', slugs), ('post', post_ids),
+                               ('parent', comment_ids)):
+                value = record.get(key)
+                if isinstance(value, (str, int)):
+                    found.add(value)
+        self._fill(self.users, usernames, User.objects, 'username')
+        self._fill(self.groups, slugs, Group.objects, 'slug')
+        self._fill(self.posts, post_ids, Post.objects, 'pk', 'pk')
+        self._fill(self.comments, comment_ids, Comment.objects, 'pk',
+                   'post_id')
+
+    def _fill(self, cache, keys, queryset, field, value='pk'):
+        missing = keys - cache.keys()
+        if field == 'pk':
+            missing = {key for key in missing if isinstance(key, int)}
+        if not missing:
+            return
+        found = dict(queryset.filter(**{f'{field}__in': missing})
+                     .values_list(field, value))
+        for key in missing:
+            cache[key] = found.get(key)
+
+    def existing_follows(self, records):
+        user_ids = {_lookup(self.users, record.get('user'))
+                    for _, kind, record in records if kind == 'follow'}
+        user_ids.discard(None)
+        if not user_ids:
+            return set()
+        return set(Follow.objects.filter(user_id__in=user_ids)
+                   .values_list('user_id', 'author_id'))
+
+    def user(self, record, field, errors):
+        user_id = _lookup(self.users, record.get(field))
+        if user_id is None:
+            errors[field] = ['Нет такого пользователя']
+        return user_id
+
+    def check_ref(self, record, refs, chunk_refs, errors):
+        ref = record.get('ref')
+        if ref is not None and (not isinstance(ref, str) or ref in refs
+                                or ref in chunk_refs):
+            errors['ref'] = ['ref — строка, не встречавшаяся раньше']
+        return ref
+
+    def add_post(self, chunk, number, record):
+        form = PostForm({'text': record.get('text', '')})
+        # группа ищется в словаре, картинки в NDJSON не передаются
+        del form.fields['group'], form.fields['image']
+        errors = {}
+        author_id = self.user(record, 'author', errors)
+        group_id = None
+        if record.get('group') is not None:
+            group_id = _lookup(self.groups, record['group'])
+            if group_id is None:
+                errors['group'] = ['Нет такой группы']
+        pub_date = _parse_date(record, 'pub_date', errors)
+        ref = self.check_ref(record, self.post_refs, chunk.post_refs, errors)
+        if not form.is_valid():
+            errors.update(_form_errors(form))
+        if errors:
+            return errors
+        post = form.save(commit=False)
+        post.author_id = author_id
+        post.group_id = group_id
+        chunk.add(post, number, pub_date)
+        if group_id is not None:
+            chunk.group_slugs.add(record['group'])
+        if ref is not None:
+            chunk.post_refs[ref] = post.pk
+        return None
+
+    def find_post(self, chunk, record):
+        if 'post_ref' in record:
+            ref = record['post_ref']
+            return _lookup(chunk.post_refs, ref) or _lookup(
+                self.post_refs, ref)
+        post_id = record.get('post')
+        if isinstance(post_id, int) and self.posts.get(post_id):
+            return post_id
+        return None
+
+    def find_parent(self, chunk, record):
+        """(id, id поста) родительского комментария или (None, None)."""
+        if 'parent_ref' in record:
+            ref = record['parent_ref']
+            return (_lookup(chunk.comment_refs, ref)
+                    or _lookup(self.comment_refs, ref) or (None, None))
+        parent_id = record.get('parent')
+        if isinstance(parent_id, int) and self.comments.get(parent_id):
+            return parent_id, self.comments[parent_id]
+        return None, None
+
+    def add_comment(self, chunk, number, record):
+        form = CommentForm({'text': record.get('text', '')})
+        errors = {}
+        author_id = self.user(record, 'author', errors)
+        post_id = self.find_post(chunk, record)
+        if post_id is None:
+            errors['post'] = ['Нет такого поста']
+        parent_id = None
+        if record.get('parent_ref', record.get('parent')) is not None:
+            parent_id, parent_post_id = self.find_parent(chunk, record)
+            if parent_id is None or parent_post_id != post_id:
+                errors['parent'] = ['Нет такого комментария у этого поста']
+        created = _parse_date(record, 'created', errors)
+        ref = self.check_ref(record, self.comment_refs, chunk.comment_refs,
+                             errors)
+        if not form.is_valid():
+            errors.update(_form_errors(form))
+        if errors:
+            return errors
+        comment = form.save(commit=False)
+        comment.author_id = author_id
+        comment.post_id = post_id
+        comment.parent_id = parent_id
+        chunk.add(comment, number, created)
+        if ref is not None:
+            chunk.comment_refs[ref] = (comment.pk, post_id)
+        return None
+
+    def add_follow(self, chunk, number, record):
+        errors = {}
+        user_id = self.user(record, 'user', errors)
+        author_id = self.user(record, 'author', errors)
+        if errors:
+            return errors
+        if user_id == author_id:
+            return {'author': ['Нельзя подписаться на самого себя']}
+        pair = (user_id, author_id)
+        # повторная подписка ничего не меняет и ошибкой не считается
+        if pair in chunk.existing or pair in chunk.follows:
+            return None
+        chunk.follows.add(pair)
+        chunk.add(Follow(user_id=user_id, author_id=author_id), number)
+        return None
+
+    def save(self, chunk):
+        """Вставляет пачку и делает то же, что обработчики сигналов."""
+        posts = chunk.objects[Post]
+        comments = chunk.objects[Comment]
+        follows = chunk.objects[Follow]
+        for model in (Post, Comment):
+            model.objects.bulk_create(chunk.objects[model])
+            self.set_dates(model, chunk.dates[model])
+        if comments:
+            Comment.objects.filter(pk__gte=comments[0].pk).fill_paths()
+        # посты раскладываются до вставки подписок, иначе
+        # backfill_follows положил бы их в ленты второй раз
+        feed.fan_out_posts([post.pk for post in posts])
+        Follow.objects.bulk_create(follows)
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment, Follow]):
+                cursor.execute(sql)
+
+        counters.change_profiles('posts_count', Counter(
+            post.author_id for post in posts))
+        counters.change_posts(Counter(
+            comment.post_id for comment in comments))
+        counters.change_profiles('followers_count', Counter(
+            follow.author_id for follow in follows))
+        counters.change_profiles('following_count', Counter(
+            follow.user_id for follow in follows))
+        feed.add_celebrities({follow.author_id for follow in follows})
+        feed.backfill_follows([follow.pk for follow in follows])
+
+    def set_dates(self, model, dates):
+        # auto_now_add перезаписывает дату при вставке, поэтому
+        # даты из потока ставятся отдельным UPDATE
+        if not dates:
+            return
+        meta = model._meta
+        field = meta.get_field('pub_date' if model is Post else 'created')
+        sql = (f'UPDATE {meta.db_table} SET {field.column} = %s '
+               f'WHERE {meta.pk.column} = %s')
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [(adapt(date), pk) for date, pk in dates])
+
+    def commit(self, chunk):
+        """Запоминает вставленное и сбрасывает кэш затронутых страниц."""
+        posts = chunk.objects[Post]
+        comments = chunk.objects[Comment]
+        follows = chunk.objects[Follow]
+        self.post_refs.update(chunk.post_refs)
+        self.comment_refs.update(chunk.comment_refs)
+        self.posts.update((post.pk, True) for post in posts)
+        self.comments.update(
+            (comment.pk, comment.post_id) for comment in comments)
+        self.created.update(post=len(posts), comment=len(comments),
+                            follow=len(follows))
+        graph.forget({user_id for follow in follows
+                      for user_id in (follow.user_id, follow.author_id)})
+        if chunk.lines:
+            caching.bump(*self.scopes(chunk))
+
+    def scopes(self, chunk):
+        commented = {comment.post_id for comment in chunk.objects[Comment]}
+        authors = {post.author_id for post in chunk.objects[Post]}
+        authors |= set(Post.objects.filter(pk__in=commented)
+                       .values_list('author_id', flat=True))
+        users = {user_id for follow in chunk.objects[Follow]
+                 for user_id in (follow.user_id, follow.author_id)}
+        usernames = User.objects.filter(
+            pk__in=authors | users).values_list('username', flat=True)
+        followers = {follow.user_id for follow in chunk.objects[Follow]}
+        group_slugs = chunk.group_slugs | set(
+            Group.objects.filter(posts__pk__in=commented)
+            .values_list('slug', flat=True))
+        return [
+            caching.index_scope(),
+            *[caching.profile_scope(username) for username in usernames],
+            *[caching.group_scope(slug) for slug in group_slugs],
+            *[caching.post_scope(post_id) for post_id in commented],
+            *[caching.author_scope(author_id) for author_id in authors],
+            *[caching.follow_scope(user_id) for user_id in followers],
+        ]
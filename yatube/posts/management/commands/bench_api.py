@@ -0,0 +1,78 @@
+import gzip
+import statistics
+import time
+
+from django.core.cache import cache
+from django.test import Client
+from django.urls import reverse
+
+from posts.benchmarks import (BenchCommand, bulk_insert, create_posts,
+                              create_users, percentile)
+from posts.models import Comment, Group, Post
+from posts.views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает размер ответа и процессорное время на запрос '
+            'HTML-страниц и JSON API тех же лент и поста')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=50,
+                            help='Комментариев у поста')
+        parser.add_argument('--cached', action='store_true',
+                            help='Не очищать кэш: замер попаданий')
+
+    def fixtures(self, options):
+        authors = create_users(20, 'bench_api')
+        create_posts(authors, options['posts'] // len(authors))
+        group = Group.objects.create(title='Бенчмарк API', slug='bench-api',
+                                     description='Бенчмарк API')
+        Post.objects.filter(author__in=authors[:5]).update(group=group)
+        post = Post.objects.filter(author=authors[0]).latest('pub_date')
+        bulk_insert(Comment, (
+            Comment(post=post, author=authors[i % len(authors)],
+                    text=f'Комментарий {i}')
+            for i in range(options['comments'])))
+        Comment.objects.fill_paths()
+        username = authors[0].username
+        # в API столько же постов и комментариев на странице, сколько в HTML
+        posts_page = f'?limit={POSTS_PER_PAGE}'
+        return [
+            ('index', reverse('index'), reverse('api:posts') + posts_page),
+            ('group', reverse('group', args=[group.slug]),
+             reverse('api:group_posts', args=[group.slug]) + posts_page),
+            ('profile', reverse('profile', args=[username]),
+             reverse('api:author_posts', args=[username]) + posts_page),
+            ('post', reverse('post', args=[username, post.pk]),
+             reverse('api:comments', args=[username, post.pk])
+             + f'?limit={COMMENTS_PER_PAGE}'),
+        ]
+
+    def measure(self, client, url, repeat, cached):
+        """Процессорное время запроса в миллисекундах и тело ответа."""
+        timings = []
+        for _ in range(repeat):
+            if not cached:
+                cache.clear()
+            start = time.process_time()
+            response = client.get(url)
+            timings.append((time.process_time() - start) * 1000)
+        timings.sort()
+        return timings, response.content
+
+    def bench(self, **options):
+        pages = self.fixtures(options)
+        # не 127.0.0.1, чтобы не включался debug toolbar
+        client = Client(HTTP_HOST='localhost', REMOTE_ADDR='192.0.2.1')
+        for label, html_url, api_url in pages:
+            for kind, url in (('html', html_url), ('json', api_url)):
+                client.get(url)
+                timings, content = self.measure(
+                    client, url, options['repeat'], options['cached'])
+                self.stdout.write(
+                    f'{label:<8} {kind:<5} {len(content):8} B '
+                    f'{len(gzip.compress(content)):7} B gzip   '
+                    f'cpu median {statistics.median(timings):7.2f} ms   '
+                    f'p95 {percentile(timings, 0.95):7.2f} ms')
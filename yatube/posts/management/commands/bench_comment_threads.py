@@ -0,0 +1,109 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts.benchmarks import BenchCommand, bulk_insert, create_users
+from posts.models import Comment, Post
+from posts.paginator import CursorPaginator
+from posts.views import COMMENTS_PER_PAGE
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает чтение веток комментариев по materialized path '
+            'с обходом списка смежности запросом на каждый комментарий')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--depth', type=int, default=500,
+                            help='Глубина одной длинной ветки')
+        parser.add_argument('--roots', type=int, default=5000,
+                            help='Комментариев к посту в широком дереве')
+        parser.add_argument('--replies', type=int, default=3,
+                            help='Ответов на каждый из них')
+
+    def deep_thread(self, post, author, depth):
+        parent = None
+        for i in range(depth):
+            parent = Comment.objects.create(
+                post=post, author=author, parent=parent, text=f'Ответ {i}')
+        return Comment.objects.get(post=post, parent=None)
+
+    def wide_tree(self, post, authors, roots, replies):
+        bulk_insert(Comment, (
+            Comment(post=post, author=authors[i % len(authors)],
+                    text=f'Комментарий {i}')
+            for i in range(roots)
+        ))
+        root_ids = list(post.comments.values_list('pk', flat=True))
+        bulk_insert(Comment, (
+            Comment(post=post, author=authors[i % len(authors)],
+                    parent_id=root_id, text=f'Ответ {i}')
+            for root_id in root_ids for i in range(replies)
+        ))
+        Comment.objects.fill_paths()
+
+    def adjacency_page(self, post, size):
+        """Страница дерева без path: запрос ответов на каждый комментарий."""
+        page = []
+
+        def visit(comments):
+            for comment in comments:
+                if len(page) == size:
+                    return
+                page.append(comment)
+                visit(comment.replies.select_related(
+                    'author').order_by('pk')[:size])
+
+        visit(post.comments.filter(parent=None).select_related(
+            'author').order_by('pk')[:size])
+        return page
+
+    def adjacency_thread(self, root):
+        """Вся ветка без path: по запросу на каждый уровень."""
+        thread, level = [root], [root.pk]
+        while level:
+            replies = list(Comment.objects.filter(parent_id__in=level))
+            thread += replies
+            level = [reply.pk for reply in replies]
+        return thread
+
+    def report_queries(self, label, func, repeat):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        self.report(f'{label} ({len(context)} q)', func, repeat)
+
+    def bench(self, **options):
+        authors = create_users(100, 'thread_author')
+        deep_post = Post.objects.create(text='Глубокая ветка',
+                                        author=authors[0])
+        wide_post = Post.objects.create(text='Широкое дерево',
+                                        author=authors[0])
+        root = self.deep_thread(deep_post, authors[1], options['depth'])
+        self.wide_tree(wide_post, authors, options['roots'],
+                       options['replies'])
+        repeat = options['repeat']
+
+        middle = wide_post.comments.threaded()[
+            wide_post.comments.count() // 2]
+        cursor = CursorPaginator(
+            wide_post.comments.threaded(), COMMENTS_PER_PAGE
+        ).cursor_for(middle)
+
+        def path_page(post, after=None):
+            return lambda: list(CursorPaginator(
+                post.comments.threaded(), COMMENTS_PER_PAGE
+            ).cursor_page(after=after))
+
+        self.report_queries('path: deep, first page',
+                            path_page(deep_post), repeat)
+        self.report_queries('adjacency: deep, first page', lambda: (
+            self.adjacency_page(deep_post, COMMENTS_PER_PAGE)), repeat)
+        self.report_queries('path: wide, first page',
+                            path_page(wide_post), repeat)
+        self.report_queries('path: wide, middle page',
+                            path_page(wide_post, cursor), repeat)
+        self.report_queries('adjacency: wide, first page', lambda: (
+            self.adjacency_page(wide_post, COMMENTS_PER_PAGE)), repeat)
+        self.report_queries('path: deep, whole thread', lambda: list(
+            Comment.objects.subtree(root).order_by('path')), repeat)
+        self.report_queries('adjacency: deep, whole thread', lambda: (
+            self.adjacency_thread(root)), repeat)
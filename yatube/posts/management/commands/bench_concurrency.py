@@ -0,0 +1,154 @@
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.benchmarks import create_users
+from posts.models import Post
+
+ENGINES = {
+    'plain': {'ENGINE': 'django.db.backends.sqlite3', 'CONN_MAX_AGE': 0},
+    'tuned': {'ENGINE': 'yatube.sqlite',
+              'CONN_MAX_AGE': settings.DATABASES['default'].get(
+                  'CONN_MAX_AGE', 0)},
+}
+
+
+class ThreadClient(Client):
+    """Client, который не забирает исключения чужих потоков.
+
+    Сигнал got_request_exception общий: без проверки ошибка записи в одном
+    потоке всплыла бы как ошибка чтения в другом.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.thread = threading.current_thread()
+
+    def store_exc_info(self, **kwargs):
+        if threading.current_thread() is self.thread:
+            super().store_exc_info(**kwargs)
+
+
+class Command(BaseCommand):
+    help = ('Нагружает post_view чтениями и add_comment записями из многих '
+            'потоков и сравнивает обычный SQLite с настроенным бэкендом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на поток')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Доля запросов add_comment')
+        parser.add_argument('--engine', choices=ENGINES,
+                            action='append',
+                            help='Какие конфигурации сравнивать')
+
+    def use_database(self, path, config):
+        """Переключает алиас default на временную БД для всех потоков."""
+        connections['default'].close()
+        del connections['default']
+        connections.databases['default'] = {
+            **config, 'NAME': path, 'OPTIONS': {}}
+        connections.ensure_defaults('default')
+
+    def worker(self, user, urls, options, results, seed):
+        rnd = random.Random(seed)
+        # не 127.0.0.1, чтобы не включался debug toolbar
+        client = ThreadClient(HTTP_HOST='localhost', REMOTE_ADDR='192.0.2.1')
+        client.force_login(user)
+        try:
+            self.requests(client, urls, options, results, rnd)
+        finally:
+            connections.close_all()
+
+    def requests(self, client, urls, options, results, rnd):
+        for _ in range(options['requests']):
+            post_url, comment_url = rnd.choice(urls)
+            write = rnd.random() < options['write_ratio']
+            kind = 'write' if write else 'read'
+            start = time.perf_counter()
+            try:
+                if write:
+                    response = client.post(comment_url, {'text': 'Нагрузка'})
+                else:
+                    response = client.get(post_url)
+                ok = response.status_code in (200, 302)
+            except Exception as error:
+                ok = False
+                results['errors'][f'{kind}: {error}'] += 1
+            elapsed = (time.perf_counter() - start) * 1000
+            with results['lock']:
+                results[kind].append(elapsed)
+                results['ok'][kind] += ok
+
+    def run(self, name, options):
+        with tempfile.TemporaryDirectory() as directory:
+            self.use_database(os.path.join(directory, 'bench.sqlite3'),
+                              ENGINES[name])
+            call_command('migrate', verbosity=0)
+            users = create_users(options['threads'], 'bench_reader')
+            for user in users[:10]:
+                Post.objects.create(text='Пост под нагрузкой', author=user)
+            urls = [
+                (reverse('post', args=[post.author.username, post.pk]),
+                 reverse('add_comment', args=[post.author.username, post.pk]))
+                for post in Post.objects.select_related('author')
+            ]
+            results = {'read': [], 'write': [], 'ok': Counter(),
+                       'errors': Counter(), 'lock': threading.Lock()}
+            threads = [
+                threading.Thread(target=self.worker,
+                                 args=(user, urls, options, results, i))
+                for i, user in enumerate(users)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            connections.close_all()
+        self.report(name, results, elapsed)
+
+    def report(self, name, results, elapsed):
+        total = len(results['read']) + len(results['write'])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{name}: {total / elapsed:.0f} запросов/с'))
+        for kind in ('read', 'write'):
+            timings = sorted(results[kind])
+            if not timings:
+                continue
+            failed = len(timings) - results['ok'][kind]
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f'  {kind:<6} {len(timings):6} запросов   '
+                f'ошибок {failed / len(timings):7.2%}   '
+                f'median {statistics.median(timings):8.2f} ms   '
+                f'p95 {p95:8.2f} ms   max {timings[-1]:8.2f} ms')
+        for error, count in results['errors'].most_common(3):
+            self.stdout.write(f'  {count} × {error[:100]}')
+
+    def handle(self, *args, **options):
+        original = connections.databases['default']
+        # ошибки считаются в отчёте, трейсбеки django.request не нужны
+        logging.disable(logging.ERROR)
+        try:
+            for name in options['engine'] or ENGINES:
+                self.run(name, options)
+        finally:
+            logging.disable(logging.NOTSET)
+            connections['default'].close()
+            del connections['default']
+            connections.databases['default'] = original
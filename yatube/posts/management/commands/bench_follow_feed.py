@@ -0,0 +1,42 @@
+from django.core.cache import cache
+
+from posts.benchmarks import (BenchCommand, create_follows, create_posts,
+                              create_users)
+from posts.feed import CELEBRITIES_CACHE_KEY, follow_feed, rebuild_timelines
+from posts.models import Post
+from posts.views import POSTS_PER_PAGE
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает задержку чтения ленты подписок: соединение '
+            'Follow и Post против материализованной ленты')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100,
+                            help='Постов на одного автора')
+        parser.add_argument('--readers', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=50,
+                            help='На скольких авторов подписан читатель')
+
+    def bench(self, **options):
+        authors = create_users(options['authors'], 'bench_author')
+        readers = create_users(options['readers'], 'bench_reader')
+        create_posts(authors, options['posts'])
+        create_follows(readers, authors[:options['follows']])
+        rebuild_timelines()
+        reader = readers[0]
+
+        def join():
+            list(Post.objects.filter(
+                author__following__user=reader)[:POSTS_PER_PAGE])
+
+        def timeline():
+            list(follow_feed(reader)[:POSTS_PER_PAGE])
+
+        repeat = options['repeat']
+        join_ms = self.report('join Follow x Post', join, repeat)
+        feed_ms = self.report('materialized timeline', timeline, repeat)
+        self.stdout.write(f'speedup: x{join_ms / feed_ms:.1f}')
+        cache.delete(CELEBRITIES_CACHE_KEY)
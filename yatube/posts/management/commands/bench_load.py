@@ -0,0 +1,285 @@
+import io
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from posts.benchmarks import percentile
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+# доли запросов к view по умолчанию: читают намного чаще, чем пишут
+DEFAULT_MIX = {
+    'index': 25,
+    'post': 25,
+    'profile': 15,
+    'group': 10,
+    'follow_index': 10,
+    'post_comments': 5,
+    'search': 5,
+    'add_comment': 0,
+}
+# эти view доступны только после входа
+LOGIN_REQUIRED = ('follow_index', 'add_comment')
+
+
+def parse_mix(value):
+    """'index=30,post=20' -> {'index': 30, 'post': 20}."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise CommandError(
+                f'Неверная доля "{item}", доступны: {", ".join(DEFAULT_MIX)}')
+        mix[name] = int(weight)
+    return mix
+
+
+class Targets:
+    """Посты, авторы, группы, слова и читатели, к которым идут запросы.
+
+    Выбираются заранее, чтобы выборка не попадала в замеры. Популярность
+    неравномерна: первые посты выборки запрашиваются чаще остальных.
+    """
+
+    def __init__(self, rnd, size, readers):
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            raise CommandError('Нет постов: сначала manage.py generate_data')
+        pks = {rnd.randint(bounds['low'], bounds['high'])
+               for _ in range(size)}
+        self.posts = list(Post.objects.filter(pk__in=pks).values_list(
+            'pk', 'author__username', 'text'))
+        rnd.shuffle(self.posts)
+        self.weights = [1 / (rank + 1) for rank in range(len(self.posts))]
+        self.groups = list(Group.objects.values_list(
+            'slug', flat=True)[:size])
+        self.words = sorted({
+            word.strip('.,!?').lower()
+            for _, _, text in self.posts[:200] for word in text.split()
+        } - {''})
+        reader_ids = list(Follow.objects.values_list(
+            'user_id', flat=True).distinct()[:readers * 10])
+        self.readers = list(User.objects.filter(pk__in=rnd.sample(
+            reader_ids, min(readers, len(reader_ids)))))
+
+    def post(self, rnd):
+        return rnd.choices(self.posts, weights=self.weights)[0]
+
+    def url(self, name, rnd):
+        if name in ('index', 'follow_index'):
+            return reverse(name), {}
+        if name == 'group':
+            return reverse(name, args=[rnd.choice(self.groups)]), {}
+        if name == 'search':
+            return reverse(name), {'q': rnd.choice(self.words)}
+        pk, username, _ = self.post(rnd)
+        if name == 'profile':
+            return reverse(name, args=[username]), {}
+        return reverse(name, args=[username, pk]), {}
+
+
+class Session:
+    """Куки одного посетителя: вход и CSRF-токен для форм."""
+
+    def __init__(self, user=None):
+        self.cookies = SimpleCookie()
+        self.user = user
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            self.cookies.update(client.cookies)
+
+    @property
+    def header(self):
+        return '; '.join(f'{key}={morsel.value}'
+                         for key, morsel in self.cookies.items())
+
+    @property
+    def csrf_token(self):
+        morsel = self.cookies.get(settings.CSRF_COOKIE_NAME)
+        return morsel.value if morsel else None
+
+
+def call(app, session, method, path, query=None, data=None):
+    """Один запрос к WSGI-приложению в этом же процессе."""
+    body = urlencode(data or {}).encode()
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query or {}),
+        'HTTP_HOST': 'localhost',
+        # не 127.0.0.1, чтобы не включался debug toolbar
+        'REMOTE_ADDR': '192.0.2.1',
+        'HTTP_COOKIE': session.header,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split()[0])
+        response['headers'] = headers
+
+    result = app(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    for name, value in response['headers']:
+        if name.lower() == 'set-cookie':
+            session.cookies.load(value)
+    return response['status']
+
+
+class Command(BaseCommand):
+    help = ('Проигрывает смесь запросов к WSGI-приложению в этом процессе '
+            'и печатает p50/p95/p99 и пропускную способность каждого view')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Запросов в замере, без прогрева')
+        parser.add_argument('--warmup', type=int, default=200,
+                            help='Запросов до замера: кэш и шаблоны')
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--mix', type=parse_mix, default={},
+                            help='Доли view вместо смеси по умолчанию, '
+                                 'например index=30,post=20; add_comment '
+                                 'оставляет комментарии в БД')
+        parser.add_argument('--login-ratio', type=float, default=0.3,
+                            help='Доля запросов от вошедших читателей')
+        parser.add_argument('--readers', type=int, default=50,
+                            help='Сколько читателей с подписками')
+        parser.add_argument('--targets', type=int, default=1000,
+                            help='Сколько постов выбрать для запросов')
+        parser.add_argument('--seed', type=int)
+
+    def visit(self, app, targets, sessions, mix, options, rnd):
+        names, weights = zip(*mix.items())
+        name = rnd.choices(names, weights=weights)[0]
+        readers = [session for session in sessions if session.user]
+        if readers and (name in LOGIN_REQUIRED
+                        or rnd.random() < options['login_ratio']):
+            session = rnd.choice(readers)
+        else:
+            session = sessions[0]
+        path, query = targets.url(name, rnd)
+        start = time.perf_counter()
+        if name == 'add_comment':
+            status = call(app, session, 'POST', path, data={
+                'text': 'Комментарий под нагрузкой',
+                'csrfmiddlewaretoken': session.csrf_token,
+            })
+        else:
+            status = call(app, session, 'GET', path, query)
+        return name, (time.perf_counter() - start) * 1000, status < 400
+
+    def worker(self, app, targets, mix, options, seed, count, results):
+        rnd = random.Random(seed)
+        sessions = [Session()] + [Session(user) for user in targets.readers]
+        try:
+            # страница поста выдаёт CSRF-куку для формы комментария
+            pk, username, _ = targets.post(rnd)
+            for session in sessions:
+                call(app, session, 'GET', reverse('post',
+                                                  args=[username, pk]))
+            for _ in range(options['warmup']):
+                self.visit(app, targets, sessions, mix, options, rnd)
+            local = []
+            start = time.perf_counter()
+            for _ in range(count):
+                local.append(
+                    self.visit(app, targets, sessions, mix, options, rnd))
+            with results['lock']:
+                results['visits'] += local
+                results['windows'].append((start, time.perf_counter()))
+        finally:
+            self.cleanup(sessions)
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    def cleanup(self, sessions):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        for session in sessions:
+            morsel = session.cookies.get(settings.SESSION_COOKIE_NAME)
+            if morsel:
+                store(morsel.value).delete()
+
+    def report(self, visits, elapsed):
+        by_view = defaultdict(list)
+        failed = defaultdict(int)
+        for name, timing, ok in visits:
+            by_view[name].append(timing)
+            failed[name] += not ok
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{len(visits)} запросов за {elapsed:.1f} с: '
+            f'{len(visits) / elapsed:.0f} запросов/с'))
+        for name, timings in sorted(by_view.items()):
+            timings.sort()
+            self.stdout.write(
+                f'{name:<14} {len(timings):6}   '
+                f'{len(timings) / elapsed:7.1f}/с   '
+                f'ошибок {failed[name] / len(timings):6.2%}   '
+                f'p50 {statistics.median(timings):8.2f} ms   '
+                f'p95 {percentile(timings, 0.95):8.2f} ms   '
+                f'p99 {percentile(timings, 0.99):8.2f} ms')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        mix = {name: weight
+               for name, weight in (options['mix'] or DEFAULT_MIX).items()
+               if weight}
+        targets = Targets(rnd, options['targets'], options['readers'])
+        unavailable = {
+            'group': not targets.groups,
+            'search': not targets.words,
+            **{name: not targets.readers for name in LOGIN_REQUIRED},
+        }
+        mix = {name: weight for name, weight in mix.items()
+               if not unavailable.get(name)}
+        app = WSGIHandler()
+        cache.clear()
+        threads = max(options['threads'], 1)
+        results = {'visits': [], 'windows': [], 'lock': threading.Lock()}
+        jobs = [
+            threading.Thread(target=self.worker, args=(
+                app, targets, mix, options, rnd.random(),
+                options['requests'] // threads, results))
+            for _ in range(threads)
+        ]
+        # ошибки видны в отчёте, трейсбеки django.request не нужны
+        logging.disable(logging.ERROR)
+        try:
+            if threads == 1:
+                jobs[0].run()
+            else:
+                for job in jobs:
+                    job.start()
+                for job in jobs:
+                    job.join()
+        finally:
+            logging.disable(logging.NOTSET)
+        # пропускная способность — по времени замеров без прогрева
+        starts, ends = zip(*results['windows'])
+        self.report(results['visits'], max(ends) - min(starts))
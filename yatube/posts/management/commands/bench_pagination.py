@@ -0,0 +1,42 @@
+from django.core.paginator import Paginator
+
+from posts.benchmarks import BenchCommand, create_posts, create_users
+from posts.models import Post
+from posts.paginator import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает задержку первой и глубокой страницы: '
+            'Paginator (COUNT + OFFSET) против курсорной пажинации')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--page', type=int, default=10_000,
+                            help='Номер глубокой страницы')
+
+    def bench(self, **options):
+        authors = create_users(100, 'bench_author')
+        create_posts(authors, options['posts'] // len(authors))
+        posts = Post.objects.all()
+        deep = options['page']
+        repeat = options['repeat']
+
+        def offset_page(number):
+            return lambda: list(
+                Paginator(posts, POSTS_PER_PAGE).page(number).object_list)
+
+        paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+        last = posts.order_by('-pub_date', '-id')[
+            (deep - 1) * POSTS_PER_PAGE - 1]
+        cursor = paginator.cursor_for(last)
+
+        def cursor_page(after):
+            return lambda: list(CursorPaginator(
+                posts, POSTS_PER_PAGE).cursor_page(after=after))
+
+        self.report('offset: page 1', offset_page(1), repeat)
+        self.report(f'offset: page {deep}', offset_page(deep), repeat)
+        self.report('cursor: page 1', cursor_page(None), repeat)
+        self.report(f'cursor: page {deep}', cursor_page(cursor), repeat)
@@ -0,0 +1,124 @@
+import inspect
+import re
+
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import views
+from posts.benchmarks import (BenchCommand, bulk_insert, create_follows,
+                              create_posts, create_users)
+from posts.feed import rebuild_timelines
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import encode_cursor
+
+# "SCAN posts_post" (или "SCAN TABLE posts_post" в старых SQLite) без
+# "USING INDEX" означает чтение всей таблицы
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+MODELS = (Post, Comment, Follow)
+
+
+class Command(BenchCommand):
+    help = ('Печатает EXPLAIN QUERY PLAN запросов страниц лент до и после '
+            'составных индексов и падает, если запрос читает всю таблицу')
+
+    def seed(self):
+        authors = create_users(20, 'plan_author')
+        create_posts(authors, 50)
+        group = Group.objects.create(
+            title='Группа для планов', slug='plan-group', description='')
+        Post.objects.filter(author__in=authors[:5]).update(group=group)
+        reader = authors[-1]
+        create_follows([reader], authors[:10])
+        rebuild_timelines()
+        post = Post.objects.filter(author=authors[0]).first()
+        bulk_insert(Comment, (
+            Comment(post=post, author=author, text='Комментарий')
+            for author in authors
+        ))
+        tenth = Post.objects.order_by('-pub_date', '-id')[9]
+        after = {'after': encode_cursor([tenth.pub_date, tenth.pk])}
+        post_kwargs = {'username': post.author.username, 'post_id': post.pk}
+        return reader, [
+            ('index', views.index, {}, {}),
+            ('index', views.index, {}, after),
+            ('group', views.group_posts, {'slug': group.slug}, {}),
+            ('group', views.group_posts, {'slug': group.slug}, after),
+            ('profile', views.profile,
+             {'username': authors[0].username}, {}),
+            ('profile', views.profile,
+             {'username': authors[0].username}, after),
+            ('follow_index', views.follow_index, {}, {}),
+            ('follow_index', views.follow_index, {}, after),
+            ('post', views.post_view, post_kwargs, {}),
+            ('search', views.search_posts, {}, {'q': 'пост'}),
+        ]
+
+    def explain(self, reader, pages):
+        """План каждого SELECT, выполненного view, по страницам."""
+        factory = RequestFactory()
+        plans = {}
+        for name, view, kwargs, params in pages:
+            path = reverse(name, kwargs=kwargs)
+            request = factory.get(path, params)
+            request.user = reader
+            # без декораторов: кэш страниц спрятал бы запросы
+            with CaptureQueriesContext(connection) as context:
+                inspect.unwrap(view)(request, **kwargs)
+            label = f'{path}?{request.GET.urlencode()}'.rstrip('?')
+            plans[label] = []
+            with connection.cursor() as cursor:
+                for query in context.captured_queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans[label].append(
+                        (query['sql'], [row[3] for row in cursor.fetchall()]))
+        return plans
+
+    def drop_indexes(self):
+        """Схема до составных индексов: только индексы внешних ключей."""
+        with connection.cursor() as cursor:
+            for model in MODELS:
+                table = model._meta.db_table
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {index.name}')
+                for field in model._meta.concrete_fields:
+                    if field.is_relation and not field.db_index:
+                        cursor.execute(
+                            f'CREATE INDEX plan_{table}_{field.column} '
+                            f'ON {table} ({field.column})')
+
+    def bench(self, **options):
+        reader, pages = self.seed()
+        after = self.explain(reader, pages)
+        with transaction.atomic():
+            self.drop_indexes()
+            before = self.explain(reader, pages)
+            transaction.set_rollback(True)
+
+        full_scans = []
+        for label, queries in after.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            # одинаковые планы (например, N+1) печатаются один раз
+            groups = {}
+            for (sql, plan), (_, old_plan) in zip(queries, before[label]):
+                key = (tuple(old_plan), tuple(plan))
+                groups.setdefault(key, [sql, 0])[1] += 1
+            for (old_plan, plan), (sql, count) in groups.items():
+                suffix = f'  (запросов: {count})' if count > 1 else ''
+                self.stdout.write(f'  {sql[:100]}{suffix}')
+                self.stdout.write('    до:')
+                for line in old_plan:
+                    self.stdout.write(f'      {line}')
+                self.stdout.write('    после:')
+                for line in plan:
+                    self.stdout.write(f'      {line}')
+                    if FULL_SCAN.match(line):
+                        full_scans.append(f'{label}: {line}')
+        if full_scans:
+            raise CommandError(
+                'Запросы читают таблицы целиком:\n' + '\n'.join(full_scans))
+        self.stdout.write(self.style.SUCCESS('Полных просмотров таблиц нет'))
@@ -0,0 +1,116 @@
+import random
+import time
+from itertools import accumulate
+
+from django.db import connection
+
+from posts import graph
+from posts.benchmarks import BATCH_SIZE, BenchCommand, create_users
+from posts.models import Follow
+
+INSERT_SQL = (f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+              f'VALUES (%s, %s)')
+# рекомендации многошаговым соединением Follow с собой, без ограничений
+# числа соседей и весов Adamic–Adar: так их считали бы без графа
+JOIN_SQL = f"""
+    SELECT candidate, sum(weight) AS score FROM (
+        SELECT second.author_id AS candidate, {graph.FOF_WEIGHT} AS weight
+        FROM {Follow._meta.db_table} first
+        JOIN {Follow._meta.db_table} second
+            ON second.user_id = first.author_id
+        WHERE first.user_id = %s
+        UNION ALL
+        SELECT second.author_id, 1.0
+        FROM {Follow._meta.db_table} first
+        JOIN {Follow._meta.db_table} second
+            ON second.user_id = first.user_id
+        WHERE first.author_id = %s
+    )
+    WHERE candidate != %s AND candidate NOT IN (
+        SELECT author_id FROM {Follow._meta.db_table} WHERE user_id = %s)
+    GROUP BY candidate ORDER BY score DESC LIMIT {graph.RECOMMENDATIONS}"""
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает рекомендации «кого почитать» по графу подписок в '
+            'кэше с соединением Follow с собой на синтетическом графе')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=100,
+                            help='Подписок на пользователя в среднем')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def create_graph(self, users, follows, seed):
+        """Подписки с популярностью авторов по закону Ципфа.
+
+        Пишутся executemany в обход сигналов: ни лент, ни счётчиков
+        бенчмарку не нужно.
+        """
+        rng = random.Random(seed)
+        ids = [user.pk for user in users]
+        authors = ids[:]
+        rng.shuffle(authors)
+        weights = list(accumulate(1 / (rank + 1) ** 0.8
+                                  for rank in range(len(authors))))
+        edges = 0
+        rows = []
+        with connection.cursor() as cursor:
+            for user_id in ids:
+                count = max(1, int(rng.expovariate(1 / follows)))
+                chosen = set(rng.choices(authors, cum_weights=weights,
+                                         k=count))
+                chosen.discard(user_id)
+                rows += [(user_id, author_id) for author_id in chosen]
+                if len(rows) >= BATCH_SIZE * 10:
+                    cursor.executemany(INSERT_SQL, rows)
+                    edges += len(rows)
+                    rows = []
+            cursor.executemany(INSERT_SQL, rows)
+        return ids, edges + len(rows)
+
+    def bench(self, **options):
+        users = create_users(options['users'], 'bench_graph')
+        start = time.perf_counter()
+        ids, edges = self.create_graph(users, options['follows'],
+                                       options['seed'])
+        self.stdout.write(f'graph: {len(ids)} users, {edges} edges, '
+                          f'{time.perf_counter() - start:.1f} s to insert')
+        sample = iter(ids * options['repeat'])
+        cache = graph.get_cache()
+
+        def join():
+            user_id = next(sample)
+            with connection.cursor() as cursor:
+                cursor.execute(JOIN_SQL, [user_id] * 4)
+                cursor.fetchall()
+
+        def cold():
+            cache.clear()
+            graph.recommend(next(sample))
+
+        def warm():
+            graph.recommend(next(sample))
+
+        repeat = options['repeat']
+        join_ms = self.report('self-join Follow x Follow', join, repeat)
+        cold_ms = self.report('graph, empty cache', cold, repeat)
+        # заполняет кэш списками тех же пользователей, что и замер
+        sample = iter(ids * options['repeat'])
+        for _ in range(repeat):
+            warm()
+        sample = iter(ids * options['repeat'])
+        warm_ms = self.report('graph, warm cache', warm, repeat)
+        self.stdout.write(f'speedup: x{join_ms / cold_ms:.1f} cold, '
+                          f'x{join_ms / warm_ms:.1f} warm')
+
+        cache.clear()
+        start = time.perf_counter()
+        size = sum(len(neighbours) * neighbours.itemsize
+                   for direction in (graph.FOLLOWING, graph.FOLLOWERS)
+                   for neighbours in graph.load(direction, ids).values())
+        self.stdout.write(
+            f'full graph load: {time.perf_counter() - start:.1f} s, '
+            f'{size / 2 ** 20:.1f} MiB of adjacency arrays')
+        cache.clear()
@@ -0,0 +1,60 @@
+import random
+
+from posts import search
+from posts.benchmarks import BenchCommand, bulk_insert, create_users
+from posts.models import Post
+from posts.paginator import CursorPaginator
+from posts.views import POSTS_PER_PAGE
+
+SYLLABLES = ['ка', 'ро', 'ми', 'ту', 'ле', 'на', 'со', 'ви', 'жу', 'пе',
+             'ла', 'ды', 'ше', 'бо', 'ри', 'зо']
+
+
+class Command(BenchCommand):
+    help = ('Сравнивает поиск по постам: icontains (LIKE по всей таблице) '
+            'против полнотекстового индекса FTS5')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=20_000,
+                            help='Размер словаря текстов постов')
+
+    def make_vocabulary(self, size, rnd):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rnd.choices(SYLLABLES, k=rnd.randint(2, 4))))
+        return sorted(words)
+
+    def bench(self, **options):
+        rnd = random.Random(0)
+        vocabulary = self.make_vocabulary(options['words'], rnd)
+        # частоты слов убывают примерно по закону Ципфа
+        weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+        authors = create_users(100, 'bench_author')
+        bulk_insert(Post, (
+            Post(text=' '.join(rnd.choices(vocabulary, weights, k=12)),
+                 author=authors[i % len(authors)])
+            for i in range(options['posts'])
+        ))
+        repeat = options['repeat']
+        queries = {
+            'frequent word': vocabulary[0],
+            'rare word': vocabulary[len(vocabulary) // 2],
+            'two words': f'{vocabulary[1]} {vocabulary[5]}',
+        }
+
+        for label, query in queries.items():
+            def icontains():
+                posts = Post.objects.all()
+                for term in search.get_terms(query):
+                    posts = posts.filter(text__icontains=term)
+                return list(posts[:POSTS_PER_PAGE])
+
+            def fts():
+                return list(CursorPaginator(
+                    search.search_posts(query), POSTS_PER_PAGE
+                ).cursor_page())
+
+            self.report(f'icontains: {label}', icontains, repeat)
+            self.report(f'fts5: {label}', fts, repeat)
@@ -0,0 +1,46 @@
+import logging
+
+from django.core.management.base import CommandError
+
+from posts import budgets
+from posts.benchmarks import BenchCommand
+
+
+class Command(BenchCommand):
+    help = ('Обходит все именованные URL posts, users и about на засеянных '
+            'данных и падает, если страница превысила бюджет запросов или '
+            'времени из posts/budgets.json')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(repeat=3)
+        parser.add_argument('--write', action='store_true',
+                            help='Записать бюджеты по текущему замеру')
+        parser.add_argument('--no-timing', action='store_true',
+                            help='Проверять только число запросов')
+
+    def bench(self, **options):
+        # маршруты 404 и 500 пишут в лог на каждом замере
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        results = budgets.run(options['repeat'])
+        for name, clients in sorted(results.items()):
+            for who, metrics in clients.items():
+                self.stdout.write(
+                    f'{name:<28} {who:<6} '
+                    f'запросов {metrics["queries"]:3}   '
+                    f'повторов {metrics["duplicates"]:3}   '
+                    f'SQL {metrics["sql_ms"]:7.2f} ms   '
+                    f'ответ {metrics["render_ms"]:7.2f} ms')
+
+        if options['write']:
+            budgets.save_budgets(budgets.make_budgets(results))
+            self.stdout.write(self.style.SUCCESS(
+                f'Бюджеты записаны в {budgets.BUDGETS_FILE}'))
+            return
+        violations = budgets.compare(
+            results, budgets.load_budgets(),
+            timings=not options['no_timing'])
+        if violations:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('Все страницы в бюджете'))
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import CHUNK_SIZE, EXPORTS, FORMATS
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии или подписки в NDJSON '
+            'или CSV, не держа таблицу в памяти; прерванную выгрузку в '
+            'файл можно продолжить с --resume')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('-o', '--output', default='-',
+                            help='Файл (.gz — сжатый), по умолчанию stdout')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжимать, даже если имя не кончается .gz')
+        parser.add_argument('--after', type=int,
+                            help='Выгружать строки с id больше этого')
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить прерванную выгрузку в файл '
+                                 'с курсора из <файл>.cursor')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['kind']]
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        if output == '-':
+            if options['resume']:
+                raise CommandError('--resume работает только с файлом')
+            for data, _ in export.chunks(
+                    options['format'], after=options['after'],
+                    chunk_size=options['chunk_size'], compress=compress):
+                if compress:
+                    sys.stdout.buffer.write(data)
+                else:
+                    self.stdout.write(data.decode('utf-8'), ending='')
+            return
+        cursor_path = output + '.cursor'
+        after, offset = options['after'], 0
+        if options['resume']:
+            try:
+                with open(cursor_path) as cursor_file:
+                    cursor = json.load(cursor_file)
+            except FileNotFoundError:
+                raise CommandError(f'Нет курсора {cursor_path}: выгрузка '
+                                   f'завершена или не начиналась')
+            after, offset = cursor['after'], cursor['offset']
+        count = 0
+        with open(output, 'r+b' if options['resume'] else 'wb') as file:
+            # недописанная пачка после курсора отбрасывается
+            file.truncate(offset)
+            file.seek(offset)
+            for data, after in export.chunks(
+                    options['format'], after=after, header=not offset,
+                    chunk_size=options['chunk_size'], compress=compress):
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+                count += 1
+                self.save_cursor(cursor_path, after, file.tell())
+        if os.path.exists(cursor_path):
+            os.remove(cursor_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'{output}: пачек {count}, последний id {after}'))
+
+    def save_cursor(self, path, after, offset):
+        # курсор заменяется целиком, чтобы не остался наполовину записанным
+        with open(path + '.tmp', 'w') as cursor_file:
+            json.dump({'after': after, 'offset': offset}, cursor_file)
+        os.replace(path + '.tmp', path)
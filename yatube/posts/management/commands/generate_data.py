@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.generator import DAYS, Generator
+
+
+class Command(BaseCommand):
+    help = ('Генерирует реалистичные данные для нагрузочных тестов: '
+            'активность авторов, подписки и комментарии распределены по '
+            'степенному закону')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Подписок на пользователя в среднем')
+        parser.add_argument('--comments', type=int, default=3000000)
+        parser.add_argument('--reply-ratio', type=float, default=0.3,
+                            help='Доля комментариев-ответов')
+        parser.add_argument('--group-ratio', type=float, default=0.5,
+                            help='Доля постов в группах')
+        parser.add_argument('--image-ratio', type=float, default=0,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--images', type=int, default=8,
+                            help='Сколько разных картинок создать')
+        parser.add_argument('--days', type=int, default=DAYS,
+                            help='За сколько дней разложить даты постов')
+        parser.add_argument('--prefix', default='synthetic',
+                            help='Префикс имён пользователей и групп')
+        parser.add_argument('--seed', type=int,
+                            help='Зерно генератора для воспроизводимости')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        generator = Generator(options['prefix'], options['seed'],
+                              self.stdout)
+        generator.users(options['users'])
+        generator.groups(options['groups'])
+        with search.paused_triggers():
+            generator.posts(options['posts'], options['group_ratio'],
+                            options['image_ratio'], options['images'],
+                            options['days'])
+            generator.follows(options['follows'])
+            generator.comments(options['comments'],
+                               options['reply_ratio'])
+        generator.finish()
+        if options['image_ratio']:
+            self.stdout.write('Миниатюры: manage.py generate_thumbnails')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - start:.0f} с'))
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate, generate_in_worker
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры картинок постов параллельно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.THUMBNAIL_WORKERS or 1,
+                            help='0 — строить в текущем потоке')
+        parser.add_argument('--all', action='store_true',
+                            help='Перестроить и уже готовые миниатюры')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            posts = posts.filter(thumbnail_url='')
+        post_ids = posts.values_list('pk', flat=True).iterator()
+        if not options['workers']:
+            results = [generate(post_id) for post_id in post_ids]
+        else:
+            with ThreadPoolExecutor(options['workers']) as executor:
+                results = list(executor.map(generate_in_worker, post_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр построено: {sum(results)} из {len(results)}'))
@@ -0,0 +1,57 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import THUMBNAIL_GEOMETRY, VARIANT_WIDTHS, generate
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает размер вариантов картинок постов по форматам '
+            'и ширинам с оригиналом и прежней миниатюрой JPEG')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=100,
+                            help='Сколько последних постов с картинками '
+                                 'взять в выборку')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        post_ids = list(posts.values_list('pk', flat=True)[:options['sample']])
+        missing = posts.filter(pk__in=post_ids, image_variants='')
+        built = sum(generate(post_id) for post_id in
+                    missing.values_list('pk', flat=True))
+        sample = Post.objects.filter(pk__in=post_ids).exclude(
+            image_variants='')
+
+        original = 0
+        totals = defaultdict(int)
+        for post in sample.iterator():
+            original += post.image.size
+            for variant in json.loads(post.image_variants):
+                totals[variant['width'], variant['type']] += variant['size']
+        if not original:
+            self.stdout.write('Нет постов с картинками')
+            return
+
+        mime_types = sorted({mime_type for _, mime_type in totals})
+        self.stdout.write(
+            f'Постов в выборке: {len(post_ids)}, '
+            f'вариантов построено заново: {built}')
+        self.stdout.write(f'Оригиналы: {original / 1024:.1f} КБ')
+        self.stdout.write('ширина'.ljust(8) + ''.join(
+            mime_type.ljust(24) for mime_type in mime_types))
+        legacy = totals[int(THUMBNAIL_GEOMETRY.split('x')[0]), 'image/jpeg']
+        for width in VARIANT_WIDTHS:
+            row = str(width).ljust(8)
+            for mime_type in mime_types:
+                size = totals.get((width, mime_type))
+                if size is None:
+                    row += '—'.ljust(24)
+                    continue
+                ratio = f' ({size / legacy:.0%})' if legacy else ''
+                row += f'{size / 1024:.1f} КБ{ratio}'.ljust(24)
+            self.stdout.write(row)
+        self.stdout.write(
+            f'Проценты — от прежней миниатюры JPEG {THUMBNAIL_GEOMETRY}')
@@ -0,0 +1,50 @@
+import gzip
+import json
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.ingest import CHUNK_SIZE, Ingestor
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии и подписки из файлов NDJSON; '
+            'отклонённые записи печатает в stderr строками JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+',
+                            help='Файлы NDJSON (.gz — сжатые), - — stdin')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Строк в одной транзакции')
+        parser.add_argument('--pause-search', action='store_true',
+                            help='Снять триггеры поиска на время загрузки '
+                                 'и перестроить индекс после неё')
+
+    def open(self, name):
+        if name == '-':
+            return nullcontext(sys.stdin)
+        if name.endswith('.gz'):
+            return gzip.open(name, 'rt', encoding='utf-8')
+        return open(name, encoding='utf-8')
+
+    def write_error(self, name, error):
+        self.stderr.write(json.dumps({'file': name, **error},
+                                     ensure_ascii=False))
+
+    def handle(self, *args, **options):
+        paused = (search.paused_triggers() if options['pause_search']
+                  else nullcontext())
+        with paused:
+            for name in options['files']:
+                ingestor = Ingestor(
+                    options['chunk_size'],
+                    on_error=lambda error: self.write_error(name, error))
+                with self.open(name) as lines:
+                    report = ingestor.feed(lines)
+                created = ', '.join(f'{kind}: {count}' for kind, count
+                                    in report['created'].items())
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name}: загружено {created}; '
+                    f'ошибок: {report["error_count"]}'))
@@ -0,0 +1,89 @@
+import os
+import statistics
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import profiling
+from posts.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = ('Сводка профилей запросов из PROFILING_DIR: самые медленные '
+            'view и на что уходит их время')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.PROFILING_DIR)
+        parser.add_argument('--top', type=int, default=10,
+                            help='Сколько самых медленных view показать')
+        parser.add_argument('--view',
+                            help='Склеить collapsed-стеки этого view')
+        parser.add_argument('--output',
+                            help='Файл для склеенных стеков вместо stdout')
+        parser.add_argument('--token', action='store_true',
+                            help='Напечатать токен для заголовка X-Profile')
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(profiling.make_token())
+            return
+        records = profiling.load(options['dir'])
+        if not records:
+            raise CommandError(f'Нет профилей в {options["dir"]}')
+        if options['view']:
+            self.merge(records, options)
+        else:
+            self.report(records, options['top'])
+
+    def report(self, records, top):
+        by_view = defaultdict(list)
+        for record in records:
+            by_view[record['view']].append(record)
+        rows = []
+        for view, items in by_view.items():
+            totals = sorted(item['total_ms'] for item in items)
+            rows.append((percentile(totals, 0.95), view, items, totals))
+        rows.sort(reverse=True)
+        categories = list(records[0]['categories'])
+        self.stdout.write(
+            f'{"view":<20} {"n":>5} {"p50":>9} {"p95":>9} {"max":>9} '
+            f'{"queries":>7} ' + ' '.join(f'{name:>9}' for name in categories))
+        for p95, view, items, totals in rows[:top]:
+            shares = ' '.join(
+                f'{statistics.mean(i["categories"][n] for i in items):9.2f}'
+                for n in categories)
+            queries = statistics.mean(item['queries'] for item in items)
+            self.stdout.write(
+                f'{view:<20} {len(items):5} '
+                f'{statistics.median(totals):9.2f} {p95:9.2f} '
+                f'{totals[-1]:9.2f} {queries:7.1f} {shares}')
+        self.stdout.write('Время в ms, по категориям — среднее на запрос')
+
+    def merge(self, records, options):
+        """Один collapsed-файл по всем профилям view: flamegraph.pl или
+        speedscope покажут, где оно тратит время в сумме."""
+        stacks = Counter()
+        for record in records:
+            if record['view'] != options['view']:
+                continue
+            for name in record['files']:
+                if not name.endswith('.collapsed'):
+                    continue
+                path = os.path.join(options['dir'], name)
+                if not os.path.exists(path):
+                    continue
+                with open(path, encoding='utf-8') as collapsed:
+                    for line in collapsed:
+                        stack, _, weight = line.rstrip('\n').rpartition(' ')
+                        stacks[stack] += int(weight)
+        if not stacks:
+            raise CommandError(
+                f'Нет collapsed-стеков для view {options["view"]}')
+        lines = ''.join(f'{stack} {weight}\n'
+                        for stack, weight in stacks.most_common())
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(lines)
+        else:
+            self.stdout.write(lines, ending='')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики подписчиков, подписок, постов '
+            'и комментариев по данным в БД')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        profiles, posts = reconcile(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено профилей: {profiles}, постов: {posts}'))
@@ -0,0 +1,312 @@
+"""Метрики горячих путей в текстовом формате Prometheus (/metrics).
+
+Счётчики и гистограммы живут в памяти процесса под одной блокировкой,
+поэтому обновление — это сложение в словаре. Если задан
+settings.METRICS_DIR, процесс не чаще раза в METRICS_FLUSH_INTERVAL
+секунд сохраняет снимок своих значений в отдельный файл, а /metrics
+складывает снимки всех процессов WSGI-сервера. Файлы завершившихся
+процессов остаются, чтобы счётчики не уменьшались; при деплое каталог
+очищают.
+
+Метрики: время ответа по именам URL, число и время SQL-запросов,
+попадания в кэш (бэкенд CACHES через MeteredCache, страницы и карточки
+через posts.caching) и время построения миниатюр.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.module_loading import import_string
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 1)
+THUMBNAIL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# имя: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'Ответы по имени URL, методу и статусу', None),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL', LATENCY_BUCKETS),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы по имени URL', None),
+    'yatube_db_query_duration_seconds': (
+        'histogram', 'Время SQL-запроса по имени URL', QUERY_BUCKETS),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения ключей бэкенда CACHES: hit или miss', None),
+    'yatube_page_cache_requests_total': (
+        'counter', 'Страницы и карточки постов из кэша: hit или miss', None),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Построение миниатюры поста', THUMBNAIL_BUCKETS),
+}
+
+
+class Registry:
+    """Значения метрик одного процесса."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.values = {}
+        self.flushed = 0.0
+        self.path = None
+        if settings.METRICS_DIR:
+            self.path = os.path.join(
+                settings.METRICS_DIR, f'{self.pid}-{time.time_ns()}.json')
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            # счётчики корзин (последняя — +Inf), сумма и число замеров
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(buckets) + 3)
+            row[bisect_left(buckets, value)] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, labels, value if isinstance(value, (int, float))
+                     else list(value)]
+                    for (name, labels), value in self.values.items()]
+
+    def flush(self, force=False):
+        """Сохраняет снимок для других процессов, не чаще интервала."""
+        now = time.monotonic()
+        if self.path is None or (
+                not force
+                and now - self.flushed < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as output:
+            json.dump(self.snapshot(), output)
+        os.replace(temporary, self.path)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Реестр текущего процесса; после fork у рабочего процесса свой."""
+    global _registry
+    if _registry is None or _registry.pid != os.getpid():
+        with _registry_lock:
+            if _registry is None or _registry.pid != os.getpid():
+                _registry = Registry()
+    return _registry
+
+
+def inc(metric, value=1, **labels):
+    get_registry().inc(metric, tuple(sorted(labels.items())), value)
+
+
+def observe(metric, value, **labels):
+    get_registry().observe(metric, tuple(sorted(labels.items())), value)
+
+
+def load_snapshots(skip=None):
+    """Снимки других процессов из settings.METRICS_DIR."""
+    directory = settings.METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.endswith('.json') or path == skip:
+            continue
+        try:
+            with open(path) as snapshot:
+                snapshots.append(json.load(snapshot))
+        except (OSError, ValueError):
+            # файл мог исчезнуть при очистке каталога
+            continue
+    return snapshots
+
+
+def collect():
+    """Сумма снимков всех процессов и живых значений текущего."""
+    registry = get_registry()
+    totals = {}
+    for snapshot in [registry.snapshot(), *load_snapshots(registry.path)]:
+        for name, labels, value in snapshot:
+            if name not in METRICS:
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            if isinstance(value, list):
+                current = totals.setdefault(key, [0] * len(value))
+                for i, item in enumerate(value):
+                    current[i] += item
+            else:
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"'
+                          for key, value in pairs) + '}'
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (metric, labels), value in sorted(totals.items()):
+            if metric != name:
+                continue
+            if kind != 'histogram':
+                lines.append(
+                    f'{name}{format_labels(labels)} {format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], value[:-2]):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket'
+                    f'{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} '
+                         f'{format_number(float(value[-2]))}')
+            lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+_state = threading.local()
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка execute, которая пишет время запроса в текущий запрос."""
+    durations = getattr(_state, 'durations', None)
+    if durations is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        durations.append(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # ставится один раз на соединение, а не входом в execute_wrapper на
+    # каждый запрос: так middleware почти ничего не стоит
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL-запросы по имени URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        durations = _state.durations = []
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.durations = None
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry = get_registry()
+        # метки в том же порядке, что у inc(): по имени
+        labels = (('method', request.method), ('view', view))
+        registry.inc('yatube_http_requests_total', (
+            ('method', request.method),
+            ('status', str(response.status_code)), ('view', view)))
+        registry.observe('yatube_http_request_duration_seconds', labels,
+                         elapsed)
+        view_labels = (('view', view),)
+        if durations:
+            registry.inc('yatube_db_queries_total', view_labels,
+                         len(durations))
+        for duration in durations:
+            registry.observe('yatube_db_query_duration_seconds',
+                             view_labels, duration)
+        registry.flush()
+        return response
+
+
+_MISSING = object()
+
+
+class MeteredCache:
+    """Бэкенд кэша, считающий попадания бэкенда из OPTIONS['BACKEND'].
+
+    CACHES = {'default': {
+        'BACKEND': 'posts.metrics.MeteredCache',
+        'OPTIONS': {'BACKEND': 'django.core.cache.backends...'},
+    }}
+    Остальные методы передаются обёрнутому бэкенду как есть.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        backend = options.pop('BACKEND')
+        self._name = options.pop('METRICS_NAME', 'default')
+        self._cache = import_string(backend)(
+            location, {**params, 'OPTIONS': options})
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def __contains__(self, key):
+        return key in self._cache
+
+    def _record(self, hits, misses):
+        if hits:
+            inc('yatube_cache_requests_total', hits,
+                cache=self._name, result='hit')
+        if misses:
+            inc('yatube_cache_requests_total', misses,
+                cache=self._name, result='miss')
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, _MISSING, version=version)
+        hit = value is not _MISSING
+        self._record(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._cache.get_many(keys, version=version)
+        self._record(len(found), len(keys) - len(found))
+        return found
@@ -0,0 +1,84 @@
+from django.db import migrations
+
+TABLE = 'post_search'
+# сколько первых комментариев поста попадает в индекс
+LIMIT = 200
+
+
+def comments_sql(post_id):
+    return f"""coalesce((
+        SELECT group_concat(text, ' ') FROM (
+            SELECT text FROM posts_comment WHERE post_id = {post_id}
+            ORDER BY created, id LIMIT {LIMIT})), '')"""
+
+
+def comments_trigger(name, event, row):
+    """Триггер пересобирает комментарии поста, только если изменённый
+    комментарий среди первых LIMIT, и читает не больше LIMIT строк."""
+    return f"""CREATE TRIGGER {TABLE}_{name} AFTER {event} ON posts_comment
+    WHEN (SELECT count(*) FROM (
+        SELECT 1 FROM posts_comment WHERE post_id = {row}.post_id
+        AND (created, id) < ({row}.created, {row}.id)
+        LIMIT {LIMIT})) < {LIMIT}
+    BEGIN
+        UPDATE {TABLE} SET comments = {comments_sql(f'{row}.post_id')}
+        WHERE rowid = {row}.post_id;
+    END"""
+
+
+TRIGGERS = [
+    ('comment_insert', 'INSERT', 'new'),
+    ('comment_update', 'UPDATE OF text', 'new'),
+    ('comment_delete', 'DELETE', 'old'),
+]
+CREATE_SQL = [
+    # префиксные индексы ускоряют поиск по коротким началам слов
+    f"""CREATE VIRTUAL TABLE {TABLE} USING fts5(
+        text, comments, tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4')""",
+    # совпадение в тексте поста весит больше, чем в комментариях
+    f"""INSERT INTO {TABLE}({TABLE}, rank)
+        VALUES ('rank', 'bm25(10.0, 1.0)')""",
+    f"""CREATE TRIGGER {TABLE}_post_insert AFTER INSERT ON posts_post
+    BEGIN
+        INSERT INTO {TABLE}(rowid, text, comments)
+        VALUES (new.id, new.text, '');
+    END""",
+    f"""CREATE TRIGGER {TABLE}_post_update AFTER UPDATE OF text ON posts_post
+    BEGIN
+        UPDATE {TABLE} SET text = new.text WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER {TABLE}_post_delete AFTER DELETE ON posts_post
+    BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.id;
+    END""",
+    *[comments_trigger(*trigger) for trigger in TRIGGERS],
+    f"""INSERT INTO {TABLE}(rowid, text, comments)
+        SELECT id, text, {comments_sql('posts_post.id')} FROM posts_post""",
+]
+DROP_SQL = [
+    f'DROP TRIGGER {TABLE}_{name}'
+    for name in ('post_insert', 'post_update', 'post_delete',
+                 'comment_insert', 'comment_update', 'comment_delete')
+] + [f'DROP TABLE {TABLE}']
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_SQL),
+                             run_on_sqlite(DROP_SQL)),
+    ]
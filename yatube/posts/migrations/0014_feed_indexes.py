@@ -0,0 +1,103 @@
+# Generated by Django 2.2.28 on 2026-10-18 20:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# индексы внешних ключей, которые покрывает начало составных индексов
+REDUNDANT_INDEXES = [
+    ('comment', 'post'),
+    ('follow', 'author'),
+    ('follow', 'user'),
+    ('post', 'author'),
+    ('post', 'group'),
+]
+
+
+def drop_redundant_indexes(apps, schema_editor):
+    """Удаляет одиночные индексы внешних ключей без пересоздания таблиц.
+
+    AlterField(db_index=False) на SQLite копирует таблицу целиком, а вместе
+    со старой таблицей удаляются и триггеры полнотекстового поиска.
+    """
+    introspection = schema_editor.connection.introspection
+    for model_name, field_name in REDUNDANT_INDEXES:
+        model = apps.get_model('posts', model_name)
+        table = model._meta.db_table
+        column = model._meta.get_field(field_name).column
+        with schema_editor.connection.cursor() as cursor:
+            constraints = introspection.get_constraints(cursor, table)
+        for name, info in constraints.items():
+            if (info['index'] and not info['unique']
+                    and not info['primary_key'] and info['columns'] == [column]):
+                schema_editor.execute(schema_editor.sql_delete_index % {
+                    'table': schema_editor.quote_name(table),
+                    'name': schema_editor.quote_name(name),
+                })
+
+
+def create_redundant_indexes(apps, schema_editor):
+    for model_name, field_name in REDUNDANT_INDEXES:
+        model = apps.get_model('posts', model_name)
+        schema_editor.execute(schema_editor._create_index_sql(
+            model, [model._meta.get_field(field_name)]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='comment',
+                    name='post',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.Post'),
+                ),
+                migrations.AlterField(
+                    model_name='follow',
+                    name='author',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='follow',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='author',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='group',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_redundant_indexes,
+                                     create_redundant_indexes),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follow_author_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from importlib import import_module
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+search = import_module('posts.migrations.0013_post_search')
+
+PATH_STEP = 10
+
+
+def restore_search_triggers(apps, schema_editor):
+    """Пересоздаёт триггеры поиска на posts_comment.
+
+    AddField и RemoveField на SQLite копируют таблицу целиком, и её
+    триггеры удаляются вместе со старой таблицей.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in search.TRIGGERS:
+        schema_editor.execute(
+            f'DROP TRIGGER IF EXISTS {search.TABLE}_{trigger[0]}')
+        schema_editor.execute(search.comments_trigger(*trigger))
+
+
+def fill_paths(apps, schema_editor):
+    """До этой миграции ответов нет: путь каждого комментария — его id."""
+    Comment = apps.get_model('posts', 'Comment')
+    comments = []
+    for comment in Comment.objects.only('pk').iterator():
+        comment.path = f'{comment.pk:0{PATH_STEP}x}'
+        comments.append(comment)
+    Comment.objects.bulk_update(comments, ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop,
+                             restore_search_triggers),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers,
+                             migrations.RunPython.noop),
+    ]
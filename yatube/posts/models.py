@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, transaction
 from django.db.models import F, Q
 
 User = get_user_model()
@@ -14,39 +14,140 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты вместе со всем, что нужно карточке common/post_item.html."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
+    updated = models.DateTimeField("date updated", auto_now=True)
+    # отдельные индексы внешних ключей не нужны: они покрыты составными
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name="posts")
+                               related_name="posts", db_index=False)
     group = models.ForeignKey(Group, on_delete=models.SET_NULL,
-                              related_name="posts", blank=True, null=True)
+                              related_name="posts", blank=True, null=True,
+                              db_index=False)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    thumbnail_url = models.CharField(max_length=255, blank=True)
+    thumbnail_width = models.PositiveIntegerField(blank=True, null=True)
+    thumbnail_height = models.PositiveIntegerField(blank=True, null=True)
+    # JSON-список вариантов картинки, см. posts.thumbnails.build_variants
+    image_variants = models.TextField(blank=True)
+    comments_count = models.PositiveIntegerField("comments", default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+# ширина сегмента пути комментария: его id в шестнадцатеричном виде
+PATH_STEP = 10
+
+
+def path_segment(pk):
+    return f'{pk:0{PATH_STEP}x}'
+
+
+class CommentQuerySet(models.QuerySet):
+    def threaded(self):
+        """Комментарии в порядке обхода дерева ответов вместе с авторами.
+
+        Ответы идут сразу за комментарием, на который отвечают, поэтому
+        страницу ветки можно выбрать курсором по path одним запросом.
+        """
+        return self.select_related('author').order_by('path')
+
+    def subtree(self, comment):
+        """Комментарий и все ответы на него любой глубины."""
+        # диапазон вместо LIKE: SQLite использует для него индекс
+        return self.filter(post_id=comment.post_id, path__gte=comment.path,
+                           path__lt=comment.path + 'g')
+
+    def fill_paths(self):
+        """Проставляет path комментариям, созданным в обход save()
+        (bulk_create). Родитель всегда старше ответа, поэтому при обходе
+        по id его путь уже известен."""
+        paths = {}
+        rows = self.filter(path='').order_by('pk').values_list(
+            'pk', 'parent_id', 'parent__path')
+        for pk, parent_id, parent_path in rows.iterator():
+            prefix = ''
+            if parent_id:
+                prefix = paths.get(parent_id) or parent_path
+            paths[pk] = prefix + path_segment(pk)
+        # executemany простого UPDATE на порядок быстрее bulk_update:
+        # тот строит CASE по всем id пачки для каждой строки
+        meta = self.model._meta
+        sql = (f'UPDATE {meta.db_table} SET path = %s '
+               f'WHERE {meta.pk.column} = %s')
+        with transaction.atomic(using=self.db), \
+                connections[self.db].cursor() as cursor:
+            cursor.executemany(
+                sql, ((path, pk) for pk, path in paths.items()))
+        return len(paths)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
-                             related_name="comments")
+                             related_name="comments", db_index=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name="comments")
+    parent = models.ForeignKey('self', on_delete=models.CASCADE,
+                               related_name="replies", blank=True, null=True)
     text = models.TextField()
     created = models.DateTimeField("date commented", auto_now_add=True)
+    # id всех предков и самого комментария по PATH_STEP символов:
+    # сортировка по нему даёт дерево ответов в порядке обхода
+    path = models.TextField(default='', editable=False)
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def depth(self):
+        """Уровень вложенности: 0 у комментария к самому посту."""
+        return max(len(self.path) // PATH_STEP - 1, 0)
+
+    def save(self, *args, **kwargs):
+        # путь включает id, поэтому записывается сразу после вставки
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if not self.path:
+                prefix = self.parent.path if self.parent_id else ''
+                self.path = prefix + path_segment(self.pk)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
-                             related_name="follower")
+                             related_name="follower", db_index=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name="following")
+                               related_name="following", db_index=False)
 
     class Meta:
         constraints = [
@@ -58,6 +159,34 @@ class Follow(models.Model):
                 name='user and author can not be equal'
             )
         ]
+        # (user, author) покрыт уникальным ограничением
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx')
+        ]
 
     def __str__(self):
         return f'{self.user.username} follows {self.author.username}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="feed_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="feed_entries")
+    pub_date = models.DateTimeField("date published")
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed entries')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_user_pub_date_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} in feed of {self.user_id}'
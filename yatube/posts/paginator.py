@@ -0,0 +1,150 @@
+"""Пажинация по ключу (keyset/cursor) вместо COUNT(*) и LIMIT/OFFSET.
+
+Страница задаётся курсором ?after=<token> (записи после курсора) или
+?before=<token> (записи перед курсором). Токен кодирует значения ключей
+сортировки последней/первой записи страницы, поэтому любая страница
+выбирается поиском по индексу за одно и то же время.
+"""
+import binascii
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime.datetime)
+              else value for value in values]
+    data = json.dumps(values, separators=(',', ':')).encode()
+    return urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Возвращает список значений ключей или None для битого токена."""
+    try:
+        data = urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(data)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+class CursorPaginator(Paginator):
+    """Paginator, который выбирает страницу по курсору.
+
+    Ключи сортировки берутся из order_by() выборки (или Meta.ordering
+    модели) и дополняются первичным ключом, чтобы порядок был строгим.
+    Значения ключей читаются как атрибуты объектов (или ключи строк
+    values()), поэтому сортировку по связанным полям нужно оформлять
+    через annotate().
+
+    Возвращает обычную django.core.paginator.Page: number равен 1 для
+    первой страницы и 2 для остальных, а num_pages показывает, есть ли
+    следующая, так что has_next/has_previous работают как обычно.
+    Курсоры соседних страниц доступны в next_cursor и previous_cursor.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.keys = self._get_keys()
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def _get_keys(self):
+        query = self.object_list.query
+        ordering = list(
+            query.order_by or self.object_list.model._meta.ordering)
+        names = {key.lstrip('-') for key in ordering}
+        if not names & {'pk', 'id'}:
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return [(key.lstrip('-'), key.startswith('-')) for key in ordering]
+
+    def _key_field(self, name):
+        query = self.object_list.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def _decode(self, token):
+        """Значения ключей из токена в типах их полей или None.
+
+        Токен приходит из запроса, поэтому значение не того типа (дата,
+        которую не разобрать, объект вместо числа, null) означает битый
+        курсор, а не ошибку сервера.
+        """
+        values = decode_cursor(token, len(self.keys))
+        if values is None:
+            return None
+        try:
+            values = [self._key_field(name).to_python(value)
+                      for (name, _), value in zip(self.keys, values)]
+        except (ValidationError, ValueError, TypeError):
+            return None
+        if any(value is None for value in values):
+            return None
+        return values
+
+    def _seek(self, values, backwards):
+        seek = Q()
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[i]})
+            for (prev_name, _), value in zip(self.keys[:i], values):
+                condition &= Q(**{prev_name: value})
+            seek |= condition
+        # условие на первый ключ позволяет СУБД начать с поиска по индексу
+        first_name, first_descending = self.keys[0]
+        bound = 'lte' if first_descending != backwards else 'gte'
+        return Q(**{f'{first_name}__{bound}': values[0]}) & seek
+
+    def _ordering(self, backwards=False):
+        return [f'-{name}' if descending != backwards else name
+                for name, descending in self.keys]
+
+    def cursor_for(self, obj):
+        if isinstance(obj, dict):
+            return encode_cursor([obj[name] for name, _ in self.keys])
+        return encode_cursor([getattr(obj, name) for name, _ in self.keys])
+
+    def cursor_page(self, after=None, before=None):
+        """Страница после курсора after или перед курсором before."""
+        after = after and self._decode(after)
+        before = not after and before and self._decode(before)
+        queryset = self.object_list
+        if after:
+            queryset = queryset.filter(self._seek(after, backwards=False))
+        elif before:
+            queryset = queryset.filter(self._seek(before, backwards=True))
+        queryset = queryset.order_by(*self._ordering(backwards=bool(before)))
+
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if before:
+            objects.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = bool(after), has_more
+        has_next = has_next and bool(objects)
+
+        if has_next:
+            self.next_cursor = self.cursor_for(objects[-1])
+        if has_previous and objects:
+            self.previous_cursor = self.cursor_for(objects[0])
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        return Page(objects, number, self)
+
+
+def paginate(request, object_list, per_page):
+    """Страница выборки по курсорам ?after= и ?before= из запроса."""
+    paginator = CursorPaginator(object_list, per_page)
+    return paginator.cursor_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
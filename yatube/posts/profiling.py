@@ -0,0 +1,273 @@
+"""Выборочное профилирование запросов в продакшене.
+
+ProfilingMiddleware профилирует долю settings.PROFILING_SAMPLE_RATE
+запросов и запросы с подписанным заголовком settings.PROFILING_HEADER
+(токен выдаёт manage.py profile_report --token). Остальные запросы
+проходят без профилировщика: middleware лишь бросает кубик.
+
+Профилировщик семплирующий: отдельный поток раз в
+settings.PROFILING_INTERVAL снимает стек потока запроса, поэтому код
+view не замедляется трассировкой каждого вызова. Каждый снимок относится
+к категории по самому вложенному узнаваемому кадру: SQL, кэш, миниатюры,
+шаблоны или Python. SQL-запросы и их время точно считает execute_wrapper.
+
+В settings.PROFILING_DIR пишутся collapsed-стеки (для flamegraph.pl и
+speedscope), профили speedscope и строка сводки в index.jsonl, по
+которой manage.py profile_report собирает самые медленные view.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+INDEX_FILE = 'index.jsonl'
+TOKEN_SALT = 'posts.profiling'
+# кадр относится к категории, если его модуль начинается с префикса
+CATEGORIES = (
+    ('sql', ('django.db.backends', 'sqlite3', 'psycopg2')),
+    ('cache', ('django.core.cache',)),
+    ('thumbnail', ('posts.thumbnails', 'sorl', 'PIL')),
+    ('template', ('django.template', 'django.templatetags')),
+)
+OTHER = 'python'
+
+
+def make_token():
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def check_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class Sampler(threading.Thread):
+    """Снимает стек текущего потока, пока не вызван stop().
+
+    Кадры выше root (WSGI-сервер, внешние middleware) не записываются.
+    Вес снимка — фактическое время с предыдущего, а не интервал: поток
+    запроса может удерживать GIL дольше интервала.
+    """
+
+    def __init__(self, root, interval):
+        super().__init__(daemon=True)
+        self.thread_id = threading.get_ident()
+        self.root = root
+        self.interval = interval
+        self.samples = []
+        self.done = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.samples.append((self.stack(frame), now - last))
+            last = now
+
+    def stack(self, frame):
+        stack = []
+        while frame is not None and frame is not self.root:
+            code = frame.f_code
+            stack.append((frame.f_globals.get('__name__', '?'),
+                          code.co_name, code.co_filename,
+                          code.co_firstlineno))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.samples
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+def category(stack):
+    for module, *_ in reversed(stack):
+        for name, prefixes in CATEGORIES:
+            if module.startswith(prefixes):
+                return name
+    return OTHER
+
+
+def breakdown(samples, total_ms, sql_ms):
+    """Миллисекунды по категориям.
+
+    Поток семплера получает GIL в основном тогда, когда его отпускает
+    SQLite, поэтому время между снимками непропорционально часто
+    достаётся SQL. Время SQL берётся точным, а остальное делится между
+    другими категориями по весам их снимков.
+    """
+    weights = Counter()
+    for stack, weight in samples:
+        weights[category(stack)] += weight
+    weights.pop('sql', None)
+    rest = max(total_ms - sql_ms, 0)
+    names = [name for name, _ in CATEGORIES if name != 'sql'] + [OTHER]
+    scale = rest / sum(weights.values()) if weights else 0
+    result = {'sql': round(sql_ms, 3)}
+    result.update({name: round(weights[name] * scale, 3) for name in names})
+    if not weights:
+        result[OTHER] = round(rest, 3)
+    return result
+
+
+def frame_name(frame):
+    module, function, _, _ = frame
+    return f'{module}:{function}'.replace(';', ':').replace(' ', '_')
+
+
+def collapsed(samples):
+    """Строки 'кадр;кадр;кадр вес', вес — микросекунды."""
+    stacks = Counter()
+    for stack, weight in samples:
+        if stack:
+            stacks[';'.join(map(frame_name, stack))] += weight * 1e6
+    return ''.join(f'{stack} {round(weight)}\n'
+                   for stack, weight in stacks.items() if round(weight))
+
+
+def speedscope(samples, name):
+    """Профиль в формате https://www.speedscope.app/file-format-schema.json"""
+    frames, index = [], {}
+    stacks, weights = [], []
+    for stack, weight in samples:
+        ids = []
+        for frame in stack:
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({'name': frame_name(frame),
+                               'file': frame[2], 'line': frame[3]})
+            ids.append(index[frame])
+        stacks.append(ids)
+        weights.append(round(weight * 1000, 3))
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': stacks,
+            'weights': weights,
+        }],
+        'name': name,
+        'exporter': 'yatube',
+    }
+
+
+def save(record, samples, directory=None):
+    """Пишет профили запроса и добавляет сводку в INDEX_FILE."""
+    directory = directory or settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = '{started}-{view}-{total_ms:.0f}ms'.format(**record).replace(
+        ':', '_').replace('/', '_')
+    formats = settings.PROFILING_FORMATS
+    record['files'] = []
+    if 'collapsed' in formats:
+        record['files'].append(f'{name}.collapsed')
+        with open(os.path.join(directory, f'{name}.collapsed'), 'w',
+                  encoding='utf-8') as output:
+            output.write(collapsed(samples))
+    if 'speedscope' in formats:
+        record['files'].append(f'{name}.speedscope.json')
+        with open(os.path.join(directory, f'{name}.speedscope.json'), 'w',
+                  encoding='utf-8') as output:
+            json.dump(speedscope(samples, f'{record["method"]} '
+                                          f'{record["path"]}'), output)
+    with open(os.path.join(directory, INDEX_FILE), 'a',
+              encoding='utf-8') as index:
+        index.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def load(directory=None):
+    """Сводки всех сохранённых профилей."""
+    path = os.path.join(directory or settings.PROFILING_DIR, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as index:
+        return [json.loads(line) for line in index if line.strip()]
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы.
+
+    Стоит в MIDDLEWARE сразу после MetricsMiddleware: профиль охватывает
+    остальные middleware и view, но не подсчёт метрик, а время ответа в
+    метриках включает накладные расходы профилировщика.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_sampled(self, request):
+        token = request.META.get(settings.PROFILING_HEADER)
+        if token is not None:
+            return check_token(token)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.is_sampled(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        timer = QueryTimer()
+        sampler = Sampler(sys._getframe(), settings.PROFILING_INTERVAL)
+        started = time.time()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            start = time.perf_counter()
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                samples = sampler.stop()
+                total = time.perf_counter() - start
+        match = request.resolver_match
+        milliseconds = int(started * 1000) % 1000
+        save({
+            'started': time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))
+            + f'.{milliseconds:03d}',
+            'view': match.view_name if match else 'unresolved',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'sql_ms': round(timer.seconds * 1000, 3),
+            'queries': timer.count,
+            'samples': len(samples),
+            'categories': breakdown(samples, total * 1000,
+                                    timer.seconds * 1000),
+        }, samples)
+        return response
@@ -0,0 +1,116 @@
+"""Чтение из реплик базы с read-your-writes.
+
+Реплики перечислены в settings.DATABASE_REPLICAS. ReplicaRouter отправляет
+в реплику только чтения внутри replica_reads() — их включает декоратор
+read_from_replica у безопасных GET-view лент и поста. Всё остальное, и
+любая запись, идёт в default. Реплика выбирается одна на запрос: его
+чтения видят один снимок данных и не открывают соединения с каждой.
+
+После записи ReplicaMiddleware ставит пользователю cookie на
+REPLICA_LAG_SECONDS: пока она жива, его запросы читают из default, и
+только что добавленный пост, комментарий или подписка не пропадают из-за
+отставания реплики.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'read_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Внутри блока чтения идут в реплику, с enabled=False — в default."""
+    previous = getattr(_state, 'replica', False)
+    _state.replica = enabled
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def reset_writes():
+    _state.wrote = False
+
+
+def has_written():
+    """Писал ли текущий поток в базу после reset_writes()."""
+    return getattr(_state, 'wrote', False)
+
+
+def choose_replica():
+    """Выбирает реплику для чтений текущего запроса."""
+    replicas = settings.DATABASE_REPLICAS
+    _state.alias = random.choice(replicas) if replicas else None
+    return _state.alias
+
+
+def current_replica():
+    """Реплика текущего запроса; вне запроса выбирается при первом чтении."""
+    alias = getattr(_state, 'alias', None)
+    if alias not in settings.DATABASE_REPLICAS:
+        alias = choose_replica()
+    return alias
+
+
+def is_sticky(request):
+    return STICKY_COOKIE in request.COOKIES
+
+
+def read_from_replica(view):
+    """Читает данные view из реплики, если запрос безопасный и
+    пользователь недавно ничего не записывал."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or is_sticky(request):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        # после записи в этом же запросе реплика может её ещё не видеть
+        if replicas and getattr(_state, 'replica', False) \
+                and not has_written():
+            return current_replica()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же строки, что и default
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # схема приходит в реплики вместе с репликацией
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Выбирает реплику запроса и ставит cookie чтения из default после
+    запроса, который писал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_writes()
+        choose_replica()
+        response = self.get_response(request)
+        if has_written() and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_LAG_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,136 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+На SQLite поиск идёт по таблице FTS5 post_search: строка таблицы — пост,
+её rowid равен id поста, а колонки содержат текст поста и тексты первых
+COMMENTS_INDEXED комментариев к нему. Таблицу синхронизируют триггеры
+(миграция 0013_post_search), поэтому в неё попадают и посты, созданные
+через bulk_create или напрямую в БД. На других СУБД поиск откатывается
+к icontains.
+
+Комментарии поста после COMMENTS_INDEXED-го по порядку (created, id) на
+SQLite не ищутся. Без ограничения каждый новый комментарий к посту с
+десятками тысяч комментариев переиндексировал бы их все, удерживая
+блокировку записи.
+"""
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+TABLE = 'post_search'
+MAX_TERMS = 10
+COMMENTS_INDEXED = 200
+
+# bm25 считается только для самых новых совпадений, иначе частое слово
+# заставляет ранжировать заметную часть таблицы
+CANDIDATES_SQL = f"""{TABLE}.rowid >= coalesce((
+    SELECT min(rowid) FROM (
+        SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s
+        ORDER BY rowid DESC LIMIT %s)), 0)"""
+
+REBUILD_SQL = [
+    f'DELETE FROM {TABLE}',
+    f"""INSERT INTO {TABLE}(rowid, text, comments)
+        SELECT id, text, coalesce((
+            SELECT group_concat(text, ' ') FROM (
+                SELECT text FROM posts_comment
+                WHERE post_id = posts_post.id
+                ORDER BY created, id LIMIT {COMMENTS_INDEXED})), '')
+        FROM posts_post""",
+]
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def get_terms(query):
+    """Слова запроса, не больше MAX_TERMS."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def to_match(terms):
+    """Запрос FTS5, в котором операторы FTS5 экранированы.
+
+    Последнее слово ищется как начало слова (его могут ещё дописывать),
+    остальные — целиком: префикс частого слова разворачивается в длинный
+    список совпадений и замедляет поиск.
+    """
+    return ' '.join([f'"{term}"' for term in terms[:-1]]
+                    + [f'"{terms[-1]}"*'])
+
+
+def search_posts(query):
+    """Посты, найденные по запросу, от самых релевантных.
+
+    Ранжируются settings.SEARCH_CANDIDATES самых новых совпадений.
+    Релевантность доступна в аннотации search_rank (чем меньше, тем
+    лучше), по ней и id выборку можно листать CursorPaginator.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return Post.objects.none()
+    if not is_supported():
+        condition = Q()
+        for term in terms:
+            condition &= (Q(text__icontains=term)
+                          | Q(comments__text__icontains=term))
+        return Post.objects.filter(
+            pk__in=Post.objects.filter(condition).values('pk')
+        ).order_by('-pub_date', '-id')
+    match = to_match(terms)
+    return Post.objects.extra(
+        tables=[TABLE],
+        where=[f'{TABLE}.rowid = posts_post.id', f'{TABLE} MATCH %s',
+               CANDIDATES_SQL],
+        params=[match, match, settings.SEARCH_CANDIDATES],
+    ).annotate(
+        search_rank=RawSQL(f'{TABLE}.rank', (), output_field=FloatField())
+    ).order_by('search_rank', 'id')
+
+
+def rebuild():
+    """Заполняет таблицу поиска заново по постам и комментариям."""
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+@contextmanager
+def paused_triggers():
+    """Снимает триггеры индекса на время массовой загрузки и один раз
+    перестраивает индекс после неё: триггер на каждый вставленный
+    комментарий перечитывает до COMMENTS_INDEXED соседних."""
+    if not is_supported():
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE %s", [f'{TABLE}%'])
+        triggers = cursor.fetchall()
+        for name, _ in triggers:
+            cursor.execute(f'DROP TRIGGER {name}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in triggers:
+                cursor.execute(sql)
+        rebuild()
+
+
+def filter_posts(queryset, query):
+    """Сужает выборку постов до найденных по запросу, не меняя порядок."""
+    terms = get_terms(query)
+    if not terms or not is_supported():
+        return queryset.filter(
+            pk__in=search_posts(query).order_by().values('pk'))
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+        (to_match(terms),)))
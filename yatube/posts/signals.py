@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feed, graph
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    instance._old_group_slug = None
+    if instance.pk:
+        instance._old_group_slug = Group.objects.filter(
+            posts__pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_profile(instance.author_id, 'posts_count', 1)
+        feed.fan_out(instance)
+    old_group_slug = getattr(instance, '_old_group_slug', None)
+    if old_group_slug:
+        caching.bump_post(instance, caching.group_scope(old_group_slug))
+    else:
+        caching.bump_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, 'posts_count', -1)
+    caching.bump_post(instance)
+
+
+def comment_changed(comment):
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=comment.post_id).first()
+    if post is not None:
+        caching.bump_post(post)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+    comment_changed(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    comment_changed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_profile(instance.author_id, 'followers_count', 1)
+        counters.change_profile(instance.user_id, 'following_count', 1)
+        feed.follow_added(instance)
+        graph.follow_changed(instance.user_id, instance.author_id)
+    caching.bump_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, 'followers_count', -1)
+    counters.change_profile(instance.user_id, 'following_count', -1)
+    feed.follow_removed(instance)
+    graph.follow_changed(instance.user_id, instance.author_id)
+    caching.bump_follow(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    caching.bump(caching.group_scope(instance.slug))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    caching.bump(caching.profile_scope(instance.username))
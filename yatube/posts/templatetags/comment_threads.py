@@ -0,0 +1,13 @@
+from django import template
+
+# глубже отступ не растёт, иначе длинная ветка уезжает за край страницы
+MAX_INDENT_DEPTH = 8
+INDENT_STEP = 2
+
+register = template.Library()
+
+
+@register.filter
+def thread_indent(depth):
+    """Отступ ответа в rem по его глубине в ветке."""
+    return min(depth, MAX_INDENT_DEPTH) * INDENT_STEP
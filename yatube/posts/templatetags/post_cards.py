@@ -0,0 +1,48 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import caching, thumbnails
+
+# карточки первого экрана грузят картинку сразу, остальные — лениво
+EAGER_CARDS = 2
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Карточки common/post_item.html, собранные из кэша одним get_many.
+
+    Недостающие карточки рендерятся и кладутся в кэш одним set_many.
+    """
+    user = context.get('user')
+    cards = {caching.card_key(post, user, lazy=i >= EAGER_CARDS): post
+             for i, post in enumerate(posts)}
+    cached = cache.get_many(cards)
+    missing = {
+        key: render_to_string(
+            'common/post_item.html',
+            {'post': post, 'user': user, 'lazy': i >= EAGER_CARDS})
+        for i, (key, post) in enumerate(cards.items()) if key not in cached
+    }
+    if missing:
+        cache.set_many(missing, settings.CARD_CACHE_TIMEOUT)
+    caching.record('post_card', hit=True, count=len(cached))
+    caching.record('post_card', hit=False, count=len(missing))
+    return mark_safe(''.join(
+        cached.get(key) or missing[key] for key in cards))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    return post_cards(context, [post])
+
+
+@register.inclusion_tag('common/post_image.html')
+def post_image(post, lazy=False):
+    """Картинка поста с вариантами AVIF/WebP/JPEG в <picture>."""
+    return {'post': post, 'lazy': lazy,
+            'sources': thumbnails.get_sources(post)}
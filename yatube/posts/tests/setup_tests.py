@@ -3,9 +3,11 @@ import tempfile
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase
 
+from posts import graph
 from posts.models import Comment, Follow, Group, Post
 
 User = get_user_model()
@@ -75,6 +77,8 @@ class SetUpTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
+        cache.clear()
+        graph.get_cache().clear()
         self.guest_client = Client()
         self.authorized_viewer_client = Client()
         self.authorized_viewer_client.force_login(self.viewer)
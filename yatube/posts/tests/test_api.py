@@ -0,0 +1,126 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+from .setup_tests import SetUpTests
+
+
+class ApiTests(SetUpTests):
+    def test_feeds_return_posts(self):
+        """Ленты API отдают посты с автором, группой и счётчиком."""
+        urls = [
+            reverse('api:posts'),
+            reverse('api:group_posts', kwargs=self.group_kwargs),
+            reverse('api:author_posts', kwargs=self.creator_kwargs),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                post = response.json()['results'][0]
+                self.assertEqual(post['id'], self.post.pk)
+                self.assertEqual(post['text'], self.post.text)
+                self.assertEqual(post['author']['username'],
+                                 self.creator.username)
+                self.assertEqual(post['group'], {
+                    'slug': self.group.slug, 'title': self.group.title})
+                self.assertEqual(post['comments_count'], 1)
+                self.assertEqual(post['image']['url'], self.post.image.url)
+
+    def test_post_author_and_comments(self):
+        """Пост, автор и дерево комментариев."""
+        reply = Comment.objects.create(post=self.post, author=self.creator,
+                                       parent=self.comment, text='Ответ')
+
+        response = self.guest_client.get(
+            reverse('api:post', kwargs=self.post_kwargs))
+        self.assertEqual(response.json()['id'], self.post.pk)
+
+        response = self.guest_client.get(
+            reverse('api:author', kwargs=self.creator_kwargs))
+        self.assertEqual(response.json()['posts_count'], 1)
+
+        response = self.guest_client.get(
+            reverse('api:comments', kwargs=self.post_kwargs))
+        self.assertEqual(
+            [(item['id'], item['parent'], item['depth'])
+             for item in response.json()['results']],
+            [(self.comment.pk, None, 0), (reply.pk, self.comment.pk, 1)])
+
+    def test_fields_selection(self):
+        """?fields= оставляет в ответе только выбранные поля."""
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,text'})
+        self.assertEqual(response.json()['results'][0],
+                         {'id': self.post.pk, 'text': self.post.text})
+
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_cursor_paging(self):
+        """Ссылки next обходят ленту без пропусков и повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.creator) for i in range(24))
+        ids, url = [], reverse('api:posts') + '?limit=10&fields=id'
+        while url:
+            page = self.guest_client.get(url).json()
+            ids += [post['id'] for post in page['results']]
+            url = page['next']
+        self.assertEqual(
+            ids, list(Post.objects.values_list('pk', flat=True)
+                      .order_by('-pub_date', '-pk')))
+
+        response = self.guest_client.get(reverse('api:posts'),
+                                         {'limit': '1000'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_one_query_per_page(self):
+        """Страница ленты читается одним запросом."""
+        with self.assertNumQueries(1):
+            self.guest_client.get(reverse('api:posts'))
+
+    def test_etag_changes_with_new_comment(self):
+        """На тот же ETag — 304, новый комментарий его меняет."""
+        url = reverse('api:post', kwargs=self.post_kwargs)
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Comment.objects.create(post=self.post, author=self.viewer,
+                               text='Ещё комментарий')
+
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comments_count'], 2)
+
+    def test_missing_objects_return_json_404(self):
+        """Несуществующие группа, автор и пост — 404 в JSON."""
+        urls = [
+            reverse('api:group_posts', kwargs={'slug': 'missing'}),
+            reverse('api:author', kwargs={'username': 'missing'}),
+            reverse('api:author_posts', kwargs={'username': 'missing'}),
+            reverse('api:post', kwargs={'username': self.viewer.username,
+                                        'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('error', response.json())
+
+    def test_bench_compares_html_and_json(self):
+        """Бенчмарк печатает размер и время HTML и JSON каждой страницы."""
+        out = StringIO()
+        call_command('bench_api', '--posts', '40', '--comments', '5',
+                     '--repeat', '2', stdout=out)
+        report = out.getvalue()
+        for label in ('index', 'group', 'profile', 'post'):
+            self.assertIn(f'{label:<8} html', report)
+            self.assertIn(f'{label:<8} json', report)
+        self.assertFalse(Post.objects.filter(
+            author__username__startswith='bench_api').exists())
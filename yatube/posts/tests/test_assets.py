@@ -0,0 +1,131 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from posts.assets import IMMUTABLE, StaticAssets
+
+from .setup_tests import SetUpTests
+
+CSS = b'.post-card { margin: 0 auto; padding: 1rem; }\n' * 100
+
+
+class StaticAssetsTests(SetUpTests):
+    def setUp(self):
+        super().setUp()
+        # collectstatic идёт в каждом тесте: быстрое сжатие вместо 11
+        quality = mock.patch('posts.assets.BROTLI_QUALITY', 5)
+        quality.start()
+        self.addCleanup(quality.stop)
+        source = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'wb') as css:
+            css.write(CSS)
+        with open(os.path.join(source, 'robots.txt'), 'wb') as robots:
+            robots.write(b'User-agent: *\n')
+        self.static_settings = override_settings(STATIC_ROOT=root,
+                                                 STATICFILES_DIRS=[source])
+        self.static_settings.enable()
+        self.addCleanup(self.static_settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     stdout=StringIO())
+        self.root = root
+        self.hashed = staticfiles_storage.stored_name('css/site.css')
+        self.app = StaticAssets(self.application)
+
+    def application(self, environ, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'django']
+
+    def call(self, path, **headers):
+        environ = {'PATH_INFO': path, **headers}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(headers)
+
+        result = self.app(environ, start_response)
+        response['body'] = b''.join(result)
+        if hasattr(result, 'close'):
+            result.close()
+        return response
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        """collectstatic пишет файлы с хэшем и их сжатые копии."""
+        self.assertNotEqual(self.hashed, 'css/site.css')
+        path = os.path.join(self.root, self.hashed)
+        with gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), CSS)
+        with open(path + '.br', 'rb') as compressed:
+            self.assertEqual(brotli.decompress(compressed.read()), CSS)
+        # сжатие не окупается на маленьком файле
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'robots.txt.gz')))
+
+    def test_collectstatic_requires_brotli(self):
+        """Без пакета brotli collectstatic падает, а не пропускает .br."""
+        with mock.patch('posts.assets.brotli', None):
+            with self.assertRaises(ImproperlyConfigured):
+                call_command('collectstatic', interactive=False,
+                             verbosity=0, stdout=StringIO())
+
+    def test_templates_link_hashed_names(self):
+        """Ссылки ведут на файлы с хэшем, а файлы не из манифеста
+        остаются под исходными именами."""
+        self.assertEqual(staticfiles_storage.url('css/site.css'),
+                         settings.STATIC_URL + self.hashed)
+        response = self.guest_client.get(reverse('index'))
+        self.assertContains(
+            response, settings.STATIC_URL + 'bootstrap/dist/css/')
+
+    def test_serves_encoding_client_accepts(self):
+        """Клиенту, принимающему gzip, отдаётся сжатая копия."""
+        url = settings.STATIC_URL + self.hashed
+        response = self.call(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response['body']), CSS)
+
+        response = self.call(url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertNotIn('Content-Encoding', response['headers'])
+        self.assertEqual(response['body'], CSS)
+        self.assertEqual(response['headers']['Content-Length'],
+                         str(len(CSS)))
+
+    def test_cache_headers(self):
+        """Файлы с хэшем кэшируются навсегда, остальные — ненадолго."""
+        response = self.call(settings.STATIC_URL + self.hashed)
+        self.assertEqual(response['headers']['Cache-Control'], IMMUTABLE)
+
+        response = self.call(settings.STATIC_URL + 'robots.txt')
+        self.assertEqual(response['headers']['Cache-Control'],
+                         f'public, max-age={settings.STATIC_MAX_AGE}')
+        etag = response['headers']['ETag']
+        response = self.call(settings.STATIC_URL + 'robots.txt',
+                             HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['status'], 304)
+        self.assertEqual(response['body'], b'')
+
+    def test_other_requests_go_to_application(self):
+        """Прочие адреса и неизвестные файлы обрабатывает Django."""
+        for path in ('/', settings.STATIC_URL + 'missing.css',
+                     settings.STATIC_URL + '../settings.py'):
+            with self.subTest(path=path):
+                self.assertEqual(self.call(path)['body'], b'django')
@@ -0,0 +1,48 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from posts import budgets
+
+from .setup_tests import SetUpTests
+
+
+class BudgetTests(SetUpTests):
+    """Харнесс бюджетов обходит все маршруты и ловит превышения."""
+
+    def test_routes_fit_query_budgets(self):
+        """Все именованные маршруты укладываются в budgets.json."""
+        out = StringIO()
+        call_command('check_budgets', '--no-timing', '--repeat', '1',
+                     stdout=out)
+        self.assertIn('Все страницы в бюджете', out.getvalue())
+
+    def test_every_route_has_budget(self):
+        """У каждого именованного маршрута есть бюджет."""
+        names = {name for name, _ in budgets.iter_routes()}
+        self.assertTrue(names)
+        self.assertEqual(names - set(budgets.load_budgets()), set())
+
+    def test_compare_reports_violations(self):
+        """Превышение метрики и маршрут без бюджета — нарушения."""
+        measured = {'queries': 4, 'duplicates': 1,
+                    'sql_ms': 1.0, 'render_ms': 2.0}
+        budget = dict(measured, queries=3)
+        violations = budgets.compare(
+            {'index': {'guest': measured}, 'new': {'guest': measured}},
+            {'index': {'guest': budget}})
+        self.assertEqual(violations, [
+            'index (guest): queries 4 > 3',
+            'new (guest): нет бюджета',
+        ])
+
+    def test_compare_without_timings(self):
+        """С timings=False время не проверяется."""
+        measured = {'queries': 1, 'duplicates': 0,
+                    'sql_ms': 100.0, 'render_ms': 100.0}
+        budget = dict(measured, sql_ms=1, render_ms=1)
+        results = {'index': {'guest': measured}}
+        limits = {'index': {'guest': budget}}
+        self.assertEqual(len(budgets.compare(results, limits)), 2)
+        self.assertEqual(
+            budgets.compare(results, limits, timings=False), [])
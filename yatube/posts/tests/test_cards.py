@@ -0,0 +1,44 @@
+from django.urls import reverse
+
+from posts import caching
+
+from .setup_tests import SetUpTests
+
+
+class PostCardCacheTests(SetUpTests):
+    def card_stats(self):
+        return caching.get_stats().get('post_card', {'hit': 0, 'miss': 0})
+
+    def test_cards_are_shared_between_pages(self):
+        """Карточка, отрисованная на одной странице, берётся из кэша
+           на другой."""
+        self.guest_client.get(reverse('index'))
+        before = self.card_stats()
+
+        self.guest_client.get(reverse('group', kwargs=self.group_kwargs))
+
+        after = self.card_stats()
+        self.assertEqual(after['hit'], before['hit'] + 1)
+        self.assertEqual(after['miss'], before['miss'])
+
+    def test_edit_button_depends_on_viewer(self):
+        """Кнопка редактирования видна только автору поста."""
+        edit_url = reverse('post_edit', kwargs=self.post_kwargs)
+
+        response = self.authorized_creator_client.get(reverse('index'))
+        self.assertContains(response, edit_url)
+
+        response = self.authorized_viewer_client.get(reverse('index'))
+        self.assertNotContains(response, edit_url)
+
+    def test_edited_post_card_is_rebuilt(self):
+        """После редактирования поста карточка показывает новый текст."""
+        self.guest_client.get(reverse('post', kwargs=self.post_kwargs))
+
+        self.authorized_creator_client.post(
+            reverse('post_edit', kwargs=self.post_kwargs),
+            data={'text': 'Отредактированный пост'})
+
+        response = self.guest_client.get(
+            reverse('post', kwargs=self.post_kwargs))
+        self.assertContains(response, 'Отредактированный пост')
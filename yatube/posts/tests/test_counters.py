@@ -0,0 +1,57 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from users.models import Profile
+
+from .setup_tests import SetUpTests
+
+
+class CounterTests(SetUpTests):
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (profile.followers_count, profile.following_count,
+                profile.posts_count)
+
+    def test_counters_after_setup(self):
+        """Счётчики профилей и поста соответствуют данным."""
+        self.assertEqual(self.counters(self.creator), (1, 0, 1))
+        self.assertEqual(self.counters(self.follower), (0, 1, 0))
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
+
+    def test_follow_and_unfollow_change_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        self.authorized_viewer_client.get(
+            reverse('profile_follow', kwargs=self.creator_kwargs))
+        self.assertEqual(self.counters(self.creator), (2, 0, 1))
+        self.assertEqual(self.counters(self.viewer), (0, 1, 0))
+
+        self.authorized_viewer_client.get(
+            reverse('profile_unfollow', kwargs=self.creator_kwargs))
+        self.assertEqual(self.counters(self.creator), (1, 0, 1))
+        self.assertEqual(self.counters(self.viewer), (0, 0, 0))
+
+    def test_post_and_comment_delete_change_counters(self):
+        """Удаление поста и комментария уменьшает счётчики."""
+        Comment.objects.filter(pk=self.comment.pk).delete()
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 0)
+
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(self.counters(self.creator), (1, 0, 0))
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters исправляет разошедшиеся счётчики."""
+        Profile.objects.update(
+            followers_count=7, following_count=7, posts_count=7)
+        Post.objects.update(comments_count=7)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.assertEqual(self.counters(self.creator), (1, 0, 1))
+        self.assertEqual(self.counters(self.viewer), (0, 0, 0))
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).comments_count, 1)
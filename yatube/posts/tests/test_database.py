@@ -0,0 +1,71 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from yatube.sqlite.base import PRAGMAS
+
+
+class DatabaseBackendTests(TransactionTestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        """Новое соединение получает прагмы бэкенда."""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'),
+                         PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'), PRAGMAS['cache_size'])
+
+    def test_atomic_takes_write_lock_immediately(self):
+        """atomic() начинает транзакцию с BEGIN IMMEDIATE."""
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                pass
+
+        self.assertEqual(context.captured_queries[0]['sql'],
+                         'BEGIN IMMEDIATE')
+
+    def add_replica(self, options):
+        """Копия default под псевдонимом replica с заданными OPTIONS."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            **settings.DATABASES['default'], 'NAME': path,
+            'OPTIONS': options}
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        return connections['replica']
+
+    def atomic_read(self, replica):
+        with CaptureQueriesContext(replica) as context:
+            with transaction.atomic(using='replica'):
+                with replica.cursor() as cursor:
+                    cursor.execute('SELECT count(*) FROM auth_user')
+                    cursor.fetchone()
+        return context.captured_queries[0]['sql']
+
+    def test_read_only_replica_starts_deferred_transactions(self):
+        """atomic() на реплике с query_only начинается с BEGIN DEFERRED и
+        не пытается взять блокировку на запись."""
+        replica = self.add_replica({'pragmas': {'query_only': 1}})
+        self.assertEqual(self.atomic_read(replica), 'BEGIN DEFERRED')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_alias_starts_deferred_transactions(self):
+        """Псевдоним из DATABASE_REPLICAS читает в DEFERRED-транзакциях."""
+        replica = self.add_replica({})
+        self.assertEqual(self.atomic_read(replica), 'BEGIN DEFERRED')
@@ -0,0 +1,117 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts.export import EXPORTS
+from posts.ingest import Ingestor
+from posts.models import Comment, Post
+
+from .setup_tests import SetUpTests, User
+
+
+class ExportTests(SetUpTests):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post] + [
+            Post.objects.create(text=f'Пост {i}', author=self.viewer)
+            for i in range(4)]
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, kind, fmt, **kwargs):
+        return b''.join(data for data, _ in EXPORTS[kind].chunks(fmt,
+                                                                 **kwargs))
+
+    def test_ndjson_can_be_ingested(self):
+        """Выгрузка NDJSON постов и комментариев читается загрузкой
+        posts.ingest: комментарии находят свои посты и родителей по ref."""
+        reply = Comment.objects.create(post=self.post, author=self.viewer,
+                                       parent=self.comment, text='Ответ')
+        Comment.objects.create(post=self.posts[-1], author=self.creator,
+                               text='Другой пост')
+        lines = self.export('post', 'ndjson', chunk_size=2).splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([record['id'] for record in records],
+                         [post.pk for post in self.posts])
+        self.assertEqual(records[0]['author'], self.creator.username)
+        self.assertEqual(records[0]['group'], self.group.slug)
+        self.assertEqual(records[0]['ref'], f'p{self.post.pk}')
+        comment_lines = self.export('comment', 'ndjson').splitlines()
+        self.assertEqual(json.loads(comment_lines[1])['parent_ref'],
+                         f'c{self.comment.pk}')
+
+        Post.objects.all().delete()
+        # новые id не совпадают с выгруженными
+        Post.objects.create(text='Занимает id', author=self.creator)
+        report = Ingestor().feed(lines + comment_lines)
+        self.assertEqual(report['error_count'], 0)
+        self.assertEqual(report['created']['post'], len(self.posts))
+        self.assertEqual(report['created']['comment'], 3)
+        post = Post.objects.get(text=self.post.text)
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(
+            list(post.comments.threaded().values_list('text', 'parent')),
+            [(self.comment.text, None),
+             (reply.text, post.comments.get(text=self.comment.text).pk)])
+        self.assertEqual(
+            Comment.objects.get(text='Другой пост').post.text,
+            self.posts[-1].text)
+
+    def test_csv_and_cursor(self):
+        """CSV с заголовком; after выгружает строки после курсора."""
+        rows = list(csv.reader(io.StringIO(
+            self.export('comment', 'csv').decode())))
+        self.assertEqual(rows[0], list(EXPORTS['comment'].fields))
+        self.assertEqual(rows[1][:2],
+                         [str(self.comment.pk), str(self.post.pk)])
+
+        lines = self.export('post', 'ndjson',
+                            after=self.posts[2].pk).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [post.pk for post in self.posts[3:]])
+
+    def test_command_resumes_gzip_file(self):
+        """Прерванная выгрузка в .gz продолжается с курсора, а хвост
+        недописанной пачки отбрасывается."""
+        full = os.path.join(self.directory, 'full.csv.gz')
+        call_command('export', 'post', '--format', 'csv', '-o', full,
+                     stdout=StringIO())
+        self.assertFalse(os.path.exists(full + '.cursor'))
+
+        chunks = EXPORTS['post'].chunks('csv', chunk_size=2, compress=True)
+        first, after = next(chunks)
+        partial = os.path.join(self.directory, 'partial.csv.gz')
+        with open(partial, 'wb') as file:
+            file.write(first + b'\x1f\x8b oborvano')
+        with open(partial + '.cursor', 'w') as file:
+            json.dump({'after': after, 'offset': len(first)}, file)
+
+        call_command('export', 'post', '--format', 'csv', '-o', partial,
+                     '--resume', '--chunk-size', '2', stdout=StringIO())
+
+        with gzip.open(full) as expected, gzip.open(partial) as resumed:
+            self.assertEqual(resumed.read(), expected.read())
+
+    def test_admin_action_streams_selection(self):
+        """Действие админки отдаёт выбранные объекты потоком."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.guest_client.force_login(admin)
+        selected = [self.posts[1].pk, self.posts[3].pk]
+
+        response = self.guest_client.post(
+            reverse('admin:posts_post_changelist'),
+            {'action': 'export_ndjson', '_selected_action': selected})
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        records = [json.loads(line) for line
+                   in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([record['id'] for record in records], selected)
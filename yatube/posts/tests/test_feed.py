@@ -0,0 +1,74 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from posts.feed import follow_feed, get_celebrities
+from posts.models import FeedEntry, Follow, Post
+
+from .setup_tests import SetUpTests, User
+
+
+class FeedTests(SetUpTests):
+    def feed_posts(self, user):
+        return list(FeedEntry.objects.filter(user=user).values_list(
+            'post_id', flat=True))
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        self.authorized_creator_client.post(
+            reverse('new_post'), data={'text': 'Пост для ленты'})
+        post = Post.objects.get(text='Пост для ленты')
+
+        self.assertIn(post.id, self.feed_posts(self.follower))
+        self.assertNotIn(post.id, self.feed_posts(self.viewer))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.authorized_viewer_client.get(
+            reverse('profile_follow', kwargs=self.creator_kwargs))
+        self.assertEqual(self.feed_posts(self.viewer), [self.post.id])
+
+        self.authorized_viewer_client.get(
+            reverse('profile_unfollow', kwargs=self.creator_kwargs))
+        self.assertEqual(self.feed_posts(self.viewer), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты авторов с большим числом подписчиков не раскладываются,
+           но попадают в ленту при чтении."""
+        post = Post.objects.create(text='Пост звезды', author=self.creator)
+
+        self.assertNotIn(post.id, self.feed_posts(self.follower))
+        self.assertIn(post, follow_feed(self.follower))
+        self.assertNotIn(post, follow_feed(self.viewer))
+
+    def test_author_below_limit_stops_being_celebrity(self):
+        """Автор, у которого после отписки подписчиков не больше порога,
+        снова раскладывается по лентам, даже если порог перешагнули."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.viewer, author=self.creator)
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            Follow.objects.create(user=other, author=self.creator)
+        self.assertIn(self.creator.pk, get_celebrities())
+        FeedEntry.objects.filter(user=self.follower).delete()
+
+        with override_settings(FEED_FANOUT_LIMIT=5):
+            Follow.objects.filter(user=other, author=self.creator).delete()
+
+        self.assertNotIn(self.creator.pk, get_celebrities())
+        self.assertEqual(self.feed_posts(self.follower), [self.post.id])
+        post = Post.objects.create(text='Снова в лентах', author=self.creator)
+        self.assertIn(post.id, self.feed_posts(self.viewer))
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты с нуля."""
+        expected = set(FeedEntry.objects.values_list('user_id', 'post_id'))
+        FeedEntry.objects.all().delete()
+
+        call_command('rebuild_timelines', stdout=StringIO())
+
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('user_id', 'post_id')),
+            expected)
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import AnonymousUser
+from django.urls import reverse
+
+from posts.following import FollowState
+
+from .setup_tests import SetUpTests, User
+
+
+class FollowStateTests(SetUpTests):
+    def test_pages_show_viewer_follow_state(self):
+        """Кнопка подписки зависит от того, подписан ли сам читатель, а не
+        от того, есть ли у автора подписчики."""
+        urls = [reverse('profile', kwargs=self.creator_kwargs),
+                reverse('post', kwargs=self.post_kwargs)]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_follower_client.get(url)
+                self.assertIs(response.context['following'], True)
+                self.assertContains(response, 'Отписаться')
+
+                response = self.authorized_viewer_client.get(url)
+                self.assertIs(response.context['following'], False)
+                self.assertContains(response, 'Подписаться')
+
+    def test_page_of_authors_in_one_query(self):
+        """Подписки на всех авторов страницы узнаются одним запросом и
+        больше не запрашиваются."""
+        other = User.objects.create_user(username='other')
+        state = FollowState(self.follower)
+        with self.assertNumQueries(1):
+            state.load([self.creator.pk, self.viewer.pk, other.pk])
+        with self.assertNumQueries(0):
+            self.assertTrue(state.follows(self.creator.pk))
+            self.assertFalse(state.follows(self.viewer.pk))
+            self.assertFalse(state.follows(self.follower.pk))
+
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                FollowState(AnonymousUser()).follows(self.creator.pk))
@@ -1,3 +1,5 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Comment, Post
@@ -28,6 +30,20 @@ class ModelFormsTests(SetUpTests):
                 self.assertRedirects(response, redirect_url)
                 self.assertEqual(model.objects.count(), rec_count + 1)
 
+    def test_form_pages_do_not_open_transactions(self):
+        """GET страниц с формами и невалидная форма не открывают
+        транзакцию: на SQLite она сразу берёт блокировку на запись."""
+        urls = [reverse('new_post'),
+                reverse('add_comment', kwargs=self.post_kwargs)]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    self.authorized_viewer_client.get(url)
+                    self.authorized_viewer_client.post(url, {'text': ''})
+                self.assertFalse([
+                    query for query in context.captured_queries
+                    if query['sql'].startswith(('SAVEPOINT', 'BEGIN'))])
+
 
 class PostFormTests(SetUpTests):
     def test_edit_post(self):
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.db.models import Count
+
+from posts import counters, graph, search
+from posts.generator import Generator
+from posts.models import Comment, FeedEntry, Follow, Post
+
+from .setup_tests import SetUpTests
+
+
+class GeneratorTests(SetUpTests):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('generate_data', '--users', '40', '--posts', '300',
+                     '--groups', '3', '--follows', '5', '--comments', '500',
+                     '--image-ratio', '0.2', '--images', '2', '--seed', '1',
+                     stdout=StringIO())
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master "
+                           "WHERE type = 'trigger' ORDER BY name")
+            return cursor.fetchall()
+
+    def test_generated_rows(self):
+        """Созданы посты, подписки, комментарии и ответы с путями."""
+        posts = Post.objects.filter(author__username__startswith='synthetic_')
+        self.assertEqual(posts.count(), 300)
+        self.assertTrue(posts.exclude(image='').exists())
+        self.assertTrue(posts.exclude(group=None).exists())
+        self.assertTrue(Follow.objects.filter(
+            user__username__startswith='synthetic_').exists())
+        self.assertEqual(
+            Comment.objects.filter(post__in=posts).count(), 500)
+        self.assertTrue(Comment.objects.exclude(parent=None).exists())
+        self.assertFalse(Comment.objects.filter(path='').exists())
+
+    def test_activity_is_skewed(self):
+        """Самый активный автор пишет намного больше среднего."""
+        counts = sorted(
+            Post.objects.filter(author__username__startswith='synthetic_')
+            .order_by().values_list('author').annotate(total=Count('*'))
+            .values_list('total', flat=True), reverse=True)
+        self.assertGreater(counts[0], 3 * 300 / 40)
+
+    def test_post_dates_are_spread(self):
+        """Даты постов различаются и растут вместе с id."""
+        dates = list(Post.objects.filter(
+            author__username__startswith='synthetic_'
+        ).order_by('pk').values_list('pub_date', flat=True))
+        self.assertEqual(len(set(dates)), len(dates))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater(dates[-1] - dates[0], timedelta(days=30))
+
+    def test_finish_clears_graph_cache(self):
+        """После генерации не остаётся устаревших списков подписок."""
+        graph.get_cache().set('stale', [1])
+        Generator().finish()
+        self.assertIsNone(graph.get_cache().get('stale'))
+
+    def test_derived_data_is_consistent(self):
+        """Счётчики, ленты и поиск соответствуют вставленным строкам."""
+        self.assertEqual(counters.reconcile(), (0, 0))
+        follow = Follow.objects.filter(
+            user__username__startswith='synthetic_').first()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=follow.user).count(),
+            Post.objects.filter(author__in=Follow.objects.filter(
+                user=follow.user).values('author')).count())
+        post = Post.objects.filter(
+            author__username__startswith='synthetic_').first()
+        word = post.text.split()[0].strip('.')
+        self.assertIn(post, search.search_posts(word))
+
+    def test_search_triggers_restored(self):
+        """После загрузки индекс снова обновляется триггерами."""
+        self.assertEqual(len(self.triggers()), 6)
+        post = Post.objects.create(text='Уникальнаяфраза', author=self.creator)
+        self.assertEqual(list(search.search_posts('уникальнаяфраза')), [post])
+
+    def test_load_bench_reports_every_view(self):
+        """Отчёт нагрузки содержит перцентили всех view смеси."""
+        # как в тестовом клиенте: соединение тестовой транзакции не
+        # должно закрываться по окончании запроса
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        out = StringIO()
+        call_command('bench_load', '--requests', '60', '--warmup', '5',
+                     '--readers', '3', '--seed', '1',
+                     '--mix', 'index=1,post=1,search=1,add_comment=1',
+                     stdout=out)
+        report = out.getvalue()
+        for name in ('index', 'post', 'search', 'add_comment'):
+            self.assertIn(name, report)
+        self.assertNotIn('group ', report)
+        self.assertIn('p99', report)
+        self.assertEqual(report.count('ошибок  0.00%'), 4)
@@ -0,0 +1,101 @@
+from array import array
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts import graph
+from posts.models import Follow
+
+from .setup_tests import SetUpTests, User
+
+
+class GraphTests(SetUpTests):
+    def test_lists_follow_subscriptions(self):
+        """Списки подписок загружаются из БД, хранятся в кэше и
+        сбрасываются подпиской и отпиской."""
+        self.assertEqual(list(graph.following(self.follower.pk)),
+                         [self.creator.pk])
+        self.assertEqual(list(graph.followers(self.creator.pk)),
+                         [self.follower.pk])
+        self.assertEqual(list(graph.following(self.viewer.pk)), [])
+        with self.assertNumQueries(0):
+            graph.followers(self.creator.pk)
+
+        follow = Follow.objects.create(user=self.viewer, author=self.creator)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(graph.followers(self.creator.pk)),
+                             sorted([self.follower.pk, self.viewer.pk]))
+        self.assertEqual(list(graph.following(self.viewer.pk)),
+                         [self.creator.pk])
+
+        follow.delete()
+        self.assertEqual(list(graph.followers(self.creator.pk)),
+                         [self.follower.pk])
+        self.assertEqual(list(graph.following(self.viewer.pk)), [])
+
+    def test_recommends_friends_of_friends_and_co_follows(self):
+        """Рекомендуются подписки тех, на кого подписан пользователь, и
+        подписки его подписчиков, кроме уже прочитанных."""
+        friend, popular, niche = [
+            User.objects.create_user(username=name)
+            for name in ('friend', 'popular', 'niche')]
+        Follow.objects.create(user=self.viewer, author=friend)
+        Follow.objects.create(user=self.viewer, author=self.creator)
+        Follow.objects.create(user=friend, author=popular)
+        Follow.objects.create(user=friend, author=self.creator)
+        Follow.objects.create(user=self.follower, author=popular)
+        # подписчик viewer читает niche
+        Follow.objects.create(user=self.follower, author=self.viewer)
+        Follow.objects.create(user=self.follower, author=niche)
+
+        recommended = [user_id for user_id, _
+                       in graph.recommend(self.viewer.pk)]
+        self.assertEqual(recommended, [popular.pk, niche.pk])
+        self.assertEqual(
+            graph.recommend(self.viewer.pk, exclude=[popular.pk])[0][0],
+            niche.pk)
+
+    def test_large_lists_are_sampled_across_all_ids(self):
+        """Из длинных списков берётся выборка по всему списку, а не
+        самые старые аккаунты."""
+        self.assertEqual(graph.sample(array('I', range(10)), 20),
+                         array('I', range(10)))
+        self.assertEqual(graph.sample(array('I', range(10)), 3), [0, 3, 6])
+
+        friend = User.objects.create_user(username='friend')
+        authors = [User.objects.create_user(username=f'author_{i}')
+                   for i in range(4)]
+        Follow.objects.create(user=self.viewer, author=friend)
+        for author in authors:
+            Follow.objects.create(user=friend, author=author)
+        with mock.patch.object(graph, 'MAX_CANDIDATES', 2):
+            recommended = {user_id for user_id, _
+                           in graph.recommend(self.viewer.pk)}
+        self.assertEqual(recommended, {authors[0].pk, authors[2].pk})
+
+    def test_profile_shows_recommendations(self):
+        """Профиль показывает читателю, кого почитать, и обновляется после
+        его подписки."""
+        Follow.objects.create(user=self.viewer, author=self.follower)
+        url = reverse('profile', kwargs={'username': self.viewer.username})
+
+        response = self.authorized_viewer_client.get(url)
+        self.assertEqual(response.context['recommended'], [self.creator])
+        self.assertContains(response, 'Кого почитать')
+        self.assertNotContains(self.guest_client.get(url), 'Кого почитать')
+
+        self.authorized_viewer_client.get(
+            reverse('profile_follow', kwargs=self.creator_kwargs))
+        response = self.authorized_viewer_client.get(url)
+        self.assertNotContains(response, 'Кого почитать')
+
+    def test_bench(self):
+        """Бенчмарк строит граф, сравнивает способы и откатывает данные."""
+        out = StringIO()
+        call_command('bench_recommendations', '--users', '60',
+                     '--follows', '5', '--repeat', '2', stdout=out)
+        self.assertIn('graph, warm cache', out.getvalue())
+        self.assertFalse(User.objects.filter(
+            username__startswith='bench_graph').exists())
@@ -0,0 +1,167 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+
+from posts import search
+from posts.ingest import Ingestor
+from posts.models import Comment, FeedEntry, Follow, Post
+
+from .setup_tests import SetUpTests, User
+
+
+def ndjson(*records):
+    return [json.dumps(record, ensure_ascii=False) for record in records]
+
+
+class IngestTests(SetUpTests):
+    def ingest(self, *records, chunk_size=1000):
+        return Ingestor(chunk_size).feed(ndjson(*records))
+
+    def test_loads_posts_comments_and_follows(self):
+        """Посты, ответы по ref и подписки загружаются вместе со
+        счётчиками, лентами, путями и поиском."""
+        report = self.ingest(
+            {'type': 'follow', 'user': 'test_viewer',
+             'author': 'test_creator'},
+            {'type': 'post', 'author': 'test_creator', 'ref': 'p',
+             'text': 'Загруженный пингвин', 'group': 'test-slug',
+             'pub_date': '2020-01-31T12:00:00'},
+            {'type': 'comment', 'author': 'test_viewer', 'post_ref': 'p',
+             'text': 'Первый', 'ref': 'c'},
+            {'type': 'comment', 'author': 'test_follower', 'post_ref': 'p',
+             'parent_ref': 'c', 'text': 'Ответ'},
+            chunk_size=2)
+
+        self.assertEqual(report['created'],
+                         {'post': 1, 'comment': 2, 'follow': 1})
+        self.assertEqual(report['errors'], [])
+        post = Post.objects.get(text='Загруженный пингвин')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date,
+                         datetime(2020, 1, 31, 12, tzinfo=timezone.utc))
+        self.assertEqual(post.comments_count, 2)
+        first, reply = post.comments.threaded()
+        self.assertEqual(reply.parent, first)
+        self.assertEqual(reply.depth, 1)
+
+        self.creator.profile.refresh_from_db()
+        self.viewer.profile.refresh_from_db()
+        self.assertEqual(self.creator.profile.posts_count, 2)
+        self.assertEqual(self.creator.profile.followers_count, 2)
+        self.assertEqual(self.viewer.profile.following_count, 1)
+        for user in (self.viewer, self.follower):
+            self.assertEqual(
+                set(FeedEntry.objects.filter(user=user)
+                    .values_list('post_id', flat=True)),
+                {self.post.pk, post.pk})
+        if search.is_supported():
+            self.assertEqual(list(search.search_posts('пингвин')), [post])
+
+    def test_ids_of_deleted_rows_are_not_reused(self):
+        """Загруженные посты и комментарии не получают id удалённых."""
+        post = Post.objects.create(text='Будет удалён', author=self.creator)
+        comment = Comment.objects.create(post=post, author=self.viewer,
+                                         text='Тоже')
+        deleted_ids = post.pk, comment.pk
+        post.delete()
+
+        self.ingest(
+            {'type': 'post', 'author': 'test_creator', 'ref': 'p',
+             'text': 'Новый'},
+            {'type': 'comment', 'author': 'test_viewer', 'post_ref': 'p',
+             'text': 'Новый комментарий'})
+
+        self.assertGreater(Post.objects.get(text='Новый').pk, deleted_ids[0])
+        self.assertGreater(
+            Comment.objects.get(text='Новый комментарий').pk, deleted_ids[1])
+
+    def test_pages_show_loaded_posts(self):
+        """Кэш страниц сбрасывается, как после обычной публикации."""
+        self.guest_client.get(reverse('index'))
+        self.ingest({'type': 'post', 'author': 'test_creator',
+                     'text': 'Пост из загрузки'})
+        self.assertContains(self.guest_client.get(reverse('index')),
+                            'Пост из загрузки')
+
+    def test_bad_records_do_not_abort_batch(self):
+        """Ошибочные записи попадают в отчёт, остальные загружаются."""
+        other = Post.objects.create(text='Другой пост', author=self.viewer)
+        lines = ndjson(
+            {'type': 'post', 'author': 'test_creator', 'text': ''},
+            {'type': 'post', 'author': 'missing', 'text': 'Пост',
+             'group': 'missing'},
+            {'type': 'comment', 'author': 'test_viewer', 'post': other.pk,
+             'parent': self.comment.pk, 'text': 'Не тот пост'},
+            {'type': 'follow', 'user': 'test_viewer',
+             'author': 'test_viewer'},
+            {'type': 'like'},
+            {'type': 'post', 'author': 'test_viewer', 'text': 'Хороший'},
+            {'type': 'follow', 'user': 'test_follower',
+             'author': 'test_creator'},
+        )
+        lines.insert(4, '{не json')
+
+        report = Ingestor().feed(lines)
+
+        self.assertEqual(report['created'],
+                         {'post': 1, 'comment': 0, 'follow': 0})
+        self.assertEqual(report['error_count'], 6)
+        errors = {error['line']: error['errors']
+                  for error in report['errors']}
+        self.assertEqual(set(errors), {1, 2, 3, 4, 5, 6})
+        self.assertIn('text', errors[1])
+        self.assertEqual(set(errors[2]), {'author', 'group'})
+        self.assertIn('parent', errors[3])
+        self.assertIn('author', errors[4])
+        self.assertTrue(Post.objects.filter(text='Хороший').exists())
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_endpoint_is_for_staff_only(self):
+        """Загружать через API может только персонал, с токеном CSRF."""
+        url = reverse('api:ingest')
+        body = '\n'.join(ndjson({'type': 'comment', 'author': 'test_viewer',
+                                 'post': self.post.pk, 'text': 'Из API'}))
+        for client in (self.guest_client, self.authorized_viewer_client):
+            response = client.post(url, body,
+                                   content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 403)
+            self.assertIn('error', response.json())
+
+        User.objects.filter(pk=self.creator.pk).update(is_staff=True)
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.creator)
+        response = client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 403)
+
+        client.get(reverse('new_post'))
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value
+        response = client.post(url, body, HTTP_X_CSRFTOKEN=token,
+                               content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created']['comment'], 1)
+        self.assertTrue(Comment.objects.filter(text='Из API').exists())
+
+    def test_command_reports_errors_to_stderr(self):
+        """Команда ingest печатает итог и ошибки строками JSON."""
+        handle, path = tempfile.mkstemp(suffix='.ndjson')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(ndjson(
+                {'type': 'post', 'author': 'test_viewer', 'text': 'Пост'},
+                {'type': 'post', 'author': 'missing', 'text': 'Пост'})))
+        out, err = StringIO(), StringIO()
+
+        call_command('ingest', path, '--pause-search', stdout=out,
+                     stderr=err)
+
+        self.assertIn('post: 1', out.getvalue())
+        error = json.loads(err.getvalue())
+        self.assertEqual(error['line'], 2)
+        self.assertIn('author', error['errors'])
@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import metrics, thumbnails
+
+from .setup_tests import SetUpTests
+
+
+class MetricsTests(SetUpTests):
+    def setUp(self):
+        super().setUp()
+        metrics._registry = None
+        self.addCleanup(setattr, metrics, '_registry', None)
+
+    def scrape(self):
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_request_latency_and_queries_by_url_name(self):
+        """Ответы, их время и SQL-запросы считаются по имени URL."""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        text = self.scrape()
+        self.assertIn('# TYPE yatube_http_request_duration_seconds '
+                      'histogram', text)
+        self.assertIn('yatube_http_requests_total{method="GET",'
+                      'status="200",view="index"} 2', text)
+        self.assertIn('yatube_http_request_duration_seconds_count{'
+                      'method="GET",view="index"} 2', text)
+        self.assertIn('yatube_http_request_duration_seconds_bucket{'
+                      'method="GET",view="index",le="+Inf"} 2', text)
+        self.assertIn('yatube_db_queries_total{view="index"}', text)
+
+    def test_cache_hits(self):
+        """Попадания бэкенда кэша и кэша страниц видны отдельно."""
+        self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('index'))
+        text = self.scrape()
+        self.assertIn('yatube_page_cache_requests_total{name="index",'
+                      'result="hit"} 1', text)
+        self.assertIn('yatube_page_cache_requests_total{name="index",'
+                      'result="miss"} 1', text)
+        self.assertIn('yatube_cache_requests_total{cache="default",'
+                      'result="hit"}', text)
+
+    def test_thumbnail_duration(self):
+        """Построение миниатюры попадает в гистограмму."""
+        thumbnails.generate(self.post.pk)
+        self.assertIn('yatube_thumbnail_duration_seconds_count{'
+                      'result="ok"} 1', self.scrape())
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Корзины гистограммы накопительные, значение на границе — в ней."""
+        for value in (0.005, 0.02, 20):
+            metrics.observe('yatube_http_request_duration_seconds', value,
+                            view='index')
+        text = metrics.render(metrics.collect())
+        prefix = 'yatube_http_request_duration_seconds'
+        self.assertIn(f'{prefix}_bucket{{view="index",le="0.005"}} 1', text)
+        self.assertIn(f'{prefix}_bucket{{view="index",le="0.025"}} 2', text)
+        self.assertIn(f'{prefix}_bucket{{view="index",le="10"}} 2', text)
+        self.assertIn(f'{prefix}_bucket{{view="index",le="+Inf"}} 3', text)
+        self.assertIn(f'{prefix}_sum{{view="index"}} 20.025', text)
+
+    def test_label_values_are_escaped(self):
+        """Кавычки, обратная косая черта и перевод строки экранируются."""
+        metrics.inc('yatube_page_cache_requests_total', name='a"b\\c\n',
+                    result='hit')
+        self.assertIn('name="a\\"b\\\\c\\n"',
+                      metrics.render(metrics.collect()))
+
+    def test_snapshots_of_other_processes_are_summed(self):
+        """Снимки других процессов складываются с живыми значениями."""
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS_DIR=directory):
+            metrics._registry = None
+            labels = [['name', 'index'], ['result', 'hit']]
+            with open(os.path.join(directory, '1-1.json'), 'w') as other:
+                json.dump([['yatube_page_cache_requests_total', labels, 5],
+                           ['yatube_unknown', [], 1]], other)
+            metrics.inc('yatube_page_cache_requests_total', 2,
+                        name='index', result='hit')
+            metrics.get_registry().flush(force=True)
+            self.assertEqual(len(os.listdir(directory)), 2)
+            key = ('yatube_page_cache_requests_total',
+                   (('name', 'index'), ('result', 'hit')))
+            self.assertEqual(metrics.collect(), {key: 7})
+
+    def test_registry_is_per_process(self):
+        """После fork рабочий процесс не наследует значения родителя."""
+        metrics.inc('yatube_db_queries_total', view='index')
+        metrics.get_registry().pid = -1
+        self.assertEqual(metrics.collect(), {})
+
+    def test_forbidden_for_other_addresses(self):
+        """С адреса не из METRICS_ALLOWED_IPS метрики недоступны."""
+        response = self.guest_client.get(reverse('metrics'),
+                                         REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, 403)
@@ -1,3 +1,5 @@
+from posts.models import Comment, path_segment
+
 from .setup_tests import SetUpTests
 
 
@@ -17,3 +19,50 @@ class ModelRecordsTest(SetUpTests):
         for record, value in rec_values.items():
             with self.subTest(record=record):
                 self.assertEqual(value, str(record))
+
+
+class CommentThreadTests(SetUpTests):
+    def reply(self, parent, text='Ответ'):
+        return Comment.objects.create(
+            post=self.post, author=self.viewer, parent=parent, text=text)
+
+    def test_replies_follow_their_parent(self):
+        """Ответы идут сразу за комментарием, на который отвечают."""
+        first_reply = self.reply(self.comment)
+        second_root = Comment.objects.create(
+            post=self.post, author=self.viewer, text='Второй')
+        nested = self.reply(first_reply)
+
+        self.assertEqual(
+            list(self.post.comments.threaded()),
+            [self.comment, first_reply, nested, second_root])
+        self.assertEqual([self.comment.depth, first_reply.depth,
+                          nested.depth], [0, 1, 2])
+
+    def test_subtree(self):
+        """subtree выбирает комментарий со всеми ответами любой глубины."""
+        reply = self.reply(self.comment)
+        nested = self.reply(reply)
+        Comment.objects.create(post=self.post, author=self.viewer,
+                               text='Другая ветка')
+
+        self.assertEqual(
+            list(Comment.objects.subtree(reply).order_by('path')),
+            [reply, nested])
+
+    def test_fill_paths_after_bulk_create(self):
+        """fill_paths строит пути комментариев из bulk_create."""
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.viewer, text='Массовый'),
+        ])
+        root = Comment.objects.get(text='Массовый')
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.viewer, parent=root,
+                    text='Массовый ответ'),
+        ])
+
+        self.assertEqual(Comment.objects.fill_paths(), 2)
+
+        reply = Comment.objects.get(text='Массовый ответ')
+        self.assertEqual(reply.path, Comment.objects.get(pk=root.pk).path
+                         + path_segment(reply.pk))
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import profiling
+
+from .setup_tests import SetUpTests
+
+
+class ProfilingTests(SetUpTests):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.settings = override_settings(PROFILING_DIR=self.directory)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    def test_requests_are_not_profiled_by_default(self):
+        """Без выборки и заголовка профили не пишутся."""
+        self.guest_client.get(reverse('index'))
+        self.assertEqual(profiling.load(), [])
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_is_saved(self):
+        """Профиль запроса попадает в сводку вместе с файлами стеков."""
+        self.guest_client.get(reverse('post', kwargs=self.post_kwargs))
+        [record] = profiling.load()
+        self.assertEqual(record['view'], 'post')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertEqual(set(record['categories']),
+                         {'sql', 'cache', 'thumbnail', 'template', 'python'})
+        self.assertAlmostEqual(sum(record['categories'].values()),
+                               record['total_ms'], delta=0.01)
+        for name in record['files']:
+            self.assertTrue(
+                os.path.exists(os.path.join(self.directory, name)))
+
+    def test_signed_header_enables_profiling(self):
+        """Запрос с подписанным заголовком профилируется, с чужим — нет."""
+        self.guest_client.get(reverse('index'), HTTP_X_PROFILE='forged')
+        self.assertEqual(profiling.load(), [])
+        self.guest_client.get(reverse('index'),
+                              HTTP_X_PROFILE=profiling.make_token())
+        self.assertEqual(len(profiling.load()), 1)
+
+    def test_exports(self):
+        """collapsed и speedscope строятся из одних и тех же снимков."""
+        view = ('posts.views', 'index', 'views.py', 1)
+        query = ('django.db.backends.utils', 'execute', 'utils.py', 2)
+        render = ('django.template.base', 'render', 'base.py', 3)
+        samples = [((view, query), 0.002), ((view, render), 0.003),
+                   ((view, render), 0.001)]
+        self.assertEqual(profiling.collapsed(samples), (
+            'posts.views:index;django.db.backends.utils:execute 2000\n'
+            'posts.views:index;django.template.base:render 4000\n'))
+        profile = profiling.speedscope(samples, 'GET /')
+        self.assertEqual(len(profile['shared']['frames']), 3)
+        self.assertEqual(profile['profiles'][0]['samples'],
+                         [[0, 1], [0, 2], [0, 2]])
+        self.assertEqual(profile['profiles'][0]['endValue'], 6)
+        self.assertEqual(
+            profiling.breakdown(samples, total_ms=10, sql_ms=2),
+            {'sql': 2, 'cache': 0, 'thumbnail': 0, 'template': 8,
+             'python': 0})
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_report_and_merge(self):
+        """Отчёт показывает view, а склейка — стеки одного view."""
+        for _ in range(3):
+            self.guest_client.get(reverse('index'))
+        self.guest_client.get(reverse('post', kwargs=self.post_kwargs))
+        out = StringIO()
+        call_command('profile_report', stdout=out)
+        self.assertIn('index', out.getvalue())
+        self.assertIn('post', out.getvalue())
+
+        with open(os.path.join(self.directory, 'x.collapsed'), 'w') as f:
+            f.write('a;b 5\n')
+        with open(os.path.join(self.directory, 'index.jsonl'), 'a') as f:
+            f.write(json.dumps({'view': 'merged', 'files': [
+                'x.collapsed', 'x.collapsed']}) + '\n')
+        out = StringIO()
+        call_command('profile_report', '--view', 'merged', stdout=out)
+        self.assertEqual(out.getvalue(), 'a;b 10\n')
+
+    def test_token(self):
+        """--token печатает токен, который принимает middleware."""
+        out = StringIO()
+        call_command('profile_report', '--token', stdout=out)
+        self.assertTrue(profiling.check_token(out.getvalue().strip()))
@@ -0,0 +1,72 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+from .setup_tests import SetUpTests
+
+User = get_user_model()
+
+
+class QueryBudgetTests(SetUpTests):
+    """Число SQL-запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        for i in range(POSTS_PER_PAGE * 2):
+            post = Post.objects.create(
+                text='Пост для подсчёта запросов ' + str(i),
+                author=cls.creator,
+                group=cls.group
+            )
+            Comment.objects.create(
+                post=post, author=cls.viewer, text='Комментарий')
+
+    def test_feed_pages_query_budget(self):
+        """Страницы с карточками постов укладываются в бюджет запросов."""
+        url_client_budgets = {
+            reverse('index'): (self.guest_client, 1),
+            reverse('group', kwargs=self.group_kwargs):
+                (self.guest_client, 2),
+            reverse('profile', kwargs=self.creator_kwargs):
+                (self.guest_client, 2),
+            reverse('follow_index'): (self.authorized_follower_client, 5),
+        }
+
+        for url, (client, budget) in url_client_budgets.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(budget):
+                    client.get(url)
+
+    def test_post_page_query_budget(self):
+        """Страница поста укладывается в бюджет запросов при любом
+        числе комментариев и комментаторов."""
+        commenters = [
+            User.objects.create_user(username=f'commenter_{i}')
+            for i in range(COMMENTS_PER_PAGE * 2)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=author, text='Комментарий')
+            for author in commenters
+        )
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.guest_client.get(reverse('post', kwargs=self.post_kwargs))
+
+
+class QueryPlanTests(SetUpTests):
+    def test_feed_queries_use_indexes(self):
+        """Запросы страниц лент не читают таблицы целиком."""
+        out = StringIO()
+
+        call_command('bench_query_plans', stdout=out)
+
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
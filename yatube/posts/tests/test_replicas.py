@@ -0,0 +1,119 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.replicas import (STICKY_COOKIE, ReplicaRouter, choose_replica,
+                            replica_reads, reset_writes)
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика — отдельный файл SQLite, скопированный из default и
+    больше не обновляемый, то есть бесконечно отстающий."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='test_author')
+        self.post = Post.objects.create(text='Исходный текст',
+                                        author=self.author)
+        self.post_url = reverse('post', kwargs={
+            'username': self.author.username, 'post_id': self.post.pk})
+
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        path = os.path.join(self.directory, 'replica.sqlite3')
+        connections['default'].ensure_connection()
+        replica = sqlite3.connect(path)
+        connections['default'].connection.backup(replica)
+        replica.close()
+        connections.databases['replica'] = {
+            **settings.DATABASES['default'], 'NAME': path,
+            'OPTIONS': {'pragmas': {'query_only': 1}}}
+
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def tearDown(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_safe_views_read_from_replica(self):
+        """Страница поста читается из реплики, запись до неё не дошла."""
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+
+        response = self.guest_client.get(self.post_url)
+
+        self.assertContains(response, 'Исходный текст')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_writer_reads_own_writes(self):
+        """После комментария автор читает из default и видит его,
+        остальные по-прежнему читают из реплики."""
+        response = self.author_client.post(
+            reverse('add_comment', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        response = self.author_client.get(self.post_url)
+        self.assertContains(response, 'Свежий комментарий')
+
+        response = self.guest_client.get(self.post_url)
+        self.assertNotContains(response, 'Свежий комментарий')
+
+    def test_fresh_generation_is_built_from_primary(self):
+        """Страница, поколение которой моложе отставания реплики,
+        строится по default и не кэширует устаревшие данные."""
+        Post.objects.create(text='Только в default', author=self.author)
+
+        response = self.guest_client.get(reverse('index'))
+
+        self.assertContains(response, 'Только в default')
+
+    def test_fresh_post_page_has_no_etag(self):
+        """Пока реплика может отставать, страница поста из неё не
+        получает ETag, а автор, читающий из default, получает."""
+        self.author_client.post(
+            reverse('add_comment', kwargs={
+                'username': self.author.username, 'post_id': self.post.pk}),
+            {'text': 'Свежий комментарий'})
+
+        self.assertNotIn('ETag', self.guest_client.get(self.post_url))
+        self.assertIn('ETag', self.author_client.get(self.post_url))
+
+    def test_one_replica_per_request(self):
+        """Все чтения запроса идут в одну реплику, следующий запрос
+        выбирает её заново."""
+        router = ReplicaRouter()
+        replicas = ['replica', 'replica_2', 'replica_3']
+        with self.settings(DATABASE_REPLICAS=replicas), replica_reads():
+            chosen = set()
+            for _ in range(20):
+                reset_writes()
+                alias = choose_replica()
+                self.assertEqual(
+                    {router.db_for_read(Post) for _ in range(10)}, {alias})
+                chosen.add(alias)
+        self.assertGreater(len(chosen), 1)
+
+    def test_router_keeps_writes_and_schema_on_default(self):
+        """Записи и миграции не попадают в реплику."""
+        router = ReplicaRouter()
+
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
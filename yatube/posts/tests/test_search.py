@@ -0,0 +1,134 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import resolve, reverse
+
+from posts import search, views
+from posts.models import Comment, Post
+from posts.paginator import CursorPaginator
+
+from .setup_tests import SetUpTests
+
+
+class SearchTests(SetUpTests):
+    def search(self, query):
+        return list(search.search_posts(query))
+
+    def test_search_url_is_not_a_profile(self):
+        """/search/ ведёт на поиск, а не в профиль пользователя."""
+        self.assertEqual(resolve(reverse('search')).func, views.search_posts)
+
+    def test_finds_posts_by_text_and_comments(self):
+        """Пост находится по словам из текста и из комментариев."""
+        self.assertEqual(self.search('тестовый'), [self.post])
+        self.assertEqual(self.search('КОММЕНТАРИЙ'), [self.post])
+        self.assertEqual(self.search('отсутствует'), [])
+
+    def test_last_word_is_prefix(self):
+        """Последнее слово запроса ищется как начало слова."""
+        self.assertEqual(self.search('тестовый пос'), [self.post])
+        self.assertEqual(self.search('тест пост'), [])
+
+    def test_fts_operators_are_escaped(self):
+        """Операторы FTS5 в запросе не ломают поиск."""
+        for query in ('"', 'NEAR(', 'тест* OR', '-text:', ''):
+            with self.subTest(query=query):
+                self.search(query)
+
+    def test_post_text_ranks_above_comments(self):
+        """Совпадение в тексте поста важнее совпадения в комментарии."""
+        in_text = Post.objects.create(text='Пингвины', author=self.creator)
+        in_comment = Post.objects.create(text='Птицы', author=self.creator)
+        Comment.objects.create(
+            post=in_comment, author=self.viewer, text='Тут про пингвины')
+
+        self.assertEqual(self.search('пингвины'), [in_text, in_comment])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении постов и комментариев."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Совсем другой текст'
+        post.save()
+        self.assertEqual(self.search('другой'), [post])
+
+        self.comment.delete()
+        self.assertEqual(self.search('комментарий'), [])
+
+        post.delete()
+        self.assertEqual(self.search('другой'), [])
+
+    def test_only_first_comments_are_indexed(self):
+        """В индекс попадают первые COMMENTS_INDEXED комментариев поста,
+        после удаления одного из них индексируется следующий."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.viewer, text='Болтовня')
+            for _ in range(search.COMMENTS_INDEXED - 1)
+        )
+        Comment.objects.create(
+            post=self.post, author=self.viewer, text='Запоздалый')
+        self.assertEqual(self.search('запоздалый'), [])
+
+        self.post.comments.order_by('created', 'id').first().delete()
+        self.assertEqual(self.search('запоздалый'), [self.post])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('запоздалый'), [self.post])
+
+    def test_ranked_results_are_paginated_with_cursors(self):
+        """Результаты листаются по курсору без повторов и пропусков."""
+        Post.objects.bulk_create([
+            Post(text='жираф ' * (i % 3 + 1), author=self.creator)
+            for i in range(15)
+        ])
+        expected = self.search('жираф')
+        paginator = CursorPaginator(search.search_posts('жираф'), 10)
+        first = list(paginator.cursor_page())
+
+        second = list(CursorPaginator(
+            search.search_posts('жираф'), 10
+        ).cursor_page(after=paginator.next_cursor))
+
+        self.assertEqual(len(expected), 15)
+        self.assertEqual(first + second, expected)
+
+    @override_settings(SEARCH_CANDIDATES=2)
+    def test_only_newest_matches_are_ranked(self):
+        """Ранжируются только SEARCH_CANDIDATES самых новых совпадений."""
+        posts = [Post.objects.create(text='Ёж', author=self.creator)
+                 for _ in range(3)]
+
+        self.assertEqual(self.search('ёж'), posts[1:])
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты и ссылку дальше."""
+        for i in range(views.POSTS_PER_PAGE + 1):
+            Post.objects.create(text=f'Сова {i}', author=self.creator)
+
+        response = self.guest_client.get(reverse('search'), {'q': 'сова'})
+
+        self.assertEqual(
+            len(response.context['page']), views.POSTS_PER_PAGE)
+        self.assertContains(response, '?q=%D1%81%D0%BE%D0%B2%D0%B0&amp;after=')
+        self.assertNotContains(response, self.post.text)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу."""
+        self.creator.is_staff = self.creator.is_superuser = True
+        self.creator.save()
+
+        response = self.authorized_creator_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'комментарий'})
+
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
+
+    def test_rebuild_search_index(self):
+        """Команда заново заполняет индекс по данным в БД."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.search('комментарий'), [self.post])
@@ -0,0 +1,101 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from posts.models import Post
+from posts.templatetags.post_cards import EAGER_CARDS
+from posts.thumbnails import (VARIANT_FORMATS, generate, get_formats,
+                              get_sources)
+
+from .setup_tests import SetUpTests
+
+
+class ThumbnailTests(SetUpTests):
+    def test_generate_stores_url_and_size(self):
+        """Миниатюра сохраняется в посте вместе с размерами."""
+        self.assertTrue(generate(self.post.pk))
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertTrue(post.thumbnail_url)
+        self.assertEqual(
+            (post.thumbnail_width, post.thumbnail_height), (960, 339))
+
+    def test_card_uses_stored_thumbnail(self):
+        """Карточка поста показывает сохранённую миниатюру."""
+        generate(self.post.pk)
+        post = Post.objects.get(pk=self.post.pk)
+
+        response = self.guest_client.get(reverse('index'))
+
+        self.assertContains(response, f'src="{post.thumbnail_url}"')
+
+    def test_post_without_image_is_skipped(self):
+        """Для поста без картинки миниатюра не строится."""
+        post = Post.objects.create(text='Без картинки', author=self.creator)
+
+        self.assertFalse(generate(post.pk))
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails строит недостающие миниатюры."""
+        call_command('generate_thumbnails', '--workers=0', stdout=StringIO())
+
+        self.assertTrue(Post.objects.get(pk=self.post.pk).thumbnail_url)
+
+    def test_malformed_variants_are_skipped(self):
+        """Варианты не того вида пропускаются, остальные попадают в
+        srcset."""
+        good = {'type': 'image/webp', 'url': '/media/a.webp', 'width': 480}
+        mixed = json.dumps([1, None, 'x', {'url': '/b.webp', 'width': 1},
+                            {**good, 'width': '480'}, good])
+        values = {
+            'not json': [],
+            '{"type": "image/webp"}': [],
+            '42': [],
+            mixed: [('image/webp', '/media/a.webp 480w')],
+        }
+        for value, sources in values.items():
+            with self.subTest(value=value):
+                self.assertEqual(
+                    get_sources(Post(image_variants=value)), sources)
+
+    def test_generate_stores_variants(self):
+        """Для картинки строятся варианты WebP и JPEG с размерами."""
+        generate(self.post.pk)
+
+        post = Post.objects.get(pk=self.post.pk)
+        variants = json.loads(post.image_variants)
+        self.assertEqual(
+            {variant['type'] for variant in variants},
+            {VARIANT_FORMATS[name]['type'] for name in get_formats()})
+        for variant in variants:
+            self.assertTrue(variant['url'])
+            self.assertGreater(variant['size'], 0)
+
+    def test_card_has_picture_sources(self):
+        """Карточка поста отдаёт варианты картинки через <source srcset>."""
+        generate(self.post.pk)
+
+        response = self.guest_client.get(reverse('index'))
+
+        self.assertContains(response, '<source type="image/webp" srcset="')
+
+    def test_images_below_the_fold_are_lazy(self):
+        """Картинки первых карточек грузятся сразу, остальных — лениво."""
+        for i in range(EAGER_CARDS):
+            Post.objects.create(
+                text=f'Пост {i}', author=self.creator, image=self.post.image)
+
+        response = self.guest_client.get(reverse('index'))
+
+        self.assertContains(response, 'loading="lazy"', count=1)
+        self.assertContains(response, '<img', count=EAGER_CARDS + 1)
+
+    def test_image_size_report(self):
+        """Отчёт строит недостающие варианты и печатает размеры."""
+        out = StringIO()
+        call_command('image_size_report', stdout=out)
+
+        self.assertIn('image/webp', out.getvalue())
+        self.assertTrue(Post.objects.get(pk=self.post.pk).image_variants)
@@ -1,9 +1,18 @@
+import time
+
 from django import forms
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
-from posts.models import Follow, Group, Post
-from posts.views import POSTS_PER_PAGE
+from posts import caching
+from posts.checks import check_shared_caches
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import encode_cursor
+from posts.views import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 from .setup_tests import SetUpTests
 
@@ -126,8 +135,8 @@ class NewPostViewTests(SetUpTests):
     def test_new_post_does_not_show_on_unfollower_page(self):
         """Созданный пост не попадет в ленту не-фолловера."""
         response = self.authorized_viewer_client.get(reverse('follow_index'))
-        post = response.context.get('page').object_list.count()
-        self.assertNotEqual(post, self.post)
+        posts = response.context.get('page').object_list
+        self.assertNotIn(self.post, posts)
 
     def test_new_post_doesnt_show_on_other_group_page(self):
         """Созданный пост не попадает на страницу другой группы."""
@@ -161,6 +170,97 @@ class NewCommentViewTests(SetUpTests):
         self.assertEqual(comment, self.comment)
 
 
+class CommentPaginationTests(SetUpTests):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.follower,
+                    text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE)
+        )
+        Comment.objects.fill_paths()
+        cls.comments_url = reverse('post_comments', kwargs=cls.post_kwargs)
+
+    def test_post_page_shows_first_comments(self):
+        """Страница поста показывает первую страницу комментариев
+           и ссылку на следующую."""
+        response = self.guest_client.get(
+            reverse('post', kwargs=self.post_kwargs))
+
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0], self.comment)
+        self.assertContains(response, self.comments_url + '?after=')
+
+    def test_comments_endpoint_returns_next_page(self):
+        """Эндпоинт комментариев отдаёт HTML следующей страницы."""
+        response = self.guest_client.get(
+            reverse('post', kwargs=self.post_kwargs))
+        cursor = response.context['comments'].paginator.next_cursor
+
+        data = self.guest_client.get(
+            self.comments_url, {'after': cursor}).json()
+
+        last = f'Комментарий {COMMENTS_PER_PAGE - 1}'
+        self.assertIn(last, data['html'])
+        self.assertNotIn(self.comment.text, data['html'])
+        self.assertIsNone(data['next'])
+
+    def test_comments_endpoint_checks_author(self):
+        """Пост чужого автора в URL комментариев даёт 404."""
+        response = self.guest_client.get(reverse(
+            'post_comments',
+            kwargs={'username': self.viewer.username,
+                    'post_id': self.post.id}))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentReplyTests(SetUpTests):
+    def test_reply_is_shown_under_parent(self):
+        """Ответ сохраняется с родителем и показывается под ним."""
+        Comment.objects.create(
+            post=self.post, author=self.creator, text='Второй комментарий')
+
+        self.authorized_creator_client.post(
+            reverse('add_comment', kwargs=self.post_kwargs),
+            {'text': 'Ответ на первый', 'parent': self.comment.id})
+
+        reply = Comment.objects.get(text='Ответ на первый')
+        self.assertEqual(reply.parent, self.comment)
+        response = self.guest_client.get(
+            reverse('post', kwargs=self.post_kwargs))
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [self.comment.text, 'Ответ на первый', 'Второй комментарий'])
+
+    def test_reply_form(self):
+        """?reply= подставляет в форму комментарий, на который отвечают."""
+        response = self.authorized_creator_client.get(
+            reverse('post', kwargs=self.post_kwargs),
+            {'reply': self.comment.id})
+
+        self.assertEqual(response.context['reply_to'], self.comment)
+        self.assertContains(
+            response, f'name="parent" value="{self.comment.id}"')
+
+    def test_reply_to_other_post_is_rejected(self):
+        """Ответить можно только на комментарий того же поста."""
+        other = Post.objects.create(text='Другой пост', author=self.creator)
+        foreign = Comment.objects.create(
+            post=other, author=self.viewer, text='Чужой комментарий')
+
+        for parent in (foreign.id, 'abc'):
+            with self.subTest(parent=parent):
+                response = self.authorized_creator_client.post(
+                    reverse('add_comment', kwargs=self.post_kwargs),
+                    {'text': 'Ответ', 'parent': parent})
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+
 class PaginatorViewTests(SetUpTests):
     @classmethod
     def setUpClass(cls):
@@ -190,36 +290,215 @@ class PaginatorViewTests(SetUpTests):
                     response.context.get('page').object_list), POSTS_PER_PAGE)
 
     def test_second_page_contains_seven_records(self):
-        """Первая страница пажинатора содержит TOTAL_TEST_POSTS -
+        """Вторая страница пажинатора содержит TOTAL_TEST_POSTS -
            POSTS_PER_PAGE + POST_CREATED_IN_SETUP записей."""
         for page in self.pages_names:
             with self.subTest(page=page):
+                cache.clear()
+                response = self.authorized_follower_client.get(page)
+                cursor = response.context['page'].paginator.next_cursor
                 response = self.authorized_follower_client.get(
-                    page + '?page=2')
+                    page, {'after': cursor})
                 self.assertEqual(len(
                     response.context.get('page').object_list),
                     TOTAL_TEST_POSTS - POSTS_PER_PAGE + POST_CREATED_IN_SETUP)
+                self.assertFalse(response.context['page'].has_next())
+
+    def test_previous_page_returns_first_page(self):
+        """Курсор before со второй страницы возвращает первую страницу."""
+        for page in self.pages_names:
+            with self.subTest(page=page):
+                cache.clear()
+                response = self.authorized_follower_client.get(page)
+                first_page = list(response.context['page'])
+                cursor = response.context['page'].paginator.next_cursor
+                response = self.authorized_follower_client.get(
+                    page, {'after': cursor})
+                cursor = response.context['page'].paginator.previous_cursor
+                response = self.authorized_follower_client.get(
+                    page, {'before': cursor})
+                self.assertEqual(list(response.context['page']), first_page)
+                self.assertFalse(response.context['page'].has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.authorized_follower_client.get(
+            reverse('follow_index'), {'after': 'not-a-cursor'})
+        self.assertEqual(
+            len(response.context['page'].object_list), POSTS_PER_PAGE)
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_cursor_with_wrong_types_returns_first_page(self):
+        """Курсор, который разбирается, но содержит значения не того типа,
+        тоже открывает первую страницу."""
+        tokens = [encode_cursor(values) for values in
+                  (['notadate', 1], [{'a': 1}, 1], [None, None],
+                   ['2020-01-01T00:00:00+00:00', 'x'])]
+        for token in tokens:
+            with self.subTest(token=token):
+                response = self.guest_client.get(
+                    reverse('index'), {'after': token})
+                self.assertFalse(response.context['page'].has_previous())
+                response = self.guest_client.get(
+                    reverse('api:posts'), {'after': token})
+                self.assertEqual(response.json()['results'][0]['id'],
+                                 self.post.pk)
 
 
 class CacheTests(SetUpTests):
     def test_index_page_is_cached(self):
-        """Новая запись на главной странице появится
-           только после сброса кэша."""
-        response = self.authorized_creator_client.get(reverse('index'))
-        first_post_before = response.context['page'][0]
-
-        self.post = Post.objects.create(
-            text='Тестовый пост для кэша',
-            author=self.creator
-        )
+        """Повторный запрос главной страницы отдаётся из кэша."""
+        self.authorized_creator_client.get(reverse('index'))
+        hits = caching.get_stats()['index']['hit']
 
         response = self.authorized_creator_client.get(reverse('index'))
+
         self.assertEqual(response.context, None)
+        self.assertEqual(caching.get_stats()['index']['hit'], hits + 1)
 
-        cache.clear()
-        response = self.authorized_creator_client.get(reverse('index'))
-        first_post_after = response.context['page'][0]
-        self.assertNotEqual(first_post_before, first_post_after)
+    def test_new_post_shows_on_next_request(self):
+        """Новая запись видна на закэшированных страницах сразу."""
+        pages_clients_names = {
+            reverse('index'): self.authorized_creator_client,
+            reverse('group', kwargs=self.group_kwargs):
+                self.authorized_creator_client,
+            reverse('profile', kwargs=self.creator_kwargs):
+                self.authorized_creator_client,
+            reverse('follow_index'): self.authorized_follower_client
+        }
+        for url, client in pages_clients_names.items():
+            client.get(url)
+
+        self.authorized_creator_client.post(reverse('new_post'), data={
+            'text': 'Тестовый пост для кэша', 'group': self.group.id})
+
+        for url, client in pages_clients_names.items():
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(
+                    response.context['page'][0].text,
+                    'Тестовый пост для кэша')
+
+    def test_new_comment_resets_cached_page(self):
+        """Новый комментарий меняет счётчик на закэшированной странице."""
+        self.guest_client.get(reverse('index'))
+
+        self.authorized_viewer_client.post(
+            reverse('add_comment', kwargs=self.post_kwargs),
+            data={'text': 'Ещё комментарий'})
+
+        response = self.guest_client.get(reverse('index'))
+        self.assertEqual(response.context['page'][0].comments_count, 2)
+
+    def test_post_changes_do_not_touch_followers(self):
+        """Комментарий меняет ленту подписчика, но поколения сбрасываются
+        без чтения списка подписчиков автора."""
+        url = reverse('follow_index')
+        self.authorized_follower_client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_viewer_client.post(
+                reverse('add_comment', kwargs=self.post_kwargs),
+                data={'text': 'Ещё комментарий'})
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'posts_follow' in query['sql']])
+
+        response = self.authorized_follower_client.get(url)
+        self.assertEqual(response.context['page'][0].comments_count, 2)
+
+    def test_deploy_check_refuses_process_local_cache(self):
+        """check --deploy не пропускает LocMemCache для кэша страниц и
+        графа подписок."""
+        self.assertEqual(
+            [error.obj for error in check_shared_caches(None)],
+            ['default', settings.GRAPH_CACHE])
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.'
+                             'FileBasedCache',
+                  'LOCATION': '/tmp/yatube-check-cache'}
+        with self.settings(CACHES={'default': shared, 'graph': shared}):
+            self.assertEqual(check_shared_caches(None), [])
+        with self.settings(PAGE_CACHE_TIMEOUT=0):
+            self.assertEqual(check_shared_caches(None), [])
+
+    def test_pages_are_cached_per_user(self):
+        """Закэшированная страница не отдаётся другому пользователю."""
+        self.authorized_creator_client.get(reverse('index'))
+
+        response = self.authorized_viewer_client.get(reverse('index'))
+
+        self.assertContains(response, self.viewer.username)
+
+
+class ConditionalGetTests(SetUpTests):
+    def age_generation(self, scope, seconds=10):
+        """Переносит смену поколения области на seconds секунд назад."""
+        cache.set(caching.GENERATION_KEY.format(scope),
+                  time.time_ns() - seconds * 10 ** 9, None)
+
+    def test_same_etag_returns_not_modified(self):
+        """Страница с тем же ETag отдаётся ответом 304 без тела."""
+        urls = [
+            reverse('index'),
+            reverse('group', kwargs=self.group_kwargs),
+            reverse('profile', kwargs=self.creator_kwargs),
+            reverse('post', kwargs=self.post_kwargs),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_new_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('post', kwargs=self.post_kwargs)
+        etag = self.authorized_viewer_client.get(url)['ETag']
+
+        self.authorized_viewer_client.post(
+            reverse('add_comment', kwargs=self.post_kwargs),
+            data={'text': 'Ещё комментарий'})
+
+        response = self.authorized_viewer_client.get(
+            url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Ещё комментарий')
+
+    def test_etag_depends_on_user(self):
+        """ETag другого пользователя не подходит."""
+        url = reverse('index')
+        etag = self.authorized_creator_client.get(url)['ETag']
+
+        response = self.authorized_viewer_client.get(
+            url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since не раньше смены поколения даёт 304."""
+        url = reverse('post', kwargs=self.post_kwargs)
+        self.age_generation(caching.post_scope(self.post.pk))
+        self.age_generation(caching.profile_scope(self.creator.username))
+        modified = self.guest_client.get(url)['Last-Modified']
+
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() - 60))
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_last_modified_in_change_second(self):
+        """Last-Modified не отдаётся в ту же секунду, что и смена."""
+        now = time.time_ns()
+        self.assertIsNone(caching.last_modified({'index': now}))
+        self.assertEqual(
+            caching.last_modified({'index': now - 10 ** 10}),
+            now // 10 ** 9 - 10)
 
 
 class FollowTests(SetUpTests):
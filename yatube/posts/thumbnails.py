@@ -0,0 +1,191 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Миниатюра и её варианты разной ширины в форматах AVIF, WebP и JPEG
+строятся после сохранения поста в локальном пуле потоков, а их URL и
+размеры записываются в сам пост, поэтому шаблоны не обращаются к движку
+sorl-thumbnail во время рендеринга.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+
+from . import caching, metrics
+from .models import Post
+
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+VARIANT_WIDTHS = (320, 640, 960, 1920)
+# от лучшего сжатия к худшему: браузер берёт первый поддерживаемый
+VARIANT_FORMATS = {
+    'AVIF': {'type': 'image/avif', 'extension': 'avif', 'quality': 50},
+    'WEBP': {'type': 'image/webp', 'extension': 'webp', 'quality': 75},
+    'JPEG': {'type': 'image/jpeg', 'extension': 'jpg',
+             'quality': thumbnail_settings.THUMBNAIL_QUALITY},
+}
+
+logger = logging.getLogger(__name__)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который умеет называть файлы AVIF."""
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        if options['format'] in EXTENSIONS:
+            return super()._get_thumbnail_filename(
+                source, geometry_string, options)
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = f'{key[:2]}/{key[2:4]}/{key}'
+        extension = VARIANT_FORMATS[options['format']]['extension']
+        return f'{thumbnail_settings.THUMBNAIL_PREFIX}{path}.{extension}'
+
+
+def get_formats():
+    """Форматы вариантов, которые Pillow умеет записывать."""
+    Image.init()
+    return [name for name in VARIANT_FORMATS if name in Image.SAVE]
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def build_variants(image):
+    """Варианты картинки по ширинам VARIANT_WIDTHS во всех форматах.
+
+    Картинка не растягивается шире оригинала, но самый узкий вариант
+    строится всегда.
+    """
+    width, height = map(int, THUMBNAIL_GEOMETRY.split('x'))
+    widths = [variant_width for variant_width in VARIANT_WIDTHS
+              if variant_width <= image.width] or VARIANT_WIDTHS[:1]
+    variants = []
+    for image_format in get_formats():
+        options = dict(THUMBNAIL_OPTIONS, format=image_format,
+                       quality=VARIANT_FORMATS[image_format]['quality'])
+        for variant_width in widths:
+            variant_height = round(variant_width * height / width)
+            thumbnail = get_thumbnail(
+                image, f'{variant_width}x{variant_height}', **options)
+            variants.append({
+                'type': VARIANT_FORMATS[image_format]['type'],
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+                'url': thumbnail.url,
+                'size': thumbnail.storage.size(thumbnail.name),
+            })
+    return variants
+
+
+def _is_variant(variant):
+    return (isinstance(variant, dict)
+            and isinstance(variant.get('type'), str)
+            and isinstance(variant.get('url'), str)
+            and isinstance(variant.get('width'), int))
+
+
+def get_sources(post):
+    """srcset вариантов картинки поста по MIME-типам в порядке форматов.
+
+    Неразборчивое значение image_variants и записи не того вида
+    пропускаются: карточка тогда показывает только миниатюру.
+    """
+    try:
+        variants = json.loads(post.image_variants or '[]')
+    except ValueError:
+        variants = []
+    if not isinstance(variants, list):
+        variants = []
+    sources = {}
+    for variant in filter(_is_variant, variants):
+        sources.setdefault(variant['type'], []).append(
+            f'{variant["url"]} {variant["width"]}w')
+    return [(mime_type, ', '.join(srcset))
+            for mime_type, srcset in sources.items()]
+
+
+def generate(post_id):
+    """Строит миниатюру и варианты картинки поста и сохраняет их URL.
+
+    Возвращает True, если миниатюра записана.
+    """
+    start = time.perf_counter()
+    result = 'error'
+    try:
+        post = Post.objects.select_related('author', 'group').filter(
+            pk=post_id).first()
+        if post is None or not post.image:
+            result = 'skipped'
+            return False
+        thumbnail = get_thumbnail(
+            post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+        variants = build_variants(post.image)
+        updated = Post.objects.filter(
+            pk=post_id, image=post.image.name
+        ).update(
+            thumbnail_url=thumbnail.url,
+            thumbnail_width=thumbnail.width,
+            thumbnail_height=thumbnail.height,
+            image_variants=json.dumps(variants),
+            updated=timezone.now(),
+        )
+        result = 'ok' if updated else 'skipped'
+        if updated:
+            caching.bump_post(post)
+        return bool(updated)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру поста %s', post_id)
+        return False
+    finally:
+        metrics.observe('yatube_thumbnail_duration_seconds',
+                        time.perf_counter() - start, result=result)
+
+
+def generate_in_worker(post_id):
+    """generate() для потока пула: поток сам отвечает за соединения с БД."""
+    close_old_connections()
+    try:
+        return generate(post_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(post):
+    """Ставит построение миниатюры в очередь после фиксации транзакции.
+
+    Если settings.THUMBNAIL_WORKERS равен нулю, миниатюра строится
+    синхронно.
+    """
+    if post.thumbnail_url or post.image_variants:
+        post.thumbnail_url = post.image_variants = ''
+        post.thumbnail_width = post.thumbnail_height = None
+        Post.objects.filter(pk=post.pk).update(
+            thumbnail_url='', thumbnail_width=None, thumbnail_height=None,
+            image_variants='')
+    if not post.image:
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(generate_in_worker, post.pk))
+    else:
+        transaction.on_commit(lambda: generate(post.pk))
@@ -11,6 +11,8 @@ urlpatterns = [
     path('new/', views.new_post, name='new_post'),
     # Записи зафолловенных юзеров
     path("follow/", views.follow_index, name="follow_index"),
+    # Поиск по постам и комментариям
+    path('search/', views.search_posts, name='search'),
     # Профайл пользователя
     path('<str:username>/', views.profile, name='profile'),
     # Просмотр записи
@@ -22,6 +24,9 @@ urlpatterns = [
     path('404/', views.page_not_found, name='404'),
     # Ошибка сервера
     path('500/', views.server_error, name='500'),
+    # Следующие страницы комментариев
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     # Добавление комментария
     path("<str:username>/<int:post_id>/comment/", views.add_comment,
          name="add_comment"),
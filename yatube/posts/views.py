@@ -1,50 +1,88 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from . import graph, search, thumbnails
+from .caching import (cached_page, conditional_page, follow_scope,
+                      follow_scopes, group_scope, index_scope, post_scope,
+                      profile_scope)
+from .feed import follow_feed
+from .following import follow_state
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post
+from .paginator import paginate
+from .replicas import read_from_replica
 
 User = get_user_model()
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
 
 
-@cache_page(60 * 20)
+@read_from_replica
+@cached_page(lambda request: [index_scope()])
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
     return render(request, 'index.html', {'page': page})
 
 
+@read_from_replica
+@cached_page(lambda request, slug: [group_scope(slug)])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
     return render(request, 'group.html', {'group': group, 'page': page})
 
 
+@read_from_replica
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    post_list = search.search_posts(query).for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
+    return render(request, 'search.html', {'query': query, 'page': page})
+
+
+def profile_scopes(request, username):
+    scopes = [profile_scope(username)]
+    if request.user.is_authenticated:
+        # рекомендации меняются с подписками читателя
+        scopes.append(follow_scope(request.user.pk))
+    return scopes
+
+
+@read_from_replica
+@cached_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    following = Follow.objects.filter(author=author)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    post_list = author.posts.for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
+    following = follow_state(request).follows(author.pk)
+    recommended = []
+    if request.user.is_authenticated:
+        recommended = graph.recommended_users(
+            request.user.pk, exclude=[author.pk])
     return render(request, 'profile.html', {
-        'author': author, 'page': page, 'following': following})
+        'author': author, 'page': page, 'following': following,
+        'recommended': recommended})
 
 
+@read_from_replica
+@conditional_page(lambda request, username, post_id: [
+    post_scope(post_id), profile_scope(username)])
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    following = Follow.objects.filter(author=author)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__profile'),
+        author__username=username, id=post_id)
+    author = post.author
+    following = follow_state(request).follows(author.pk)
+    comments = comment_page(request, post)
+    reply_to = get_parent(post, request.GET.get('reply'))
 
     form = CommentForm(request.POST or None)
 
@@ -52,7 +90,9 @@ def post_view(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        comment.parent = get_parent(post, request.POST.get('parent'))
+        with transaction.atomic():
+            comment.save()
 
         return redirect('post', username=username, post_id=post_id)
 
@@ -60,25 +100,61 @@ def post_view(request, username, post_id):
                   'post': post,
                   'comments': comments,
                   'form': form,
-                  'following': following
+                  'following': following,
+                  'reply_to': reply_to,
                   }
                   )
 
 
 @login_required
 def new_post(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
 
     if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post = form.save(commit=False)
+            post.author = request.user
+            post.save()
+            thumbnails.schedule(post)
 
         return redirect('index')
 
     return render(request, 'new.html', {'form': form})
 
 
+def comment_page(request, post):
+    """Страница дерева комментариев поста по курсору ?after=."""
+    return paginate(request, post.comments.threaded(), COMMENTS_PER_PAGE)
+
+
+def get_parent(post, parent_id):
+    """Комментарий поста, на который отвечают, или None."""
+    if not parent_id:
+        return None
+    if not parent_id.isdigit():
+        raise Http404('Нет такого комментария')
+    return get_object_or_404(
+        post.comments.select_related('author'), pk=parent_id)
+
+
+@read_from_replica
+@cached_page(lambda request, username, post_id: [post_scope(post_id)])
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев: HTML-фрагмент и URL следующей."""
+    post = get_object_or_404(
+        Post.objects.only('pk'), author__username=username, id=post_id)
+    comments = comment_page(request, post)
+    next_url = None
+    if comments.paginator.next_cursor:
+        next_url = (reverse('post_comments', args=[username, post_id])
+                    + f'?after={comments.paginator.next_cursor}')
+    return JsonResponse({
+        'html': render_to_string('common/comment_items.html',
+                                 {'comments': comments}, request),
+        'next': next_url,
+    })
+
+
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
@@ -90,7 +166,9 @@ def post_edit(request, username, post_id):
                     instance=post)
 
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
 
         return redirect('post', username=username, post_id=post_id)
 
@@ -120,17 +198,19 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        comment.parent = get_parent(post, request.POST.get('parent'))
+        with transaction.atomic():
+            comment.save()
 
     return redirect('post', username=username, post_id=post_id)
 
 
 @login_required
+@read_from_replica
+@cached_page(lambda request: follow_scopes(request.user.pk))
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = follow_feed(request.user).for_feed()
+    page = paginate(request, post_list, POSTS_PER_PAGE)
     return render(request, 'follow.html', {'page': page})
 
 
@@ -139,14 +219,16 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
 
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
 
     return redirect('index')
 
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(
-        user=request.user, author__username=username).delete()
+    with transaction.atomic():
+        Follow.objects.filter(
+            user=request.user, author__username=username).delete()
 
     return redirect('index')
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import Profile
+
+
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ("pk", "user", "followers_count", "following_count",
+                    "posts_count")
+    search_fields = ("user__username",)
+    readonly_fields = ("followers_count", "following_count", "posts_count")
+
+
+admin.site.register(Profile, ProfileAdmin)
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def create_profiles(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('users', 'Profile')
+    users = User.objects.annotate(
+        followers=Count('following', distinct=True),
+        follows=Count('follower', distinct=True),
+        total_posts=Count('posts', distinct=True),
+    )
+    Profile.objects.bulk_create(
+        Profile(user_id=user.pk, followers_count=user.followers,
+                following_count=user.follows, posts_count=user.total_posts)
+        for user in users.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0009_post_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='followers')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='following')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='posts')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_profiles, migrations.RunPython.noop),
+    ]
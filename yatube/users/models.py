@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name="profile")
+    followers_count = models.PositiveIntegerField("followers", default=0)
+    following_count = models.PositiveIntegerField("following", default=0)
+    posts_count = models.PositiveIntegerField("posts", default=0)
+
+    def __str__(self):
+        return f'profile of {self.user.username}'
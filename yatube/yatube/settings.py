@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -49,7 +50,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # метрики снаружи профилировщика: время ответа считается полностью
+    'posts.metrics.MetricsMiddleware',
+    'posts.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,12 +89,27 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# yatube.sqlite — SQLite с WAL, прагмами и BEGIN IMMEDIATE (yatube/sqlite)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,
+    },
+    # реплика добавляется сюда же и перечисляется в DATABASE_REPLICAS:
+    # 'replica': {
+    #     'ENGINE': 'yatube.sqlite',
+    #     'NAME': '/path/to/replica.sqlite3',
+    #     'OPTIONS': {'pragmas': {'query_only': 1}},
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+# псевдонимы DATABASES, из которых читают безопасные GET-view (posts.replicas)
+DATABASE_REPLICAS = []
+# наибольшее ожидаемое отставание реплик: столько секунд после записи
+# пользователь читает из default
+REPLICA_LAG_SECONDS = 5
 
 
 # Password validation
@@ -130,6 +150,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# collectstatic добавляет к именам хэш и пишет сжатые копии .gz и .br
+# (posts.assets); WSGI-приложение отдаёт их само
+STATICFILES_STORAGE = 'posts.assets.CompressedManifestStorage'
+# сколько секунд кэшировать статику без хэша в имени
+STATIC_MAX_AGE = 60
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -143,12 +168,82 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# LocMemCache свой в каждом процессе: смена поколения в одном не видна
+# другим, поэтому он годится только для разработки и тестов, а
+# manage.py check --deploy его не пропускает (posts.checks). В
+# продакшене оба кэша — общие, например:
+#     'OPTIONS': {
+#         'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+#     },
+#     'LOCATION': '127.0.0.1:11211',
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        # считает попадания в кэш для /metrics
+        'BACKEND': 'posts.metrics.MeteredCache',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            # страницы, карточки и поколения: при 300 записях по
+            # умолчанию они вытесняли бы друг друга
+            'MAX_ENTRIES': 100000,
+        },
+    },
+    # списки смежности графа подписок (posts.graph): по два маленьких
+    # на пользователя, в 300 записей по умолчанию они не помещаются
+    'graph': {
+        'BACKEND': 'posts.metrics.MeteredCache',
+        'LOCATION': 'graph',
+        'OPTIONS': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'METRICS_NAME': 'graph',
+            'MAX_ENTRIES': 1000000,
+        },
+    },
 }
 
+# страницы лент сбрасываются сменой поколения (posts.caching),
+# поэтому их можно хранить долго
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# кэш графа подписок; подписка и отписка сбрасывают списки в нём, а срок
+# ограничивает расхождение с БД после записей в обход сигналов
+GRAPH_CACHE = 'graph'
+GRAPH_CACHE_TIMEOUT = 60 * 60
+# ключ карточки поста включает его версию, устаревшие карточки вытесняются
+CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# размер пула потоков, строящих миниатюры картинок постов;
+# 0 — строить синхронно после сохранения поста. В тестах (manage.py test
+# и pytest) пул не запускается: его поток пережил бы тест и писал бы в
+# уже удалённые тестовую БД и MEDIA_ROOT
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+# добавляет sorl-thumbnail имена файлов для AVIF
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+
+# сколько самых новых совпадений поиска ранжируется по релевантности
+SEARCH_CANDIDATES = 1000
+
+# авторы с большим числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту подписок при чтении
+FEED_FANOUT_LIMIT = 5000
+
+# выборочное профилирование запросов (posts.profiling): доля запросов,
+# которые профилируются; 0 — только запросы с подписанным заголовком
+PROFILING_SAMPLE_RATE = 0
+# заголовок X-Profile с токеном из manage.py profile_report --token
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+PROFILING_INTERVAL = 0.001
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_FORMATS = ('collapsed', 'speedscope')
+
+# метрики Prometheus на /metrics (posts.metrics): каталог, в котором
+# процессы WSGI-сервера оставляют снимки своих значений; None — один
+# процесс. При деплое каталог очищают
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
+# пустой список — /metrics доступен всем
+METRICS_ALLOWED_IPS = ['127.0.0.1']
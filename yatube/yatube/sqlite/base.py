@@ -0,0 +1,57 @@
+"""SQLite, настроенный для одновременных чтений и записей.
+
+Каждое новое соединение включает WAL, чтобы читатели не ждали писателя,
+synchronous=NORMAL, mmap, большой кэш страниц и busy_timeout. Транзакции
+transaction.atomic() начинаются с BEGIN IMMEDIATE: писатель берёт
+блокировку на запись сразу и при занятой БД ждёт её до busy_timeout,
+а не получает "database is locked" при повышении блокировки посреди
+транзакции. Соединению только для чтения (прагма query_only или
+псевдоним из DATABASE_REPLICAS) блокировка на запись не нужна, а
+реплика с query_only её и не даст, поэтому его транзакции — DEFERRED.
+
+Прагмы можно переопределить в DATABASES[...]['OPTIONS']['pragmas'],
+режим начала транзакций — в OPTIONS['transaction_mode'].
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # отрицательное значение — размер в КиБ, а не в страницах
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+TRANSACTION_MODE = 'IMMEDIATE'
+READ_ONLY_TRANSACTION_MODE = 'DEFERRED'
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        options = self.settings_dict['OPTIONS']
+        for name, value in {**PRAGMAS, **options.get('pragmas', {})}.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def is_read_only(self):
+        query_only = self.settings_dict['OPTIONS'].get(
+            'pragmas', {}).get('query_only', 0)
+        return (str(query_only).lower() not in ('0', 'off', 'false', 'no')
+                or self.alias in settings.DATABASE_REPLICAS)
+
+    def _start_transaction_under_autocommit(self):
+        if self.is_read_only():
+            mode = READ_ONLY_TRANSACTION_MODE
+        else:
+            mode = self.settings_dict['OPTIONS'].get(
+                'transaction_mode', TRANSACTION_MODE)
+        self.cursor().execute(f'BEGIN {mode}')
@@ -4,6 +4,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from posts.metrics import metrics_view
+
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
@@ -18,6 +20,12 @@ urlpatterns = [
     #  раздел администратора
     path("admin/", admin.site.urls),
 
+    #  метрики Prometheus, до posts.urls: там /<username>/
+    path("metrics", metrics_view, name="metrics"),
+
+    #  JSON API для мобильных клиентов
+    path("api/v1/", include("posts.api_urls", namespace="api")),
+
     #  обработчик для главной страницы ищем в urls.py приложения posts
     path("", include("posts.urls")),
 
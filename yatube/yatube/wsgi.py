@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from posts.assets import StaticAssets
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# статика из STATIC_ROOT отдаётся без отдельного веб-сервера
+application = StaticAssets(application)